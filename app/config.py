@@ -10,6 +10,28 @@ class Settings(BaseSettings):
     AZURE_OPENAI_ENDPOINT: str
     AZURE_OPENAI_DEPLOYMENT_NAME: str
     AZURE_OPENAI_API_VERSION: str = "2025-01-01-preview"
+    AZURE_OPENAI_MAX_CONNECTIONS: int = 20
+    AZURE_OPENAI_TIMEOUT: float = 120.0
+    AZURE_OPENAI_TEMPERATURE: float = 0.7
+    # Cuota del deployment (0 = sin límite), reintentos y circuit breaker ante 429/5xx
+    AZURE_OPENAI_RPM: int = 0
+    AZURE_OPENAI_TPM: int = 0
+    AZURE_OPENAI_MAX_RETRIES: int = 5
+    AZURE_OPENAI_BACKOFF_BASE: float = 1.0
+    AZURE_OPENAI_BACKOFF_MAX: float = 60.0
+    AZURE_OPENAI_BREAKER_THRESHOLD: int = 5
+    AZURE_OPENAI_BREAKER_COOLDOWN: float = 30.0
+    
+    # Generación en paralelo por secciones (documentos de requisitos grandes)
+    FANOUT_CHUNK_CHARS: int = 6000
+    FANOUT_MAX_CONCURRENCY: int = 4
+    
+    # Generación por lotes: backlogs generados a la vez y tamaño máximo del lote
+    BATCH_MAX_CONCURRENCY: int = 4
+    BATCH_MAX_ITEMS: int = 50
+    
+    # Planificación de sprints: "first_fit" (dependencias + bin packing) o "greedy"
+    SPRINT_PLANNER: str = "first_fit"
     
     # Aplicación
     APP_NAME: str = "Agente Scrum Master AI"
@@ -23,6 +45,39 @@ class Settings(BaseSettings):
     DATA_DIR: str = "./data"
     EXPORTS_DIR: str = "./exports"
     
+    # Motor de persistencia del backlog: "json" (data/backlog.json) o "sqlite" (data/backlog.db)
+    BACKLOG_STORAGE: str = "json"
+    # Tamaño del journal de cambios (motor json) a partir del cual se compacta en el snapshot
+    BACKLOG_JOURNAL_COMPACT_BYTES: int = 1024 * 1024
+    # Snapshot JSON indentado (legible) en lugar de compacto (más pequeño y rápido)
+    BACKLOG_JSON_PRETTY: bool = False
+    
+    # Caché de respuestas del modelo (en DATA_DIR/llm_cache)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_BYTES: int = 200 * 1024 * 1024
+    LLM_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    
+    # Caché de exportaciones generadas (en EXPORTS_DIR/cache)
+    EXPORT_CACHE_MAX_BYTES: int = 100 * 1024 * 1024
+    EXPORT_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    
+    # Métricas Prometheus en /metrics (latencias por ruta y etapa, tokens, tamaños, cachés)
+    METRICS_ENABLED: bool = True
+    
+    # Trazas por petición (X-Request-ID, Server-Timing); con TRACE_LOG_JSON se escriben
+    # como JSON en stderr. PROFILING: "off", "header" (X-Debug-Profile: 1) o "all";
+    # los perfiles cProfile se guardan en DATA_DIR/profiles
+    TRACE_LOG_JSON: bool = False
+    PROFILING: str = "off"
+    
+    # Cola de trabajos en segundo plano (en DATA_DIR/jobs.db)
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 3
+    # Un trabajo en ejecución cuyo worker no renueva el lease en este tiempo vuelve a la cola
+    JOB_LEASE_SECONDS: float = 30.0
+    JOB_RETENTION_SECONDS: float = 7 * 24 * 3600
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,25 +1,83 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 from app.config import get_settings
 from app.models import (
     GenerateBacklogRequest, 
+    CreateBacklogRequest,
+    UpdateBacklogRequest,
     PlanSprintsRequest,
     UpdateVelocityRequest,
     Backlog,
+    BacklogInfo,
+    BatchGenerateRequest,
+    BatchGenerateResponse,
+    BatchItemResult,
+    BacklogSummary,
+    BacklogView,
+    Job,
+    JobStatus,
+    PlannedBacklog,
+    Priority,
     Sprint,
+    UserStory,
+    UserStorySummary,
     ExportFormat
 )
 from app.services.ai_agent import AIAgent
-from app.services.backlog_manager import BacklogManager
+from app.services.backlog_manager import BacklogManager, VersionConflictError
+from app.services.backlog_registry import BacklogExistsError, BacklogNotFoundError, BacklogRegistry, is_valid_backlog_id
+from app.services.dependency_graph import DependencyCycleError
+from app.services.job_queue import IdempotencyConflictError, JobError, JobQueue, JobStore
+from app.services.metrics import REGISTRY, MetricsMiddleware
+from app.services.tracing import TracingMiddleware, enable_json_log
+from app.services.rate_limiter import LLMUnavailableError
 
 
-# Inicializar aplicación
+# Servicios
 settings = get_settings()
+ai_agent = AIAgent()
+backlogs = BacklogRegistry()
+job_queue = JobQueue(
+    JobStore(Path(settings.DATA_DIR) / "jobs.db"),
+    workers=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    log_traces=settings.TRACE_LOG_JSON
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida: arranca los workers de la cola (reanudando los trabajos que
+    un reinicio dejó a medias) y, al apagar, los detiene y libera el pool de
+    conexiones del agente
+    """
+    await job_queue.start(retention_seconds=settings.JOB_RETENTION_SECONDS)
+    yield
+    await job_queue.stop()
+    await ai_agent.aclose()
+
+
+# Inicializar aplicación
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="Agente Scrum Master & Product Owner asistido por IA"
+    description="Agente Scrum Master & Product Owner asistido por IA",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -29,11 +87,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Location", "X-Total-Count", "X-Next-Cursor", "X-Request-ID", "Server-Timing", "X-Profile"],
+)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if settings.TRACE_LOG_JSON:
+    enable_json_log()
+app.add_middleware(
+    TracingMiddleware,
+    log_json=settings.TRACE_LOG_JSON,
+    profiling=settings.PROFILING,
+    profiles_dir=Path(settings.DATA_DIR) / "profiles"
 )
 
-# Servicios
-ai_agent = AIAgent()
-backlog_manager = BacklogManager()
+
+def _cache_stats() -> dict:
+    caches = {"backlog": backlogs.cache_stats(), "exports": backlogs.export_cache.stats()}
+    if ai_agent.cache:
+        caches["llm"] = ai_agent.cache.stats()
+    return caches
+
+
+def _cache_samples(field: str):
+    return lambda: [({"cache": name}, stats[field]) for name, stats in _cache_stats().items()]
+
+
+REGISTRY.add_collector(
+    "scrum_backlog_stories", "gauge", "HU de cada backlog (del índice, sin cargarlo)",
+    lambda: [({"backlog": info.id}, info.story_count) for info in backlogs.list()]
+)
+REGISTRY.add_collector(
+    "scrum_backlog_story_points", "gauge", "Story points de cada backlog",
+    lambda: [({"backlog": info.id}, info.total_points) for info in backlogs.list()]
+)
+REGISTRY.add_collector(
+    "scrum_backlog_disk_bytes", "gauge", "Bytes en disco de los ficheros de cada backlog",
+    lambda: [({"backlog": backlog_id}, size) for backlog_id, size in backlogs.disk_usage().items()]
+)
+REGISTRY.add_collector("scrum_cache_hits_total", "counter", "Aciertos por caché", _cache_samples("hits"))
+REGISTRY.add_collector("scrum_cache_misses_total", "counter", "Fallos por caché", _cache_samples("misses"))
+REGISTRY.add_collector("scrum_cache_hit_ratio", "gauge", "Ratio de aciertos por caché", _cache_samples("hit_ratio"))
+REGISTRY.add_collector(
+    "scrum_jobs", "gauge", "Trabajos en segundo plano por estado",
+    lambda: [({"status": status}, total) for status, total in job_queue.store.counts().items()]
+)
+REGISTRY.add_collector(
+    "scrum_llm_circuit_open", "gauge", "1 si el circuit breaker hacia Azure OpenAI está abierto",
+    lambda: [({}, int(ai_agent.limiter.stats()["circuit_open"]))]
+)
 
 
 @app.get("/")
@@ -46,14 +147,68 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas desactivadas (METRICS_ENABLED)")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 
-@app.post("/api/generate-backlog", response_model=Backlog)
-async def generate_backlog(request: GenerateBacklogRequest):
+def _manager(backlog_id: Optional[str], create: bool = False) -> BacklogManager:
+    """Gestor del backlog indicado (el por defecto si no se indica) o 404/400"""
+    try:
+        return backlogs.get(backlog_id, create=create)
+    except BacklogNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/backlogs", response_model=List[BacklogInfo])
+async def list_backlogs():
+    """Lista los backlogs con sus metadatos, leídos del índice sin abrir ningún backlog"""
+    return backlogs.list()
+
+
+@app.post("/api/backlogs", response_model=BacklogInfo, status_code=201)
+async def create_backlog(request: CreateBacklogRequest):
+    """Crea un backlog vacío"""
+    try:
+        return backlogs.create(request.id, name=request.name, team_capacity=request.team_capacity)
+    except BacklogExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.patch("/api/backlogs/{backlog_id}", response_model=BacklogInfo)
+async def update_backlog(backlog_id: str, request: UpdateBacklogRequest):
+    """Cambia el nombre de un backlog"""
+    try:
+        return backlogs.rename(backlog_id, request.name)
+    except BacklogNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/api/backlogs/{backlog_id}")
+async def delete_backlog(backlog_id: str):
+    """Elimina un backlog y sus ficheros (el backlog por defecto solo se vacía)"""
+    _manager(backlog_id)
+    try:
+        backlogs.delete(backlog_id)
+        return {"message": "Backlog eliminado exitosamente"}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error eliminando backlog: {str(e)}")
+
+
+@app.post("/api/generate-backlog", response_model=PlannedBacklog)
+async def generate_backlog(request: GenerateBacklogRequest, http_request: Request, response: Response):
     """
     Genera un backlog completo desde requisitos de negocio.
     
@@ -63,51 +218,352 @@ async def generate_backlog(request: GenerateBacklogRequest):
     - Estimación en story points
     - Priorización
     - Subtareas técnicas
-    - Planificación inicial de sprints
+    - Planificación inicial de sprints (con las HU que quedaron sin sprint)
+    
+    Con `backlog_id` se genera en ese backlog (creándolo si no existe). Si el
+    backlog cambia mientras se genera (o no está en la versión de If-Match /
+    expected_version) responde 409 en lugar de sobrescribir ese cambio.
     """
+    backlog_manager = _manager(request.backlog_id, create=True)
+    expected_version = _expected_version(http_request, request.expected_version)
+    if expected_version is None:
+        expected_version = backlog_manager.version_info()[0]
     try:
-        # Generar historias de usuario
-        user_stories = ai_agent.generate_user_stories(
-            requirements=request.requirements,
-            additional_context=request.additional_context,
-            priority_guidance=request.priority_guidance
-        )
+        backlog = await _generate_and_save(backlog_manager, request, expected_version)
+        response.headers["ETag"] = _etag(backlog.version, backlog.content_hash, "")
         
-        # Crear backlog
-        backlog = Backlog(
-            user_stories=user_stories,
-            team_capacity=request.team_capacity
-        )
-        
-        # Planificar sprints
-        sprint_plan = ai_agent.suggest_sprint_planning(
-            user_stories=user_stories,
-            team_capacity=request.team_capacity
-        )
-        
-        # Agregar sprints al backlog
-        backlog.sprints = [
-            Sprint(
-                number=s["number"],
-                name=s["name"],
-                capacity=s["capacity"],
-                user_stories=s["user_stories"],
-                total_points=s["total_points"]
-            )
-            for s in sprint_plan["sprints"]
-        ]
-        
-        # Guardar backlog
-        backlog_manager.save_backlog(backlog)
-        
-        return backlog
+        return _json_response(PlannedBacklog.from_backlog(backlog), response)
         
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": _retry_after(e)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando backlog: {str(e)}")
 
 
-@app.post("/api/plan-sprints", response_model=Backlog)
-async def plan_sprints(request: PlanSprintsRequest):
+def _retry_after(error: LLMUnavailableError) -> str:
+    """Valor de la cabecera Retry-After (segundos enteros) para un 503 del modelo"""
+    return str(max(1, math.ceil(error.retry_after)))
+
+
+async def _generate_and_save(
+    backlog_manager: BacklogManager,
+    request: GenerateBacklogRequest,
+    expected_version: Optional[int]
+) -> Backlog:
+    """Genera las HU, planifica los sprints y guarda el backlog si sigue en `expected_version`"""
+    # Generar historias de usuario
+    user_stories = await ai_agent.generate_user_stories(
+        requirements=request.requirements,
+        additional_context=request.additional_context,
+        priority_guidance=request.priority_guidance,
+        fan_out=request.fan_out,
+        use_cache=not request.bypass_cache
+    )
+    
+    # Crear backlog con planificación inicial de sprints
+    backlog = _build_backlog(user_stories, request.team_capacity)
+    
+    # Guardar backlog
+    backlog_manager.save_backlog(backlog, expected_version=expected_version)
+    return backlog
+
+
+@app.post("/api/generate-backlog/batch", response_model=BatchGenerateResponse)
+async def generate_backlog_batch(request: BatchGenerateRequest):
+    """
+    Genera varios backlogs a la vez, cada uno en su propio backlog.
+    
+    Las generaciones corren en paralelo hasta `max_concurrency` (acotado por
+    BATCH_MAX_CONCURRENCY), así que el tiempo total lo marca la cuota del modelo y
+    no la suma de las llamadas. Los elementos sin `backlog_id` reciben uno nuevo
+    (`batch-<lote>-<n>`). Un fallo no detiene el resto: cada resultado indica su
+    estado y, si falló, el error y su código HTTP equivalente (409 si el backlog
+    cambió mientras se generaba).
+    """
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote admite como máximo {settings.BATCH_MAX_ITEMS} elementos"
+        )
+    
+    batch_id = uuid.uuid4().hex[:8]
+    backlog_ids = [item.backlog_id or f"batch-{batch_id}-{index}" for index, item in enumerate(request.items, 1)]
+    invalid = [backlog_id for backlog_id in backlog_ids if not is_valid_backlog_id(backlog_id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"ID de backlog no válido: {invalid[0]}")
+    if len(set(backlog_ids)) != len(backlog_ids):
+        raise HTTPException(status_code=400, detail="Cada elemento del lote debe ir a un backlog distinto")
+    
+    concurrency = min(request.max_concurrency or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run(index: int, item: GenerateBacklogRequest, backlog_id: str) -> BatchItemResult:
+        async with semaphore:
+            started = time.perf_counter()
+            result = BatchItemResult(index=index, backlog_id=backlog_id, status="succeeded")
+            try:
+                backlog_manager = backlogs.get(backlog_id, create=True)
+                expected_version = item.expected_version
+                if expected_version is None:
+                    expected_version = backlog_manager.version_info()[0]
+                backlog = await _generate_and_save(backlog_manager, item, expected_version)
+                result.version = backlog.version
+                result.story_count = len(backlog.user_stories)
+                result.total_points = sum(story.story_points for story in backlog.user_stories)
+                result.sprint_count = len(backlog.sprints)
+                result.unplaced_stories = PlannedBacklog.unplaced(backlog)
+            except VersionConflictError as e:
+                result.status, result.error, result.error_status = "failed", str(e), 409
+            except LLMUnavailableError as e:
+                result.status, result.error, result.error_status = "failed", str(e), 503
+            except Exception as e:
+                result.status = "failed"
+                result.error = f"Error generando backlog: {str(e)}"
+                result.error_status = 500
+            result.elapsed_seconds = round(time.perf_counter() - started, 3)
+            return result
+    
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run(index, item, backlog_id) for index, (item, backlog_id) in enumerate(zip(request.items, backlog_ids)))
+    )
+    succeeded = sum(1 for result in results if result.status == "succeeded")
+    return BatchGenerateResponse(
+        results=results,
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        elapsed_seconds=round(time.perf_counter() - started, 3)
+    )
+
+
+@app.post("/api/generate-backlog/stream")
+async def generate_backlog_stream(request: GenerateBacklogRequest, http_request: Request):
+    """
+    Genera un backlog emitiendo Server-Sent Events.
+    
+    Eventos:
+    - story: cada Historia de Usuario en cuanto el modelo la completa (con
+      fan-out, las de cada sección ya fusionadas al terminar la sección)
+    - backlog: backlog final priorizado y con planificación de sprints
+    - error: la generación falló (con status 409 si el backlog cambió mientras
+      tanto); no se emiten más eventos
+    """
+    backlog_manager = _manager(request.backlog_id, create=True)
+    expected_version = _expected_version(http_request, request.expected_version)
+    if expected_version is None:
+        expected_version = backlog_manager.version_info()[0]
+    
+    async def event_stream():
+        user_stories = []
+        try:
+            async for story in ai_agent.stream_user_stories(
+                requirements=request.requirements,
+                additional_context=request.additional_context,
+                priority_guidance=request.priority_guidance,
+                fan_out=request.fan_out,
+                use_cache=not request.bypass_cache
+            ):
+                user_stories.append(story)
+                yield _sse("story", story.model_dump_json())
+            
+            backlog = _build_backlog(ai_agent.prioritize_stories(user_stories), request.team_capacity)
+            backlog_manager.save_backlog(backlog, expected_version=expected_version)
+            yield _sse("backlog", PlannedBacklog.from_backlog(backlog).model_dump_json())
+            
+        except VersionConflictError as e:
+            yield _sse("error", json.dumps({"detail": str(e), "status": 409}))
+        except LLMUnavailableError as e:
+            yield _sse("error", json.dumps({"detail": str(e), "status": 503, "retry_after": _retry_after(e)}))
+        except Exception as e:
+            yield _sse("error", json.dumps({"detail": f"Error generando backlog: {str(e)}"}))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+GENERATE_BACKLOG_JOB = "generate-backlog"
+
+
+@app.post("/api/jobs/generate-backlog", response_model=Job, status_code=202)
+async def submit_generate_backlog(request: GenerateBacklogRequest, http_request: Request, response: Response):
+    """
+    Encola la generación de un backlog y responde al instante con el trabajo.
+    
+    El resultado se consulta en `GET /api/jobs/{job_id}` o se sigue en
+    `GET /api/jobs/{job_id}/events`. Con la cabecera `Idempotency-Key`, repetir la
+    misma petición devuelve el trabajo ya creado (200) en lugar de generar otro;
+    reutilizar la clave con otra petición responde 422. Si el backlog cambia
+    antes de guardar el resultado (ver expected_version), el trabajo falla con
+    error_status 409.
+    """
+    backlog_manager = _manager(request.backlog_id, create=True)
+    expected_version = _expected_version(http_request, request.expected_version)
+    idempotency_key = http_request.headers.get("Idempotency-Key")
+    fingerprint = hashlib.sha256(
+        json.dumps([request.model_dump(mode="json"), expected_version], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    
+    if expected_version is None:
+        expected_version = backlog_manager.version_info()[0]
+    payload = request.model_dump(mode="json")
+    payload.update(backlog_id=backlog_manager.backlog_id, expected_version=expected_version)
+    
+    try:
+        job, created = job_queue.submit(GENERATE_BACKLOG_JOB, payload, idempotency_key, fingerprint)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if not created:
+        response.status_code = 200
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return job
+
+
+@app.get("/api/jobs", response_model=List[Job])
+async def list_jobs(status: Optional[JobStatus] = None, limit: int = Query(default=50, ge=1, le=500)):
+    """Trabajos más recientes primero, opcionalmente filtrados por estado"""
+    return job_queue.store.list(status.value if status else None, limit)
+
+
+@app.get("/api/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Estado, progreso y resultado de un trabajo"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, http_request: Request):
+    """
+    Sigue un trabajo con Server-Sent Events.
+    
+    Eventos:
+    - status: el trabajo empieza a ejecutarse (con el número de intento)
+    - story: cada Historia de Usuario generada
+    - progress: etapa actual y HU generadas hasta el momento
+    - done: el trabajo terminó; lleva el trabajo completo (resultado o error)
+    
+    Cada evento lleva `id`, así que al reconectar con `Last-Event-ID` solo se
+    reciben los posteriores.
+    """
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    try:
+        after = int(http_request.headers.get("Last-Event-ID") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID no válido")
+    
+    async def event_stream():
+        async for seq, event, data in job_queue.events(job_id, after):
+            yield f"id: {seq}\n" + _sse(event, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _run_generate_backlog_job(job: Job, payload: dict, emit) -> dict:
+    """Ejecuta en la cola lo mismo que /api/generate-backlog, informando del progreso"""
+    request = GenerateBacklogRequest(**payload)
+    backlog_manager = backlogs.get(request.backlog_id, create=True)
+    use_cache = not request.bypass_cache
+    
+    try:
+        user_stories = []
+        emit("progress", {"stage": "generating", "stories": 0})
+        async for story in ai_agent.stream_user_stories(
+            requirements=request.requirements,
+            additional_context=request.additional_context,
+            priority_guidance=request.priority_guidance,
+            fan_out=request.fan_out,
+            use_cache=use_cache
+        ):
+            user_stories.append(story)
+            emit("story", story.model_dump(mode="json"))
+            emit("progress", {"stage": "generating", "stories": len(user_stories)})
+        user_stories = ai_agent.prioritize_stories(user_stories)
+    except LLMUnavailableError as e:
+        raise JobError(str(e), status=503)
+    
+    emit("progress", {"stage": "saving", "stories": len(user_stories)})
+    backlog = _build_backlog(user_stories, request.team_capacity)
+    try:
+        backlog_manager.save_backlog(backlog, expected_version=request.expected_version)
+    except VersionConflictError as e:
+        raise JobError(str(e), status=409)
+    
+    return {
+        "backlog_id": backlog_manager.backlog_id,
+        "version": backlog.version,
+        "story_count": len(backlog.user_stories),
+        "total_points": sum(story.story_points for story in backlog.user_stories),
+        "sprint_count": len(backlog.sprints),
+        "unplaced_stories": PlannedBacklog.unplaced(backlog)
+    }
+
+
+job_queue.register(GENERATE_BACKLOG_JOB, _run_generate_backlog_job)
+
+
+def _build_backlog(user_stories: List[UserStory], team_capacity: int) -> Backlog:
+    """Crea el backlog a partir de HU priorizadas y le asigna la planificación de sprints"""
+    backlog = Backlog(
+        user_stories=user_stories,
+        team_capacity=team_capacity
+    )
+    
+    # Planificar sprints
+    sprint_plan = ai_agent.suggest_sprint_planning(
+        user_stories=user_stories,
+        team_capacity=team_capacity
+    )
+    
+    # Agregar sprints al backlog
+    backlog.sprints = [
+        Sprint(
+            number=s["number"],
+            name=s["name"],
+            capacity=s["capacity"],
+            user_stories=s["user_stories"],
+            total_points=s["total_points"]
+        )
+        for s in sprint_plan["sprints"]
+    ]
+    
+    return backlog
+
+
+def _sse(event: str, data: str) -> str:
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def _json_response(model: BaseModel, response: Optional[Response] = None) -> Response:
+    """
+    Serializa un modelo ya validado directamente a JSON.
+    
+    Si se devuelve el modelo, FastAPI lo vuelca a dicts, lo revalida contra
+    `response_model` y lo serializa de nuevo; `response_model` se mantiene en
+    los endpoints para la documentación. Conserva las cabeceras fijadas en
+    `response` (p. ej. el ETag).
+    """
+    result = Response(content=model.model_dump_json(), media_type="application/json")
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
+
+
+@app.post("/api/plan-sprints", response_model=PlannedBacklog)
+async def plan_sprints(request: PlanSprintsRequest, http_request: Request, response: Response):
     """
     Replanifica sprints del backlog existente.
     
@@ -115,52 +571,78 @@ async def plan_sprints(request: PlanSprintsRequest):
     - Cambia la capacidad del equipo
     - Se ajusta la priorización
     - Se actualiza la velocidad
+    
+    La respuesta incluye la utilización de cada sprint y las HU que quedaron
+    sin sprint (`unplaced_stories`: por `num_sprints` o por superar la capacidad).
+    
+    Con If-Match o expected_version, responde 409 si el backlog ya no está en
+    esa versión; si las dependencias entre HU forman un ciclo, 422 con el ciclo.
     """
+    backlog_manager = _manager(request.backlog_id)
+    expected_version = _expected_version(http_request, request.expected_version)
     try:
-        backlog = backlog_manager.load_backlog()
-        
-        if not backlog.user_stories:
-            raise HTTPException(status_code=404, detail="No hay historias de usuario en el backlog")
-        
-        # Actualizar capacidad si se proporciona
-        if request.team_capacity:
-            backlog.team_capacity = request.team_capacity
-        
-        # Usar velocidad actual si está disponible
-        capacity = backlog.current_velocity or backlog.team_capacity
-        
-        # Replanificar sprints
-        sprint_plan = ai_agent.suggest_sprint_planning(
-            user_stories=backlog.user_stories,
-            team_capacity=int(capacity),
-            num_sprints=request.num_sprints
-        )
-        
-        # Actualizar sprints
-        backlog.sprints = [
-            Sprint(
-                number=s["number"],
-                name=s["name"],
-                capacity=s["capacity"],
-                user_stories=s["user_stories"],
-                total_points=s["total_points"]
-            )
-            for s in sprint_plan["sprints"]
-        ]
-        
-        # Guardar
-        backlog_manager.save_backlog(backlog)
-        
-        return backlog
+        async with backlog_manager.write_lock:
+            backlog = _plan_sprints(backlog_manager, request, expected_version)
+        response.headers["ETag"] = _etag(backlog.version, backlog.content_hash, "")
+        return _json_response(PlannedBacklog.from_backlog(backlog), response)
         
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except DependencyCycleError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error planificando sprints: {str(e)}")
 
 
+def _plan_sprints(
+    backlog_manager: BacklogManager,
+    request: PlanSprintsRequest,
+    expected_version: Optional[int]
+) -> Backlog:
+    """Carga el backlog, replanifica sus sprints y lo guarda si sigue en la versión leída"""
+    backlog = backlog_manager.load_backlog(for_update=True)
+    if expected_version is not None and backlog.version != expected_version:
+        raise VersionConflictError(backlog_manager.backlog_id, expected_version, backlog.version)
+    if not backlog.user_stories:
+        raise HTTPException(status_code=404, detail="No hay historias de usuario en el backlog")
+    
+    # Actualizar capacidad si se proporciona
+    if request.team_capacity:
+        backlog.team_capacity = request.team_capacity
+    
+    # Usar velocidad actual si está disponible
+    capacity = backlog.current_velocity or backlog.team_capacity
+    
+    # Replanificar sprints
+    sprint_plan = ai_agent.suggest_sprint_planning(
+        user_stories=backlog.user_stories,
+        team_capacity=int(capacity),
+        num_sprints=request.num_sprints,
+        strategy=request.strategy.value if request.strategy else None
+    )
+    
+    # Actualizar sprints
+    backlog.sprints = [
+        Sprint(
+            number=s["number"],
+            name=s["name"],
+            capacity=s["capacity"],
+            user_stories=s["user_stories"],
+            total_points=s["total_points"]
+        )
+        for s in sprint_plan["sprints"]
+    ]
+    
+    # Guardar
+    backlog_manager.save_backlog(backlog, expected_version=backlog.version)
+    
+    return backlog
+
+
 @app.post("/api/update-velocity", response_model=Backlog)
-async def update_velocity(request: UpdateVelocityRequest):
+async def update_velocity(request: UpdateVelocityRequest, http_request: Request, response: Response):
     """
     Actualiza la velocidad del equipo basado en un sprint completado.
     
@@ -168,28 +650,186 @@ async def update_velocity(request: UpdateVelocityRequest):
     - Velocidad promedio del equipo
     - Capacidad futura de sprints
     - Replanificación si es necesario
+    
+    Con If-Match o expected_version, responde 409 si el backlog ya no está en
+    esa versión.
     """
+    backlog_manager = _manager(request.backlog_id)
+    expected_version = _expected_version(http_request, request.expected_version)
     try:
-        backlog = backlog_manager.update_velocity(request)
-        return backlog
+        async with backlog_manager.write_lock:
+            backlog = backlog_manager.update_velocity(request, expected_version=expected_version)
+        response.headers["ETag"] = _etag(backlog.version, backlog.content_hash, "")
+        return _json_response(backlog, response)
         
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error actualizando velocidad: {str(e)}")
 
 
-@app.get("/api/backlog", response_model=Backlog)
-async def get_backlog():
-    """Obtiene el backlog actual"""
+def _etag(version: int, content_hash: Optional[str], variant: str) -> str:
+    """
+    ETag fuerte de una representación del backlog: versión, huella y variante
+    (query, formato). Empieza por la versión para poder usarlo en If-Match.
+    """
+    digest = hashlib.sha256(f"{version}:{content_hash}:{variant}".encode("utf-8")).hexdigest()
+    return f'"{version}-{digest[:32]}"'
+
+
+def _expected_version(request: Request, expected_version: Optional[int] = None) -> Optional[int]:
+    """
+    Versión que el cliente espera modificar: `expected_version` o la del ETag
+    de If-Match (cualquier ETag de este backlog). None si no indica ninguna.
+    """
+    if expected_version is not None:
+        return expected_version
+    header = request.headers.get("if-match", "").strip()
+    if not header or header == "*":
+        return None
+    tag = header.split(",")[0].strip().removeprefix("W/").strip('"')
+    version = tag.split("-", 1)[0]
+    if not version.isdigit():
+        raise HTTPException(status_code=400, detail=f"If-Match no válido: {header}")
+    return int(version)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Comprueba If-None-Match (comparación débil, como pide RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@app.get("/api/backlogs/{backlog_id}", response_model=Union[Backlog, BacklogSummary])
+@app.get("/api/backlog", response_model=Union[Backlog, BacklogSummary])
+async def get_backlog(
+    request: Request,
+    response: Response,
+    backlog_id: Optional[str] = None,
+    priority: Optional[Priority] = None,
+    status: Optional[str] = None,
+    sprint: Optional[int] = Query(default=None, ge=0, description="Número de sprint; 0 = sin asignar"),
+    tag: Optional[str] = None,
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = Query(default=None, description="ID de la última HU de la página anterior"),
+    view: BacklogView = BacklogView.FULL
+):
+    """
+    Obtiene el backlog actual.
+    
+    Sin parámetros devuelve el backlog completo. Los filtros (priority, status,
+    sprint, tag) y la paginación (offset/limit o cursor) se aplican a las HU;
+    el total filtrado y el cursor siguiente van en X-Total-Count y X-Next-Cursor.
+    Con view=compact las HU se devuelven resumidas, sin criterios de aceptación,
+    casos de prueba ni subtareas.
+    
+    La respuesta lleva un ETag; con If-None-Match y el backlog sin cambios se
+    responde 304 sin cargarlo ni serializarlo.
+    """
+    backlog_manager = _manager(backlog_id)
     try:
+        etag = _etag(*backlog_manager.version_info(), request.url.query)
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
         backlog = backlog_manager.load_backlog()
-        return backlog
+        response.headers["ETag"] = _etag(backlog.version, backlog.content_hash, request.url.query)
+        
+        paginated = any(value is not None for value in (priority, status, sprint, tag, limit, cursor)) or offset
+        if not paginated and view == BacklogView.FULL:
+            return _json_response(backlog, response)
+        
+        stories, total, next_cursor = backlog_manager.query_stories(
+            backlog,
+            priority=priority,
+            status=status,
+            sprint=sprint,
+            tag=tag,
+            offset=offset,
+            limit=limit,
+            cursor=cursor
+        )
+        response.headers["X-Total-Count"] = str(total)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        
+        if view == BacklogView.COMPACT:
+            summary = BacklogSummary(
+                **backlog.model_dump(exclude={"user_stories"}),
+                user_stories=[UserStorySummary.from_story(story) for story in stories]
+            )
+            return _json_response(summary, response)
+        return _json_response(backlog.model_copy(update={"user_stories": stories}), response)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo backlog: {str(e)}")
 
 
+@app.get("/api/backlogs/{backlog_id}/stories/{story_id}", response_model=UserStory)
+@app.get("/api/backlog/stories/{story_id}", response_model=UserStory)
+async def get_story(story_id: str, backlog_id: Optional[str] = None):
+    """Obtiene una Historia de Usuario del backlog"""
+    story = _manager(backlog_id).get_story(story_id)
+    if story is None:
+        raise HTTPException(status_code=404, detail=f"Historia de usuario no encontrada: {story_id}")
+    return _json_response(story)
+
+
+@app.put("/api/backlogs/{backlog_id}/stories/{story_id}", response_model=UserStory)
+@app.put("/api/backlog/stories/{story_id}", response_model=UserStory)
+async def put_story(
+    story_id: str,
+    story: UserStory,
+    request: Request,
+    response: Response,
+    backlog_id: Optional[str] = None,
+    expected_version: Optional[int] = None
+):
+    """
+    Crea o reemplaza una Historia de Usuario sin reescribir el backlog completo.
+    
+    Con If-Match o expected_version, responde 409 si el backlog ya no está en
+    esa versión.
+    """
+    if story.id != story_id:
+        raise HTTPException(status_code=400, detail="El ID de la historia no coincide con la URL")
+    backlog_manager = _manager(backlog_id)
+    expected_version = _expected_version(request, expected_version)
+    try:
+        async with backlog_manager.write_lock:
+            backlog = backlog_manager.save_story(story, expected_version=expected_version)
+        response.headers["ETag"] = _etag(backlog.version, backlog.content_hash, "")
+        return _json_response(story, response)
+        
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error guardando historia de usuario: {str(e)}")
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.MARKDOWN: "text/markdown",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.JSON: "application/json",
+    ExportFormat.PARQUET: "application/zip"
+}
+
+
+@app.get("/api/backlogs/{backlog_id}/export/{format}")
 @app.get("/api/export/{format}")
-async def export_backlog(format: ExportFormat):
+async def export_backlog(
+    format: ExportFormat,
+    request: Request,
+    backlog_id: Optional[str] = None,
+    gzip: bool = Query(default=False, description="Comprimir la descarga con gzip"),
+    archive: bool = Query(default=False, description="Generar el fichero completo antes de enviarlo")
+):
     """
     Exporta el backlog en el formato especificado.
     
@@ -197,34 +837,85 @@ async def export_backlog(format: ExportFormat):
     - markdown: Documento Markdown con tablas y detalles
     - csv: CSV compatible con herramientas como Excel, Linear, Jira
     - json: JSON estructurado completo
+    - parquet: zip con tablas parquet (HU, subtareas, casos de prueba, sprints
+      e historial de velocidad) para análisis; requiere pyarrow
+    
+    Cada versión del backlog se exporta una sola vez por formato: las
+    exportaciones quedan en una caché en disco y las repeticiones se sirven
+    desde ella. Si no está en caché, el documento se genera por fragmentos
+    directamente en la respuesta (con gzip=true, comprimido sobre la marcha)
+    mientras se guarda; con archive=true se genera entero antes de enviarlo.
+    Con If-None-Match y el backlog sin cambios responde 304 sin exportar.
     """
+    backlog_manager = _manager(backlog_id)
     try:
-        filepath = backlog_manager.export(format)
+        variant = f"export:{format}:{gzip}"
+        etag = _etag(*backlog_manager.version_info(), variant)
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        backlog = backlog_manager.load_backlog()
+        etag = _etag(backlog.version, backlog.content_hash, variant)
+        media_type = "application/gzip" if gzip else EXPORT_MEDIA_TYPES.get(format, "text/plain")
+        filename = backlog_manager.export_filename(backlog, format, gzip)
         
-        # Determinar media type
-        media_type = {
-            ExportFormat.MARKDOWN: "text/markdown",
-            ExportFormat.CSV: "text/csv",
-            ExportFormat.JSON: "application/json"
-        }.get(format, "text/plain")
+        headers = {"ETag": etag, "Content-Disposition": f'attachment; filename="{filename}"'}
+        # Se sirve desde el fichero ya abierto: un desalojo de la caché mientras
+        # se envía no trunca la descarga
+        if archive:
+            handle = backlog_manager.open_export(format, backlog, gzip)
+        else:
+            handle = backlog_manager.open_cached_export(backlog, format, gzip)
         
-        return FileResponse(
-            filepath,
+        if handle is not None:
+            headers["Content-Length"] = str(os.fstat(handle.fileno()).st_size)
+            return StreamingResponse(_iter_file(handle), media_type=media_type, headers=headers)
+        
+        return StreamingResponse(
+            backlog_manager.stream_export(backlog, format, gzip),
             media_type=media_type,
-            filename=filepath.split('/')[-1]
+            headers=headers
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error exportando backlog: {str(e)}")
 
 
+def _iter_file(handle, chunk_size: int = 64 * 1024):
+    """Lee un fichero abierto por bloques y lo cierra al terminar"""
+    with handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Estadísticas de aciertos y fallos de las cachés"""
+    return {
+        "llm": ai_agent.cache.stats() if ai_agent.cache else None,
+        "backlog": backlogs.cache_stats(),
+        "exports": backlogs.export_cache.stats()
+    }
+
+
+@app.get("/api/llm/rate-limit")
+async def rate_limit_stats():
+    """Estado del limitador de llamadas al modelo: esperas, reintentos, circuito y calibración"""
+    return ai_agent.limiter.stats()
+
+
 @app.delete("/api/backlog")
-async def clear_backlog():
-    """Elimina el backlog actual"""
+async def clear_backlog(request: Request, backlog_id: Optional[str] = None):
+    """Vacía el backlog actual (409 si no está en la versión de If-Match)"""
+    backlog_manager = _manager(backlog_id)
+    expected_version = _expected_version(request)
     try:
-        backlog_manager.backlog_file.unlink(missing_ok=True)
+        async with backlog_manager.write_lock:
+            backlog_manager.clear_backlog(expected_version=expected_version)
         return {"message": "Backlog eliminado exitosamente"}
         
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error eliminando backlog: {str(e)}")
 
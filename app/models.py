@@ -1,5 +1,5 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, computed_field, field_validator
 from datetime import datetime
 from enum import Enum
 
@@ -61,6 +61,11 @@ class Sprint(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
 
+    @computed_field(description="Puntos asignados sobre la capacidad")
+    @property
+    def utilization(self) -> float:
+        return round(self.total_points / self.capacity, 4) if self.capacity else 0.0
+
 
 class Backlog(BaseModel):
     """Backlog completo del producto"""
@@ -69,16 +74,173 @@ class Backlog(BaseModel):
     team_capacity: int = Field(default=9, description="Capacidad del equipo por sprint")
     velocity_history: List[int] = Field(default_factory=list, description="Histórico de story points completados")
     current_velocity: Optional[float] = None
+    version: int = Field(default=0, description="Se incrementa en cada escritura")
+    content_hash: Optional[str] = Field(default=None, description="Huella SHA-256 del contenido")
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class PlannedBacklog(Backlog):
+    """Backlog recién planificado, con las HU que no cupieron en ningún sprint"""
+    unplaced_stories: List[str] = Field(
+        default_factory=list, description="IDs de HU sin sprint (por num_sprints o por superar la capacidad)"
+    )
+
+    @staticmethod
+    def unplaced(backlog: Backlog) -> List[str]:
+        # La planificación deja sprint_assigned a None en las HU que no coloca
+        return [story.id for story in backlog.user_stories if story.sprint_assigned is None]
+
+    @classmethod
+    def from_backlog(cls, backlog: Backlog) -> "PlannedBacklog":
+        # Sin revalidar: el backlog ya es válido
+        return cls.model_construct(
+            **{name: getattr(backlog, name) for name in Backlog.model_fields},
+            unplaced_stories=cls.unplaced(backlog)
+        )
+
+
+class UserStorySummary(BaseModel):
+    """Resumen de una Historia de Usuario para vistas de listado"""
+    id: str
+    title: str
+    gherkin: str
+    story_points: int
+    priority: Priority
+    dependencies: List[str] = Field(default_factory=list)
+    sprint_assigned: Optional[int] = None
+    status: str = "Backlog"
+    tags: List[str] = Field(default_factory=list)
+    acceptance_criteria_count: int = 0
+    test_cases_count: int = 0
+    subtasks_count: int = 0
+    
+    class Config:
+        use_enum_values = True
+    
+    @classmethod
+    def from_story(cls, story: UserStory) -> "UserStorySummary":
+        return cls(
+            id=story.id,
+            title=story.title,
+            gherkin=story.gherkin,
+            story_points=story.story_points,
+            priority=story.priority,
+            dependencies=story.dependencies,
+            sprint_assigned=story.sprint_assigned,
+            status=story.status,
+            tags=story.tags,
+            acceptance_criteria_count=len(story.acceptance_criteria),
+            test_cases_count=len(story.test_cases),
+            subtasks_count=len(story.subtasks)
+        )
+
+
+class BacklogSummary(BaseModel):
+    """Backlog con HU resumidas (sin criterios, casos de prueba ni subtareas)"""
+    user_stories: List[UserStorySummary] = Field(default_factory=list)
+    sprints: List[Sprint] = Field(default_factory=list)
+    team_capacity: int
+    velocity_history: List[int] = Field(default_factory=list)
+    current_velocity: Optional[float] = None
+    version: int = 0
+    content_hash: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class BacklogInfo(BaseModel):
+    """Entrada del índice de backlogs: metadatos sin cargar el backlog"""
+    id: str
+    name: str
+    story_count: int = 0
+    total_points: int = 0
+    sprint_count: int = 0
+    version: int = 0
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
 
+# IDs que no pueden usarse para un backlog (nombres de ficheros del registro, antes o ahora)
+RESERVED_BACKLOG_IDS = frozenset({"index"})
+
+
+class CreateBacklogRequest(BaseModel):
+    """Request para crear un backlog vacío"""
+    id: str = Field(..., pattern=r"^[A-Za-z0-9_-]{1,64}$", description="Identificador (letras, dígitos, - y _)")
+    name: Optional[str] = Field(default=None, description="Nombre descriptivo; por defecto el ID")
+    team_capacity: int = Field(default=9, ge=1, le=100)
+
+    @field_validator("id")
+    @classmethod
+    def _not_reserved(cls, value: str) -> str:
+        if value in RESERVED_BACKLOG_IDS:
+            raise ValueError(f"ID de backlog reservado: {value}")
+        return value
+
+
+class UpdateBacklogRequest(BaseModel):
+    """Request para renombrar un backlog"""
+    name: str = Field(..., min_length=1)
+
+
+class BacklogView(str, Enum):
+    FULL = "full"
+    COMPACT = "compact"
+
+
 class GenerateBacklogRequest(BaseModel):
     """Request para generar backlog desde requisitos"""
     requirements: str = Field(..., description="Requisitos de negocio en lenguaje ubicuo")
     team_capacity: int = Field(default=9, ge=1, le=100, description="Capacidad del equipo en story points por sprint")
     additional_context: Optional[str] = None
     priority_guidance: Optional[str] = None
+    fan_out: Optional[bool] = Field(
+        default=None,
+        description="Generar por secciones en paralelo; por defecto se activa con requisitos extensos"
+    )
+    bypass_cache: bool = Field(default=False, description="Ignorar respuestas cacheadas del modelo")
+    backlog_id: Optional[str] = Field(default=None, description="Backlog destino (se crea si no existe)")
+    expected_version: Optional[int] = Field(
+        default=None,
+        description="Versión sobre la que se genera; por defecto la que hay al empezar"
+    )
+
+
+class BatchGenerateRequest(BaseModel):
+    """Request para generar varios backlogs en una sola llamada"""
+    items: List[GenerateBacklogRequest] = Field(..., min_length=1, description="Una generación por backlog")
+    max_concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Generaciones simultáneas; por defecto (y como máximo) BATCH_MAX_CONCURRENCY"
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Resultado de una generación del lote"""
+    index: int = Field(..., description="Posición del elemento en la petición (desde 0)")
+    backlog_id: str
+    status: str = Field(..., description="succeeded o failed")
+    version: Optional[int] = None
+    story_count: int = 0
+    total_points: int = 0
+    sprint_count: int = 0
+    unplaced_stories: List[str] = Field(default_factory=list, description="HU que quedaron sin sprint")
+    error: Optional[str] = None
+    error_status: Optional[int] = None
+    elapsed_seconds: float = 0.0
+
+
+class BatchGenerateResponse(BaseModel):
+    """Resultados del lote en el orden de la petición"""
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+    elapsed_seconds: float
+
+
+class PlanningStrategy(str, Enum):
+    FIRST_FIT = "first_fit"
+    GREEDY = "greedy"
 
 
 class PlanSprintsRequest(BaseModel):
@@ -86,17 +248,49 @@ class PlanSprintsRequest(BaseModel):
     backlog_id: Optional[str] = None
     team_capacity: int = Field(default=9)
     num_sprints: Optional[int] = Field(default=None, description="Número de sprints a planificar")
+    strategy: Optional[PlanningStrategy] = Field(
+        default=None, description="Estrategia de planificación; por defecto SPRINT_PLANNER"
+    )
+    expected_version: Optional[int] = Field(default=None, description="Rechazar (409) si el backlog ya no está en esta versión")
 
 
 class UpdateVelocityRequest(BaseModel):
     """Request para actualizar velocidad del equipo"""
+    backlog_id: Optional[str] = None
     sprint_number: int
     completed_points: int
     total_points: int
     feedback: Optional[str] = None
+    expected_version: Optional[int] = Field(default=None, description="Rechazar (409) si el backlog ya no está en esta versión")
 
 
 class ExportFormat(str, Enum):
     MARKDOWN = "markdown"
     CSV = "csv"
     JSON = "json"
+    PARQUET = "parquet"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    """Trabajo en segundo plano (p. ej. una generación de backlog)"""
+    id: str
+    kind: str
+    status: JobStatus = JobStatus.QUEUED
+    attempts: int = Field(default=0, description="Ejecuciones iniciadas (se reintenta si el proceso cae)")
+    progress: Dict[str, Any] = Field(default_factory=dict, description="Último progreso informado")
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = Field(default=None, description="Código HTTP equivalente al error (p. ej. 409)")
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        use_enum_values = True
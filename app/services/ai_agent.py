@@ -1,8 +1,23 @@
+import asyncio
+import functools
 import json
-from typing import List, Dict
-from openai import AzureOpenAI
+import logging
+from pathlib import Path
+from typing import AsyncIterator, List, Dict, Optional
+import httpx
+from openai import AsyncAzureOpenAI
 from app.config import get_settings
 from app.models import UserStory, SubTask, TestCase, Priority, Backlog
+from app.services.dependency_graph import DependencyGraph
+from app.services.fanout import StoryMerger, merge_story_batches, split_requirements
+from app.services.llm_cache import LLMCache
+from app.services.metrics import stage
+from app.services.rate_limiter import RateLimiter
+from app.services.sprint_planner import get_planner
+from app.services.stream_parser import UserStoriesStreamParser
+
+
+logger = logging.getLogger(__name__)
 
 
 class AIAgent:
@@ -10,79 +25,320 @@ class AIAgent:
     
     def __init__(self):
         self.settings = get_settings()
-        self.client = AzureOpenAI(
+        # Cliente HTTP compartido: un único pool de conexiones keep-alive
+        # para todas las generaciones concurrentes del worker
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.settings.AZURE_OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=self.settings.AZURE_OPENAI_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(self.settings.AZURE_OPENAI_TIMEOUT, connect=10.0)
+        )
+        self.client = AsyncAzureOpenAI(
             api_key=self.settings.AZURE_OPENAI_API_KEY,
             api_version=self.settings.AZURE_OPENAI_API_VERSION,
-            azure_endpoint=self.settings.AZURE_OPENAI_ENDPOINT
+            azure_endpoint=self.settings.AZURE_OPENAI_ENDPOINT,
+            http_client=self.http_client,
+            # Los reintentos los gestiona el limitador, compartido por todas las llamadas
+            max_retries=0
+        )
+        self.limiter = RateLimiter(
+            rpm=self.settings.AZURE_OPENAI_RPM,
+            tpm=self.settings.AZURE_OPENAI_TPM,
+            max_retries=self.settings.AZURE_OPENAI_MAX_RETRIES,
+            backoff_base=self.settings.AZURE_OPENAI_BACKOFF_BASE,
+            backoff_max=self.settings.AZURE_OPENAI_BACKOFF_MAX,
+            breaker_threshold=self.settings.AZURE_OPENAI_BREAKER_THRESHOLD,
+            breaker_cooldown=self.settings.AZURE_OPENAI_BREAKER_COOLDOWN
         )
+        # Una estrategia mal configurada falla al arrancar, no en la primera planificación
+        self.planner = get_planner(self.settings.SPRINT_PLANNER)
+        self.cache = LLMCache(
+            Path(self.settings.DATA_DIR) / "llm_cache",
+            max_bytes=self.settings.LLM_CACHE_MAX_BYTES,
+            ttl_seconds=self.settings.LLM_CACHE_TTL_SECONDS
+        ) if self.settings.LLM_CACHE_ENABLED else None
+    
+    async def aclose(self) -> None:
+        """Cierra el cliente y libera las conexiones del pool"""
+        await self.client.close()
         
-    def generate_user_stories(
+    async def generate_user_stories(
         self, 
         requirements: str, 
         additional_context: str = None,
-        priority_guidance: str = None
+        priority_guidance: str = None,
+        fan_out: Optional[bool] = None,
+        use_cache: bool = True
     ) -> List[UserStory]:
-        """Genera Historias de Usuario desde requisitos de negocio"""
+        """
+        Genera Historias de Usuario desde requisitos de negocio.
         
+        Con `fan_out` (por defecto, cuando los requisitos superan FANOUT_CHUNK_CHARS)
+        el documento se divide en secciones que se generan en paralelo y se fusionan.
+        Con `use_cache=False` se ignoran las respuestas cacheadas (y se refrescan).
+        """
+        fan_out = self.uses_fan_out(requirements, fan_out)
+        sections = split_requirements(requirements, self.settings.FANOUT_CHUNK_CHARS) if fan_out else []
+        
+        if len(sections) > 1:
+            user_stories = await self._generate_sections(
+                sections, additional_context, priority_guidance, use_cache
+            )
+        else:
+            user_stories = await self._generate_section(
+                requirements, additional_context, priority_guidance, use_cache
+            )
+        
+        # Ordenar por prioridad y dependencias
+        return self.prioritize_stories(user_stories)
+    
+    def uses_fan_out(self, requirements: str, fan_out: Optional[bool] = None) -> bool:
+        """Si la generación se hará por secciones (por defecto, con requisitos extensos)"""
+        if fan_out is None:
+            return len(requirements) > self.settings.FANOUT_CHUNK_CHARS
+        return fan_out
+    
+    async def _generate_section(
+        self,
+        requirements: str,
+        additional_context: str = None,
+        priority_guidance: str = None,
+        use_cache: bool = True
+    ) -> List[UserStory]:
+        """Genera las HU de un bloque de requisitos con una única llamada al modelo"""
         system_prompt = self._build_system_prompt()
         user_prompt = self._build_user_prompt(requirements, additional_context, priority_guidance)
         
-        response = self.client.chat.completions.create(
-            model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
+        content = await self._complete(system_prompt, user_prompt, use_cache)
+        with stage("ai_agent", "json_parse"):
+            data = json.loads(content)
+        
+        with stage("ai_agent", "build_stories"):
+            return [self._build_user_story(hu_data) for hu_data in data.get("user_stories", [])]
+    
+    async def _generate_sections(
+        self,
+        sections: List[str],
+        additional_context: str = None,
+        priority_guidance: str = None,
+        use_cache: bool = True
+    ) -> List[UserStory]:
+        """Genera las secciones en paralelo (con concurrencia acotada) y fusiona el resultado"""
+        batches = await asyncio.gather(
+            *self._section_calls(sections, additional_context, priority_guidance, use_cache)
         )
         
-        content = response.choices[0].message.content
-        data = json.loads(content)
+        return merge_story_batches(list(batches))
+    
+    def _section_calls(
+        self,
+        sections: List[str],
+        additional_context: str = None,
+        priority_guidance: str = None,
+        use_cache: bool = True
+    ) -> List:
+        """Una corrutina por sección, con a lo sumo FANOUT_MAX_CONCURRENCY llamadas a la vez"""
+        semaphore = asyncio.Semaphore(self.settings.FANOUT_MAX_CONCURRENCY)
         
-        user_stories = []
-        for hu_data in data.get("user_stories", []):
-            # Convertir subtareas
-            subtasks = [
-                SubTask(
-                    id=st.get("id", f"{hu_data['id']}-ST{i+1}"),
-                    title=st.get("title", ""),
-                    description=st.get("description"),
-                    estimated_hours=st.get("estimated_hours")
-                )
-                for i, st in enumerate(hu_data.get("subtasks", []))
-            ]
-            
-            # Convertir casos de prueba
-            test_cases = [
-                TestCase(
-                    id=tc.get("id", f"{hu_data['id']}-TC{i+1}"),
-                    title=tc.get("title", ""),
-                    description=tc.get("description", ""),
-                    preconditions=tc.get("preconditions"),
-                    steps=tc.get("steps", []),
-                    expected_result=tc.get("expected_result", ""),
-                    test_type=tc.get("test_type", "functional")
+        async def generate(index: int, section: str) -> List[UserStory]:
+            async with semaphore:
+                return await self._generate_section(
+                    f"(Sección {index} de {len(sections)} del documento de requisitos)\n\n{section}",
+                    additional_context,
+                    priority_guidance,
+                    use_cache
                 )
-                for i, tc in enumerate(hu_data.get("test_cases", []))
-            ]
-            
-            user_story = UserStory(
-                id=hu_data["id"],
-                title=hu_data["title"],
-                gherkin=hu_data["gherkin"],
-                acceptance_criteria=hu_data["acceptance_criteria"],
-                test_cases=test_cases,
-                story_points=hu_data["story_points"],
-                priority=Priority(hu_data["priority"]),
-                dependencies=hu_data.get("dependencies", []),
-                subtasks=subtasks,
-                tags=hu_data.get("tags", [])
+        
+        return [generate(i, section) for i, section in enumerate(sections, 1)]
+    
+    async def stream_user_stories(
+        self,
+        requirements: str,
+        additional_context: str = None,
+        priority_guidance: str = None,
+        fan_out: Optional[bool] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[UserStory]:
+        """
+        Genera Historias de Usuario en streaming.
+
+        Cada HU se emite en cuanto su objeto JSON llega completo; el orden es el
+        de generación, la priorización queda a cargo del consumidor. Con fan-out
+        (ver generate_user_stories) se emiten las HU fusionadas de cada sección al
+        terminar ésta y las anteriores.
+        """
+        fan_out = self.uses_fan_out(requirements, fan_out)
+        sections = split_requirements(requirements, self.settings.FANOUT_CHUNK_CHARS) if fan_out else []
+        if len(sections) > 1:
+            async for story in self._stream_sections(sections, additional_context, priority_guidance, use_cache):
+                yield story
+            return
+        
+        system_prompt = self._build_system_prompt()
+        user_prompt = self._build_user_prompt(requirements, additional_context, priority_guidance)
+        parser = UserStoriesStreamParser()
+        
+        async for delta in self._stream_completion(system_prompt, user_prompt, use_cache):
+            for hu_data in parser.feed(delta):
+                yield self._build_user_story(hu_data)
+    
+    async def _stream_sections(
+        self,
+        sections: List[str],
+        additional_context: str = None,
+        priority_guidance: str = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[UserStory]:
+        """Genera las secciones en paralelo y emite sus HU fusionadas en orden de sección"""
+        tasks = [
+            asyncio.create_task(call)
+            for call in self._section_calls(sections, additional_context, priority_guidance, use_cache)
+        ]
+        merger = StoryMerger()
+        try:
+            # En orden: los IDs fusionados son los mismos que sin streaming
+            for task in tasks:
+                for story in merger.add(await task):
+                    yield story
+        finally:
+            # Si la generación falla o el cliente se desconecta no quedan llamadas huérfanas
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _stream_completion(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """Ejecuta la llamada al modelo en modo streaming y emite los fragmentos de texto"""
+        cache_key = self._cache_key(system_prompt, user_prompt)
+        if use_cache and self.cache:
+            cached = self.cache.get_content(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        prompt_chars = len(system_prompt) + len(user_prompt)
+        estimated_tokens = self.limiter.estimate_tokens(prompt_chars)
+        with stage("ai_agent", "llm_request"):
+            stream = await self.limiter.run(
+                functools.partial(
+                    self.client.chat.completions.create,
+                    model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=self.settings.AZURE_OPENAI_TEMPERATURE,
+                    response_format={"type": "json_object"},
+                    stream=True,
+                    # El último chunk trae el consumo real de tokens
+                    stream_options={"include_usage": True}
+                ),
+                estimated_tokens
             )
-            user_stories.append(user_story)
         
-        # Ordenar por prioridad y dependencias
-        return self._prioritize_stories(user_stories)
+        parts = []
+        finish_reason = None
+        usage = None
+        with stage("ai_agent", "llm_stream"):
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                # Azure envía chunks sin choices (p. ej. resultados del filtro de contenido o el de usage)
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        
+        self.limiter.record_usage(estimated_tokens, prompt_chars, usage)
+        if self.cache and finish_reason == "stop":
+            self.cache.put_content(cache_key, "".join(parts))
+    
+    async def _complete(self, system_prompt: str, user_prompt: str, use_cache: bool = True) -> str:
+        """Ejecuta la llamada al modelo y devuelve el contenido JSON de la respuesta"""
+        cache_key = self._cache_key(system_prompt, user_prompt)
+        if use_cache and self.cache:
+            cached = self.cache.get_content(cache_key)
+            if cached is not None:
+                return cached
+        
+        prompt_chars = len(system_prompt) + len(user_prompt)
+        estimated_tokens = self.limiter.estimate_tokens(prompt_chars)
+        with stage("ai_agent", "llm_request"):
+            response = await self.limiter.run(
+                functools.partial(
+                    self.client.chat.completions.create,
+                    model=self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=self.settings.AZURE_OPENAI_TEMPERATURE,
+                    response_format={"type": "json_object"}
+                ),
+                estimated_tokens
+            )
+        self.limiter.record_usage(estimated_tokens, prompt_chars, response.usage)
+        
+        content = response.choices[0].message.content
+        # Solo se cachean respuestas completas (no truncadas ni filtradas)
+        if self.cache and response.choices[0].finish_reason == "stop":
+            self.cache.put_content(cache_key, content)
+        
+        return content
+    
+    def _cache_key(self, system_prompt: str, user_prompt: str) -> str:
+        return LLMCache.fingerprint(
+            system_prompt,
+            user_prompt,
+            self.settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+            self.settings.AZURE_OPENAI_TEMPERATURE
+        )
+    
+    def _build_user_story(self, hu_data: Dict) -> UserStory:
+        """Convierte un elemento de `user_stories` del JSON del modelo en una UserStory"""
+        # Convertir subtareas
+        subtasks = [
+            SubTask(
+                id=st.get("id", f"{hu_data['id']}-ST{i+1}"),
+                title=st.get("title", ""),
+                description=st.get("description"),
+                estimated_hours=st.get("estimated_hours")
+            )
+            for i, st in enumerate(hu_data.get("subtasks", []))
+        ]
+        
+        # Convertir casos de prueba
+        test_cases = [
+            TestCase(
+                id=tc.get("id", f"{hu_data['id']}-TC{i+1}"),
+                title=tc.get("title", ""),
+                description=tc.get("description", ""),
+                preconditions=tc.get("preconditions"),
+                steps=tc.get("steps", []),
+                expected_result=tc.get("expected_result", ""),
+                test_type=tc.get("test_type", "functional")
+            )
+            for i, tc in enumerate(hu_data.get("test_cases", []))
+        ]
+        
+        return UserStory(
+            id=hu_data["id"],
+            title=hu_data["title"],
+            gherkin=hu_data["gherkin"],
+            acceptance_criteria=hu_data["acceptance_criteria"],
+            test_cases=test_cases,
+            story_points=hu_data["story_points"],
+            priority=Priority(hu_data["priority"]),
+            dependencies=hu_data.get("dependencies", []),
+            subtasks=subtasks,
+            tags=hu_data.get("tags", [])
+        )
     
     def _build_system_prompt(self) -> str:
         return """Eres un experto Scrum Master y Product Owner asistido por IA.
@@ -217,74 +473,37 @@ Responde ÚNICAMENTE con el JSON solicitado, sin texto adicional."""
         
         return prompt
     
-    def _prioritize_stories(self, stories: List[UserStory]) -> List[UserStory]:
-        """Ordena historias por prioridad y dependencias"""
-        
-        # Diccionario de prioridad
-        priority_order = {Priority.ALTA: 0, Priority.MEDIA: 1, Priority.BAJA: 2}
+    @stage("ai_agent", "prioritize")
+    def prioritize_stories(self, stories: List[UserStory]) -> List[UserStory]:
+        """
+        Ordena historias por prioridad y dependencias.
         
-        def get_priority_score(story: UserStory) -> tuple:
-            # Primero por prioridad, luego por número de dependencias hacia esta HU
-            dependent_count = sum(1 for s in stories if story.id in s.dependencies)
-            return (priority_order[story.priority], -dependent_count, story.id)
-        
-        # Ordenar
-        sorted_stories = sorted(stories, key=get_priority_score)
-        
-        return sorted_stories
+        Ninguna HU queda por delante de sus prerrequisitos. Las dependencias que
+        el modelo haya generado en ciclo se descartan (con un aviso en el log)
+        en lugar de perder la generación.
+        """
+        graph = DependencyGraph(stories)
+        removed = graph.remove_cycles()
+        if removed:
+            logger.warning(
+                "Dependencias circulares descartadas: %s",
+                ", ".join(f"{story_id} ya no depende de {dep_id}" for story_id, dep_id in removed)
+            )
+        return graph.priority_order()
     
+    @stage("ai_agent", "sprint_planning")
     def suggest_sprint_planning(
         self, 
         user_stories: List[UserStory], 
         team_capacity: int,
-        num_sprints: int = None
+        num_sprints: int = None,
+        strategy: str = None
     ) -> Dict:
-        """Sugiere distribución de HU en sprints"""
-        
-        sprints = []
-        current_sprint = 1
-        current_capacity = 0
-        current_stories = []
+        """
+        Sugiere distribución de HU en sprints.
         
-        for story in user_stories:
-            # Si la historia cabe en el sprint actual
-            if current_capacity + story.story_points <= team_capacity:
-                current_capacity += story.story_points
-                current_stories.append(story.id)
-                story.sprint_assigned = current_sprint
-            else:
-                # Guardar sprint actual si tiene historias
-                if current_stories:
-                    sprints.append({
-                        "number": current_sprint,
-                        "name": f"Sprint {current_sprint}",
-                        "capacity": team_capacity,
-                        "user_stories": current_stories,
-                        "total_points": current_capacity
-                    })
-                    current_sprint += 1
-                    
-                    # Si hay límite de sprints
-                    if num_sprints and current_sprint > num_sprints:
-                        break
-                
-                # Comenzar nuevo sprint
-                current_stories = [story.id]
-                current_capacity = story.story_points
-                story.sprint_assigned = current_sprint
-        
-        # Agregar último sprint si tiene historias
-        if current_stories:
-            sprints.append({
-                "number": current_sprint,
-                "name": f"Sprint {current_sprint}",
-                "capacity": team_capacity,
-                "user_stories": current_stories,
-                "total_points": current_capacity
-            })
-        
-        return {
-            "sprints": sprints,
-            "total_sprints": len(sprints),
-            "total_points": sum(s["total_points"] for s in sprints)
-        }
+        La estrategia por defecto es SPRINT_PLANNER; el resultado incluye la
+        utilización de cada sprint y las HU que quedaron sin planificar.
+        """
+        planner = get_planner(strategy) if strategy else self.planner
+        return planner.plan(user_stories, team_capacity, num_sprints)
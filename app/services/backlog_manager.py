@@ -1,224 +1,649 @@
+import asyncio
 import json
 import csv
-from typing import List
+import hashlib
+import io
+import tempfile
+import threading
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
 from app.models import Backlog, UserStory, Sprint, UpdateVelocityRequest, ExportFormat
 from app.config import get_settings
+from app.services.columnar_export import parquet_archive
+from app.services.disk_cache import DiskCache
+from app.services.metrics import stage
+from app.services.storage import JSONBacklogStorage, create_storage
+
+
+# Backlog que se usa cuando no se indica ninguno (el de DATA_DIR/backlog.json)
+DEFAULT_BACKLOG_ID = "default"
+
+# Tamaño aproximado de cada bloque de una exportación en streaming
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Forma parte de la clave de la caché de exportaciones: súbelo al cambiar cualquier exportador
+EXPORTER_VERSION = 3
+
+EXPORT_SUFFIXES = {
+    ExportFormat.MARKDOWN: ".md",
+    ExportFormat.CSV: ".csv",
+    ExportFormat.JSON: ".json",
+    ExportFormat.PARQUET: ".parquet.zip"
+}
+
+
+class VersionConflictError(Exception):
+    """El backlog cambió desde la versión sobre la que se calculó la escritura"""
+    
+    def __init__(self, backlog_id: str, expected: int, actual: int):
+        self.backlog_id = backlog_id
+        self.expected = expected
+        self.actual = actual
+        super().__init__(
+            f"El backlog {backlog_id} cambió: se esperaba la versión {expected} y la actual es la {actual}"
+        )
 
 
 class BacklogManager:
-    """Gestiona el backlog, sprints y velocidad del equipo"""
+    """
+    Gestiona un backlog, sus sprints y la velocidad del equipo.
+    
+    El backlog `default` vive en `DATA_DIR/backlog.*` (ubicación histórica); el
+    resto en `DATA_DIR/backlogs/<id>.*`, un fichero o base de datos por backlog.
+    Cada gestor tiene su propio cerrojo, así que backlogs distintos no compiten.
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        backlog_id: str = DEFAULT_BACKLOG_ID,
+        export_cache: Optional[DiskCache] = None,
+        on_change: Optional[Callable[["BacklogManager", Backlog, Optional[int]], None]] = None
+    ):
         self.settings = get_settings()
+        self.backlog_id = backlog_id
         self.data_dir = Path(self.settings.DATA_DIR)
         self.exports_dir = Path(self.settings.EXPORTS_DIR)
         self.data_dir.mkdir(exist_ok=True)
         self.exports_dir.mkdir(exist_ok=True)
-        self.backlog_file = self.data_dir / "backlog.json"
-    
-    def save_backlog(self, backlog: Backlog) -> None:
-        """Guarda el backlog en disco"""
-        backlog.updated_at = datetime.now()
-        with open(self.backlog_file, 'w', encoding='utf-8') as f:
-            json.dump(backlog.model_dump(mode='json'), f, indent=2, default=str, ensure_ascii=False)
+        
+        storage_dir, name = storage_location(self.data_dir, backlog_id)
+        storage_dir.mkdir(exist_ok=True)
+        self.backlog_file = storage_dir / f"{name}.json"
+        self.storage = create_storage(
+            self.settings.BACKLOG_STORAGE,
+            storage_dir,
+            name=name,
+            journal_compact_bytes=self.settings.BACKLOG_JOURNAL_COMPACT_BYTES,
+            json_pretty=self.settings.BACKLOG_JSON_PRETTY
+        )
+        self.export_cache = export_cache or DiskCache(
+            self.exports_dir / "cache",
+            max_bytes=self.settings.EXPORT_CACHE_MAX_BYTES,
+            ttl_seconds=self.settings.EXPORT_CACHE_TTL_SECONDS
+        )
+        # Se avisa tras cada escritura, p. ej. para el índice; en las de grano fino
+        # con la variación de story points (en las completas, None)
+        self.on_change = on_change
+        self.lock = threading.RLock()
+        # Serializa las lecturas-modificación-escritura de los endpoints de este backlog
+        self.write_lock = asyncio.Lock()
+        
+        # Caché en memoria del backlog validado
+        self._cached_backlog: Optional[Backlog] = None
+        self._cached_token = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_invalidations = 0
+        
+        # Al estrenar otro motor se importa el backlog JSON existente (una sola vez)
+        if not isinstance(self.storage, JSONBacklogStorage) and not self.storage.exists() and self.backlog_file.exists():
+            with self.storage.file_lock.exclusive():
+                # Otro worker puede haberlo importado mientras se esperaba el cerrojo
+                if not self.storage.exists() and self.backlog_file.exists():
+                    self.import_json(self.backlog_file)
+                    self.backlog_file.rename(self.backlog_file.with_suffix(".imported.json"))
     
-    def load_backlog(self) -> Backlog:
-        """Carga el backlog desde disco"""
-        if not self.backlog_file.exists():
-            return Backlog()
+    def save_backlog(self, backlog: Backlog, expected_version: Optional[int] = None) -> None:
+        """
+        Guarda el backlog en disco con una versión nueva.
         
-        with open(self.backlog_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return Backlog(**data)
+        Con `expected_version`, solo si la versión almacenada sigue siendo esa;
+        si no, lanza VersionConflictError.
+        """
+        with self.lock, self.storage.file_lock.exclusive():
+            backlog.version = self.check_version(expected_version) + 1
+            backlog.updated_at = datetime.now()
+            with stage("backlog_manager", "content_hash"):
+                backlog.content_hash = self._content_hash(backlog)
+            with stage("backlog_manager", "save"):
+                self.storage.save(backlog)
+            self._remember(backlog)
     
-    def update_velocity(self, request: UpdateVelocityRequest) -> Backlog:
-        """Actualiza la velocidad del equipo basado en sprint completado"""
-        backlog = self.load_backlog()
+    def load_backlog(self, for_update: bool = False) -> Backlog:
+        """
+        Carga el backlog desde disco.
         
-        # Actualizar sprint
-        for sprint in backlog.sprints:
-            if sprint.number == request.sprint_number:
-                sprint.completed_points = request.completed_points
-                sprint.status = "Completado"
-                break
+        El backlog validado se mantiene en memoria mientras el almacenamiento no
+        cambie (escrituras propias o de otros procesos), así que la instancia
+        devuelta es compartida y no debe modificarse; con `for_update=True` se
+        devuelve una copia que sí puede modificarse antes de guardarla.
+        """
+        with self.lock, self.storage.file_lock.shared():
+            token = self.storage.change_token()
+            if self._cached_backlog is not None and token == self._cached_token:
+                self.cache_hits += 1
+            else:
+                if self._cached_backlog is not None:
+                    self.cache_invalidations += 1
+                self.cache_misses += 1
+                with stage("backlog_manager", "load"):
+                    self._cached_backlog = self.storage.load()
+                self._cached_token = token
+            backlog = self._cached_backlog
         
-        # Agregar a historial de velocidad
-        backlog.velocity_history.append(request.completed_points)
+        if for_update:
+            return backlog.model_copy(deep=True)
+        return backlog
+    
+    def version_info(self) -> Tuple[int, Optional[str]]:
+        """
+        Versión y huella del backlog almacenado.
+        
+        Con el backlog en caché y el almacenamiento sin cambios no lee nada; si
+        no, se la pide al motor y solo como último recurso carga el backlog.
+        """
+        with self.lock, self.storage.file_lock.shared():
+            token = self.storage.change_token()
+            if self._cached_backlog is not None and token == self._cached_token:
+                return self._cached_backlog.version, self._cached_backlog.content_hash
+            stored = self.storage.read_version()
+            if stored is not None:
+                return stored
+            backlog = self.load_backlog()
+            return backlog.version, backlog.content_hash
+    
+    def check_version(self, expected_version: Optional[int]) -> int:
+        """Versión almacenada; VersionConflictError si no es la esperada"""
+        version = self.version_info()[0]
+        if expected_version is not None and version != expected_version:
+            raise VersionConflictError(self.backlog_id, expected_version, version)
+        return version
+    
+    def cache_stats(self) -> Dict:
+        """Contadores de la caché en memoria del backlog"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_ratio": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.cache_invalidations
+        }
+    
+    def clear_backlog(self, expected_version: Optional[int] = None) -> None:
+        """
+        Vacía el backlog. Se guarda un backlog vacío con versión nueva en lugar
+        de borrar el almacenamiento: la versión nunca retrocede, así que los
+        ETags y las exportaciones en caché de antes de vaciarlo no vuelven a
+        ser válidos.
+        """
+        self.save_backlog(Backlog(), expected_version=expected_version)
+    
+    def get_story(self, story_id: str) -> Optional[UserStory]:
+        """
+        Obtiene una Historia de Usuario: del backlog en memoria si está al día
+        y, si no, del motor sin cargar el backlog completo. Con JSON leer una HU
+        cuesta lo mismo que cargar el backlog, así que se carga (y queda en caché).
+        """
+        with self.lock:
+            cached = self._cached_backlog is not None and self.storage.change_token() == self._cached_token
+        if cached or isinstance(self.storage, JSONBacklogStorage):
+            return next((story for story in self.load_backlog().user_stories if story.id == story_id), None)
+        return self.storage.get_story(story_id)
+    
+    def save_story(self, story: UserStory, expected_version: Optional[int] = None) -> Backlog:
+        """Crea o reemplaza una Historia de Usuario sin reescribir el backlog completo"""
+        with self.lock, self.storage.file_lock.exclusive():
+            self.check_version(expected_version)
+            backlog = self.load_backlog()
+            user_stories = list(backlog.user_stories)
+            position = next((i for i, s in enumerate(user_stories) if s.id == story.id), None)
+            if position is None:
+                points_delta = story.story_points
+                user_stories.append(story)
+            else:
+                points_delta = story.story_points - user_stories[position].story_points
+                user_stories[position] = story
+            
+            updated = backlog.model_copy(update={"user_stories": user_stories})
+            self._commit_changes(updated, stories=[story], points_delta=points_delta)
+            return updated
+    
+    def query_stories(
+        self,
+        backlog: Backlog,
+        priority: Optional[str] = None,
+        status: Optional[str] = None,
+        sprint: Optional[int] = None,
+        tag: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[UserStory], int, Optional[str]]:
+        """
+        Filtra y pagina las HU de un backlog.
         
-        # Calcular velocidad promedio (últimos 3 sprints)
-        recent_velocity = backlog.velocity_history[-3:]
-        backlog.current_velocity = sum(recent_velocity) / len(recent_velocity)
+        `sprint=0` selecciona las HU sin sprint asignado. `cursor` es el ID de la
+        última HU de la página anterior; la página empieza justo después.
+        Devuelve la página, el total de HU que cumplen los filtros y el cursor
+        de la página siguiente (None si no hay más).
+        """
+        stories = [
+            story for story in backlog.user_stories
+            if (priority is None or story.priority == priority)
+            and (status is None or story.status == status)
+            and (sprint is None or (story.sprint_assigned or 0) == sprint)
+            and (tag is None or tag in story.tags)
+        ]
         
-        # Ajustar capacidad del equipo si es necesario
-        if len(recent_velocity) >= 3:
-            backlog.team_capacity = int(backlog.current_velocity)
+        start = offset
+        if cursor is not None:
+            position = next((i for i, story in enumerate(stories) if story.id == cursor), None)
+            if position is None:
+                raise ValueError(f"Cursor no válido: {cursor}")
+            start += position + 1
         
+        end = len(stories) if limit is None else start + limit
+        page = stories[start:end]
+        next_cursor = page[-1].id if page and end < len(stories) else None
+        return page, len(stories), next_cursor
+    
+    def import_json(self, path: Path) -> Backlog:
+        """Importa un backlog desde un fichero JSON (formato de export_json)"""
+        source = JSONBacklogStorage(path)
+        if source.file_lock.path == self.storage.file_lock.path:
+            # El JSON histórico de este backlog usa su mismo `.lock`: un segundo
+            # flock sobre otro descriptor se bloquearía contra el que ya se tiene
+            source.file_lock = self.storage.file_lock
+        backlog = source.load()
         self.save_backlog(backlog)
         return backlog
     
-    def export_markdown(self, backlog: Backlog) -> str:
-        """Exporta el backlog a formato Markdown"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self.exports_dir / f"backlog_{timestamp}.md"
+    def update_velocity(self, request: UpdateVelocityRequest, expected_version: Optional[int] = None) -> Backlog:
+        """Actualiza la velocidad del equipo basado en sprint completado"""
+        with self.lock, self.storage.file_lock.exclusive():
+            self.check_version(expected_version)
+            # Copia superficial: solo se reemplaza lo que cambia
+            backlog = self.load_backlog()
+            
+            # Actualizar sprint
+            sprints = list(backlog.sprints)
+            updated_sprint = None
+            for i, sprint in enumerate(sprints):
+                if sprint.number == request.sprint_number:
+                    updated_sprint = sprint.model_copy(update={
+                        "completed_points": request.completed_points,
+                        "status": "Completado"
+                    })
+                    sprints[i] = updated_sprint
+                    break
+            
+            # Agregar a historial de velocidad
+            velocity_history = backlog.velocity_history + [request.completed_points]
+            
+            # Calcular velocidad promedio (últimos 3 sprints)
+            recent_velocity = velocity_history[-3:]
+            current_velocity = sum(recent_velocity) / len(recent_velocity)
+            
+            # Ajustar capacidad del equipo si es necesario
+            team_capacity = int(current_velocity) if len(recent_velocity) >= 3 else backlog.team_capacity
+            
+            updated = backlog.model_copy(update={
+                "sprints": sprints,
+                "velocity_history": velocity_history,
+                "current_velocity": current_velocity,
+                "team_capacity": team_capacity
+            })
+            # Solo se persiste lo que cambió: el sprint y los metadatos
+            self._commit_changes(updated, sprints=[updated_sprint] if updated_sprint is not None else [])
+            return updated
+    
+    @stage("backlog_manager", "commit_changes")
+    def _commit_changes(
+        self,
+        backlog: Backlog,
+        stories: List[UserStory] = (),
+        sprints: List[Sprint] = (),
+        points_delta: int = 0
+    ) -> None:
+        """
+        Persiste escrituras de grano fino con una versión nueva. La huella se
+        encadena con lo escrito en lugar de recalcularse sobre el backlog entero.
+        """
+        digest = hashlib.sha256((backlog.content_hash or "").encode("utf-8"))
+        for item in (*stories, *sprints):
+            digest.update(item.model_dump_json().encode("utf-8"))
+        backlog.version += 1
+        backlog.updated_at = datetime.now()
+        digest.update(backlog.model_dump_json(include={"team_capacity", "velocity_history", "current_velocity"}).encode("utf-8"))
+        backlog.content_hash = digest.hexdigest()
+        
+        self.storage.save_changes(backlog, stories=stories, sprints=sprints)
+        self._remember(backlog, points_delta)
+    
+    @staticmethod
+    def _content_hash(backlog: Backlog) -> str:
+        """SHA-256 del contenido (sin versión, huella ni fechas)"""
+        content = backlog.model_dump_json(exclude={"version", "content_hash", "created_at", "updated_at"})
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+    
+    def _remember(self, backlog: Backlog, points_delta: Optional[int] = None) -> None:
+        """Conserva en memoria un backlog recién escrito: no hace falta releerlo ni validarlo"""
+        self._cached_backlog = backlog
+        self._cached_token = self.storage.change_token()
+        if self.on_change:
+            self.on_change(self, backlog, points_delta)
+    
+    def iter_markdown(self, backlog: Backlog) -> Iterator[str]:
+        """Genera el backlog en formato Markdown, por fragmentos"""
+        yield "# Product Backlog\n\n"
+        # Fecha del backlog, no de la exportación: misma versión, mismo documento
+        yield f"**Actualizado:** {backlog.updated_at.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        yield f"**Capacidad del Equipo:** {backlog.team_capacity} story points/sprint\n\n"
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write("# Product Backlog\n\n")
-            f.write(f"**Generado:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"**Capacidad del Equipo:** {backlog.team_capacity} story points/sprint\n\n")
+        if backlog.current_velocity:
+            yield f"**Velocidad Actual:** {backlog.current_velocity:.1f} story points/sprint\n\n"
+        
+        # Tabla de historias de usuario
+        yield "## Historias de Usuario\n\n"
+        yield "| ID | Título | Gherkin | Criterios de Aceptación | Story Points | Prioridad | Sprint | Subtareas |\n"
+        yield "|---|---|---|---|---|---|---|---|\n"
+        
+        for story in backlog.user_stories:
+            criteria_text = "; ".join(story.acceptance_criteria[:3])
+            if len(story.acceptance_criteria) > 3:
+                criteria_text += "..."
             
-            if backlog.current_velocity:
-                f.write(f"**Velocidad Actual:** {backlog.current_velocity:.1f} story points/sprint\n\n")
+            subtasks_text = ", ".join([st.title for st in story.subtasks[:3]])
+            if len(story.subtasks) > 3:
+                subtasks_text += f" (+{len(story.subtasks)-3} más)"
             
-            # Tabla de historias de usuario
-            f.write("## Historias de Usuario\n\n")
-            f.write("| ID | Título | Gherkin | Criterios de Aceptación | Story Points | Prioridad | Sprint | Subtareas |\n")
-            f.write("|---|---|---|---|---|---|---|---|\n")
+            sprint_text = f"Sprint {story.sprint_assigned}" if story.sprint_assigned else "Backlog"
             
-            for story in backlog.user_stories:
-                criteria_text = "; ".join(story.acceptance_criteria[:3])
-                if len(story.acceptance_criteria) > 3:
-                    criteria_text += "..."
-                
-                subtasks_text = ", ".join([st.title for st in story.subtasks[:3]])
-                if len(story.subtasks) > 3:
-                    subtasks_text += f" (+{len(story.subtasks)-3} más)"
-                
-                sprint_text = f"Sprint {story.sprint_assigned}" if story.sprint_assigned else "Backlog"
-                
-                f.write(f"| {story.id} | {story.title} | {story.gherkin[:50]}... | {criteria_text} | "
-                       f"{story.story_points} | {story.priority} | {sprint_text} | {subtasks_text} |\n")
+            yield (f"| {story.id} | {story.title} | {story.gherkin[:50]}... | {criteria_text} | "
+                   f"{story.story_points} | {story.priority} | {sprint_text} | {subtasks_text} |\n")
+        
+        # Detalle de historias
+        yield "\n## Detalle de Historias de Usuario\n\n"
+        for story in backlog.user_stories:
+            yield f"### {story.id}: {story.title}\n\n"
+            yield f"**Gherkin:** {story.gherkin}\n\n"
+            yield f"**Story Points:** {story.story_points} | **Prioridad:** {story.priority}\n\n"
+            
+            if story.dependencies:
+                yield f"**Dependencias:** {', '.join(story.dependencies)}\n\n"
+            
+            yield "**Criterios de Aceptación:**\n"
+            for i, criterion in enumerate(story.acceptance_criteria, 1):
+                yield f"{i}. {criterion}\n"
+            yield "\n"
+            
+            # Casos de prueba
+            if story.test_cases:
+                yield "**Casos de Prueba:**\n\n"
+                for tc in story.test_cases:
+                    yield f"#### {tc.id}: {tc.title}\n\n"
+                    yield f"**Descripción:** {tc.description}\n\n"
+                    if tc.preconditions:
+                        yield f"**Precondiciones:** {tc.preconditions}\n\n"
+                    yield "**Pasos:**\n"
+                    for i, step in enumerate(tc.steps, 1):
+                        yield f"{i}. {step}\n"
+                    yield f"\n**Resultado esperado:** {tc.expected_result}\n\n"
+                    yield f"**Tipo:** `{tc.test_type}`\n\n"
+                    yield "---\n\n"
+            
+            yield "**Subtareas:**\n"
+            for subtask in story.subtasks:
+                hours_text = f" ({subtask.estimated_hours}h)" if subtask.estimated_hours else ""
+                yield f"- {subtask.title}{hours_text}\n"
+            yield "\n"
             
-            # Detalle de historias
-            f.write("\n## Detalle de Historias de Usuario\n\n")
+            if story.tags:
+                yield f"**Tags:** {', '.join(story.tags)}\n\n"
+            
+            yield "---\n\n"
+        
+        # Planificación de sprints
+        if backlog.sprints:
+            stories_by_id: Dict[str, UserStory] = {}
             for story in backlog.user_stories:
-                f.write(f"### {story.id}: {story.title}\n\n")
-                f.write(f"**Gherkin:** {story.gherkin}\n\n")
-                f.write(f"**Story Points:** {story.story_points} | **Prioridad:** {story.priority}\n\n")
-                
-                if story.dependencies:
-                    f.write(f"**Dependencias:** {', '.join(story.dependencies)}\n\n")
-                
-                f.write("**Criterios de Aceptación:**\n")
-                for i, criterion in enumerate(story.acceptance_criteria, 1):
-                    f.write(f"{i}. {criterion}\n")
-                f.write("\n")
-                
-                # Casos de prueba
-                if story.test_cases:
-                    f.write("**Casos de Prueba:**\n\n")
-                    for tc in story.test_cases:
-                        f.write(f"#### {tc.id}: {tc.title}\n\n")
-                        f.write(f"**Descripción:** {tc.description}\n\n")
-                        if tc.preconditions:
-                            f.write(f"**Precondiciones:** {tc.preconditions}\n\n")
-                        f.write("**Pasos:**\n")
-                        for i, step in enumerate(tc.steps, 1):
-                            f.write(f"{i}. {step}\n")
-                        f.write(f"\n**Resultado esperado:** {tc.expected_result}\n\n")
-                        f.write(f"**Tipo:** `{tc.test_type}`\n\n")
-                        f.write("---\n\n")
-                
-                f.write("**Subtareas:**\n")
-                for subtask in story.subtasks:
-                    hours_text = f" ({subtask.estimated_hours}h)" if subtask.estimated_hours else ""
-                    f.write(f"- {subtask.title}{hours_text}\n")
-                f.write("\n")
+                stories_by_id.setdefault(story.id, story)
+            
+            yield "## Planificación de Sprints\n\n"
+            for sprint in backlog.sprints:
+                yield f"### {sprint.name}\n\n"
+                yield (f"**Capacidad:** {sprint.capacity} SP | **Total Asignado:** {sprint.total_points} SP | "
+                       f"**Utilización:** {sprint.utilization:.0%}\n\n")
                 
-                if story.tags:
-                    f.write(f"**Tags:** {', '.join(story.tags)}\n\n")
+                if sprint.completed_points > 0:
+                    yield f"**Completado:** {sprint.completed_points} SP | **Estado:** {sprint.status}\n\n"
                 
-                f.write("---\n\n")
-            
-            # Planificación de sprints
-            if backlog.sprints:
-                f.write("## Planificación de Sprints\n\n")
-                for sprint in backlog.sprints:
-                    f.write(f"### {sprint.name}\n\n")
-                    f.write(f"**Capacidad:** {sprint.capacity} SP | **Total Asignado:** {sprint.total_points} SP | "
-                           f"**Utilización:** {(sprint.total_points/sprint.capacity*100):.0f}%\n\n")
-                    
-                    if sprint.completed_points > 0:
-                        f.write(f"**Completado:** {sprint.completed_points} SP | **Estado:** {sprint.status}\n\n")
-                    
-                    f.write("**Historias Asignadas:**\n")
-                    for story_id in sprint.user_stories:
-                        story = next((s for s in backlog.user_stories if s.id == story_id), None)
-                        if story:
-                            f.write(f"- {story.id}: {story.title} ({story.story_points} SP)\n")
-                    f.write("\n")
-            
-            # Historial de velocidad
-            if backlog.velocity_history:
-                f.write("## Historial de Velocidad\n\n")
-                f.write("| Sprint | Story Points Completados |\n")
-                f.write("|---|---|\n")
-                for i, velocity in enumerate(backlog.velocity_history, 1):
-                    f.write(f"| Sprint {i} | {velocity} |\n")
-                f.write("\n")
-        
-        return str(filename)
+                yield "**Historias Asignadas:**\n"
+                for story_id in sprint.user_stories:
+                    story = stories_by_id.get(story_id)
+                    if story:
+                        yield f"- {story.id}: {story.title} ({story.story_points} SP)\n"
+                yield "\n"
+        
+        # Historial de velocidad
+        if backlog.velocity_history:
+            yield "## Historial de Velocidad\n\n"
+            yield "| Sprint | Story Points Completados |\n"
+            yield "|---|---|\n"
+            for i, velocity in enumerate(backlog.velocity_history, 1):
+                yield f"| Sprint {i} | {velocity} |\n"
+            yield "\n"
     
-    def export_csv(self, backlog: Backlog) -> str:
-        """Exporta el backlog a formato CSV"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self.exports_dir / f"backlog_{timestamp}.csv"
+    def iter_csv(self, backlog: Backlog) -> Iterator[str]:
+        """Genera el backlog en formato CSV, por bloques de filas"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        # Encabezados
+        writer.writerow([
+            'ID', 'Título', 'Gherkin', 'Criterios de Aceptación', 
+            'Story Points', 'Prioridad', 'Sprint Asignado', 'Dependencias',
+            'Subtareas', 'Casos de Prueba', 'Tags', 'Estado'
+        ])
         
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
+        # Datos
+        for story in backlog.user_stories:
+            # Formatear casos de prueba para CSV
+            test_cases_str = ""
+            if story.test_cases:
+                test_cases_list = [f"{tc.id}: {tc.title}" for tc in story.test_cases]
+                test_cases_str = '; '.join(test_cases_list)
             
-            # Encabezados
             writer.writerow([
-                'ID', 'Título', 'Gherkin', 'Criterios de Aceptación', 
-                'Story Points', 'Prioridad', 'Sprint Asignado', 'Dependencias',
-                'Subtareas', 'Casos de Prueba', 'Tags', 'Estado'
+                story.id,
+                story.title,
+                story.gherkin,
+                '; '.join(story.acceptance_criteria),
+                story.story_points,
+                story.priority,
+                f"Sprint {story.sprint_assigned}" if story.sprint_assigned else "Backlog",
+                ', '.join(story.dependencies),
+                ', '.join([st.title for st in story.subtasks]),
+                test_cases_str,
+                ', '.join(story.tags),
+                story.status
             ])
             
-            # Datos
-            for story in backlog.user_stories:
-                # Formatear casos de prueba para CSV
-                test_cases_str = ""
-                if story.test_cases:
-                    test_cases_list = [f"{tc.id}: {tc.title}" for tc in story.test_cases]
-                    test_cases_str = '; '.join(test_cases_list)
-                
-                writer.writerow([
-                    story.id,
-                    story.title,
-                    story.gherkin,
-                    '; '.join(story.acceptance_criteria),
-                    story.story_points,
-                    story.priority,
-                    f"Sprint {story.sprint_assigned}" if story.sprint_assigned else "Backlog",
-                    ', '.join(story.dependencies),
-                    ', '.join([st.title for st in story.subtasks]),
-                    test_cases_str,
-                    ', '.join(story.tags),
-                    story.status
-                ])
-        
-        return str(filename)
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue()
     
-    def export_json(self, backlog: Backlog) -> str:
-        """Exporta el backlog a formato JSON"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self.exports_dir / f"backlog_{timestamp}.json"
+    def iter_json(self, backlog: Backlog) -> Iterator[str]:
+        """
+        Genera el backlog en JSON (mismo documento que model_dump_json con
+        indent=2), serializando una HU cada vez.
+        """
+        if not backlog.user_stories:
+            yield backlog.model_dump_json(indent=2)
+            return
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(backlog.model_dump(mode='json'), f, indent=2, default=str, ensure_ascii=False)
+        yield '{\n  "user_stories": ['
+        for i, story in enumerate(backlog.user_stories):
+            text = story.model_dump_json(indent=2)
+            yield ("," if i else "") + "\n    " + text.replace("\n", "\n    ")
         
-        return str(filename)
+        rest = backlog.model_dump_json(exclude={"user_stories"}, indent=2)
+        yield "\n  ],\n" + rest[2:]
     
-    def export(self, format: ExportFormat) -> str:
-        """Exporta el backlog en el formato especificado"""
-        backlog = self.load_backlog()
-        
+    def iter_parquet(self, backlog: Backlog) -> Iterator[bytes]:
+        """
+        Genera un zip con las tablas normalizadas del backlog en parquet (ver
+        `columnar_export.backlog_tables`). Parquet no se escribe por fragmentos:
+        el zip se construye en memoria y se entrega por bloques.
+        """
+        data = memoryview(parquet_archive(backlog))
+        for start in range(0, len(data), EXPORT_CHUNK_SIZE):
+            yield bytes(data[start:start + EXPORT_CHUNK_SIZE])
+    
+    def iter_export(self, backlog: Backlog, format: ExportFormat) -> Iterator[str]:
+        """Generador de la exportación en un formato de texto"""
         if format == ExportFormat.MARKDOWN:
-            return self.export_markdown(backlog)
+            return self.iter_markdown(backlog)
         elif format == ExportFormat.CSV:
-            return self.export_csv(backlog)
+            return self.iter_csv(backlog)
         elif format == ExportFormat.JSON:
-            return self.export_json(backlog)
+            return self.iter_json(backlog)
         else:
             raise ValueError(f"Formato no soportado: {format}")
+    
+    def export_markdown(self, backlog: Backlog) -> str:
+        """Exporta el backlog a un fichero Markdown"""
+        return self.export(ExportFormat.MARKDOWN, backlog)
+    
+    def export_csv(self, backlog: Backlog) -> str:
+        """Exporta el backlog a un fichero CSV"""
+        return self.export(ExportFormat.CSV, backlog)
+    
+    def export_json(self, backlog: Backlog) -> str:
+        """Exporta el backlog a un fichero JSON"""
+        return self.export(ExportFormat.JSON, backlog)
+    
+    def export(self, format: ExportFormat, backlog: Optional[Backlog] = None, compressed: bool = False) -> str:
+        """
+        Ruta del fichero con el backlog exportado, generándolo solo si no está en
+        caché. Si la caché lo desaloja nada más guardarlo (p. ej. es mayor que
+        EXPORT_CACHE_MAX_BYTES) se escribe en EXPORTS_DIR, fuera de ella.
+        """
+        backlog = backlog if backlog is not None else self.load_backlog()
+        path = self.cached_export(backlog, format, compressed)
+        if path is None:
+            for _ in self.stream_export(backlog, format, compressed):
+                pass
+            path = self.cached_export(backlog, format, compressed)
+        if path is None:
+            path = self.exports_dir / self.export_filename(backlog, format, compressed)
+            with open(path, "wb") as f:
+                for chunk in self._export_chunks(backlog, format, compressed):
+                    f.write(chunk)
+        return str(path)
+    
+    def open_export(self, format: ExportFormat, backlog: Optional[Backlog] = None, compressed: bool = False) -> BinaryIO:
+        """
+        Exportación completa abierta para leer, generándola solo si no está en
+        caché. Se sirve desde el fichero abierto, que un desalojo posterior no
+        afecta; si se desaloja antes de abrirlo, se genera en un temporal.
+        """
+        backlog = backlog if backlog is not None else self.load_backlog()
+        handle = self.open_cached_export(backlog, format, compressed)
+        if handle is None:
+            for _ in self.stream_export(backlog, format, compressed):
+                pass
+            handle = self.open_cached_export(backlog, format, compressed)
+        if handle is None:
+            handle = tempfile.TemporaryFile(dir=self.exports_dir)
+            for chunk in self._export_chunks(backlog, format, compressed):
+                handle.write(chunk)
+            handle.seek(0)
+        return handle
+    
+    def cached_export(self, backlog: Backlog, format: ExportFormat, compressed: bool = False) -> Optional[Path]:
+        """Fichero de una exportación ya generada para esta versión del backlog, si sigue en caché"""
+        return self.export_cache.lookup(self.export_key(backlog, format, compressed))
+    
+    def open_cached_export(self, backlog: Backlog, format: ExportFormat, compressed: bool = False) -> Optional[BinaryIO]:
+        """Como `cached_export`, pero abre el fichero (ver DiskCache.open)"""
+        return self.export_cache.open(self.export_key(backlog, format, compressed))
+    
+    def stream_export(self, backlog: Backlog, format: ExportFormat, compressed: bool = False) -> Iterator[bytes]:
+        """Genera la exportación por bloques y la guarda en caché cuando termina"""
+        return self.export_cache.put_stream(
+            self.export_key(backlog, format, compressed),
+            self._export_chunks(backlog, format, compressed)
+        )
+    
+    def _export_chunks(self, backlog: Backlog, format: ExportFormat, compressed: bool = False) -> Iterator[bytes]:
+        if format == ExportFormat.PARQUET:
+            chunks = self.iter_parquet(backlog)
+        else:
+            chunks = batch_chunks(self.iter_export(backlog, format))
+        if compressed:
+            chunks = gzip_chunks(chunks)
+        return chunks
+    
+    def export_key(self, backlog: Backlog, format: ExportFormat, compressed: bool = False) -> str:
+        """
+        Clave de una exportación: backlog, huella y versión (la versión fija
+        updated_at, que aparece en el documento), formato y versión del exportador.
+        """
+        format = ExportFormat(format)
+        payload = json.dumps([
+            self.backlog_id, backlog.content_hash, backlog.version, format.value, compressed, EXPORTER_VERSION
+        ])
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return digest + EXPORT_SUFFIXES[format] + (".gz" if compressed else "")
+    
+    def export_filename(self, backlog: Backlog, format: ExportFormat, compressed: bool = False) -> str:
+        """Nombre de descarga de una exportación"""
+        timestamp = backlog.updated_at.strftime("%Y%m%d_%H%M%S")
+        return f"backlog_{timestamp}{EXPORT_SUFFIXES[ExportFormat(format)]}" + (".gz" if compressed else "")
+
+
+def storage_location(data_dir: Path, backlog_id: str) -> Tuple[Path, str]:
+    """Directorio y nombre base de los ficheros de un backlog: `default` usa DATA_DIR/backlog.*"""
+    if backlog_id == DEFAULT_BACKLOG_ID:
+        return data_dir, "backlog"
+    return data_dir / "backlogs", backlog_id
+
+
+def batch_chunks(chunks: Iterable[str], size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Agrupa fragmentos pequeños en bloques de ~`size` bytes codificados en UTF-8"""
+    pending: List[str] = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= size:
+            yield "".join(pending).encode("utf-8")
+            pending, pending_size = [], 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprime en formato gzip sobre la marcha"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,265 @@
+import json
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.config import get_settings
+from app.models import RESERVED_BACKLOG_IDS, Backlog, BacklogInfo
+from app.services.backlog_manager import BacklogManager, DEFAULT_BACKLOG_ID, storage_location
+from app.services.disk_cache import DiskCache
+from app.services.file_lock import FileLock
+
+
+BACKLOG_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_backlog_id(backlog_id: str) -> bool:
+    """El ID cumple el patrón y no está reservado"""
+    return bool(BACKLOG_ID_PATTERN.match(backlog_id)) and backlog_id not in RESERVED_BACKLOG_IDS
+
+
+class BacklogNotFoundError(KeyError):
+    """No hay ningún backlog con ese ID"""
+
+    def __init__(self, backlog_id: str):
+        self.backlog_id = backlog_id
+        super().__init__(backlog_id)
+
+    def __str__(self) -> str:
+        return f"Backlog no encontrado: {self.backlog_id}"
+
+
+class BacklogExistsError(ValueError):
+    """Ya existe un backlog con ese ID"""
+
+    def __init__(self, backlog_id: str):
+        self.backlog_id = backlog_id
+        super().__init__(f"Ya existe un backlog con ID: {backlog_id}")
+
+
+class BacklogRegistry:
+    """
+    Backlogs disponibles y sus gestores.
+
+    El índice (`DATA_DIR/backlogs/.index.json`, un nombre que ningún ID puede
+    producir) guarda los metadatos de cada
+    backlog (nombre, HU, puntos, versión, fechas), así que listar backlogs no
+    abre ninguno. Se reescribe tras cada guardado completo y tras las escrituras
+    de grano fino que cambian los contadores; las demás (p. ej. la velocidad)
+    no lo tocan, así que su versión y fecha pueden ir por detrás. Los gestores
+    se crean al primer uso y se reutilizan; todos comparten la caché de
+    exportaciones.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.directory = Path(self.settings.DATA_DIR) / "backlogs"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / ".index.json"
+        # Las lecturas no lo necesitan (el índice se reemplaza de forma atómica);
+        # sí las actualizaciones, que leen, modifican y reescriben
+        self.index_lock = FileLock(self.directory / ".index.lock")
+        self._migrate_index()
+        self.export_cache = DiskCache(
+            Path(self.settings.EXPORTS_DIR) / "cache",
+            max_bytes=self.settings.EXPORT_CACHE_MAX_BYTES,
+            ttl_seconds=self.settings.EXPORT_CACHE_TTL_SECONDS
+        )
+        # Reentrante: al abrir un gestor puede importarse un backlog, y esa escritura
+        # vuelve a _on_change
+        self._lock = threading.RLock()
+        self._managers: Dict[str, BacklogManager] = {}
+        self._index: Dict[str, BacklogInfo] = {}
+        self._index_token = None
+
+        # El backlog por defecto siempre existe (y puede traer datos de antes del índice)
+        if DEFAULT_BACKLOG_ID not in self._read_index():
+            manager = self.get(DEFAULT_BACKLOG_ID, create=True)
+            self._on_change(manager, manager.load_backlog())
+
+    def list(self) -> List[BacklogInfo]:
+        """Metadatos de todos los backlogs, leídos solo del índice"""
+        return sorted(self._read_index().values(), key=lambda info: info.id)
+
+    def info(self, backlog_id: str) -> BacklogInfo:
+        info = self._read_index().get(backlog_id)
+        if info is None:
+            raise BacklogNotFoundError(backlog_id)
+        return info
+
+    def get(self, backlog_id: Optional[str] = None, create: bool = False) -> BacklogManager:
+        """
+        Gestor de un backlog. Con `create=True` un ID nuevo se da de alta; si no,
+        lanza BacklogNotFoundError.
+        """
+        backlog_id = backlog_id or DEFAULT_BACKLOG_ID
+        if not is_valid_backlog_id(backlog_id):
+            raise ValueError(f"ID de backlog no válido: {backlog_id}")
+        # El índice manda (solo se relee si cambió): un backlog que eliminó otro
+        # worker no se sigue sirviendo desde el gestor que quedó en este proceso
+        if backlog_id not in self._read_index():
+            with self._lock:
+                self._managers.pop(backlog_id, None)
+            if not create:
+                raise BacklogNotFoundError(backlog_id)
+            self._register(backlog_id)
+
+        manager = self._managers.get(backlog_id)
+        if manager is None:
+            with self._lock:
+                manager = self._managers.get(backlog_id)
+                if manager is None:
+                    manager = BacklogManager(backlog_id, export_cache=self.export_cache, on_change=self._on_change)
+                    self._managers[backlog_id] = manager
+        return manager
+
+    def create(self, backlog_id: str, name: Optional[str] = None, team_capacity: int = 9) -> BacklogInfo:
+        """Da de alta un backlog vacío"""
+        if backlog_id in self._read_index():
+            raise BacklogExistsError(backlog_id)
+        manager = self.get(backlog_id, create=True)
+        manager.save_backlog(Backlog(team_capacity=team_capacity))
+        if name:
+            self.rename(backlog_id, name)
+        return self.info(backlog_id)
+
+    def rename(self, backlog_id: str, name: str) -> BacklogInfo:
+        with self._lock, self.index_lock.exclusive():
+            index = self._load_index()
+            if backlog_id not in index:
+                raise BacklogNotFoundError(backlog_id)
+            index[backlog_id] = index[backlog_id].model_copy(update={"name": name})
+            self._write_index(index)
+            return index[backlog_id]
+
+    def delete(self, backlog_id: str) -> None:
+        """Elimina un backlog y sus ficheros; el backlog por defecto solo se vacía"""
+        manager = self.get(backlog_id)
+        if backlog_id == DEFAULT_BACKLOG_ID:
+            manager.clear_backlog()
+            return
+
+        # Con el cerrojo del backlog tomado: una escritura de otro proceso que
+        # llegue después ya no lo encuentra en el índice (ver _on_change)
+        with manager.lock, manager.storage.file_lock.exclusive():
+            with self._lock, self.index_lock.exclusive():
+                self._managers.pop(backlog_id, None)
+                index = self._load_index()
+                index.pop(backlog_id, None)
+                self._write_index(index)
+            manager.storage.destroy()
+
+    def cache_stats(self) -> Dict:
+        """Contadores de la caché en memoria sumados sobre los backlogs abiertos"""
+        totals = {"hits": 0, "misses": 0, "invalidations": 0}
+        for manager in list(self._managers.values()):
+            for key, value in manager.cache_stats().items():
+                if key in totals:
+                    totals[key] += value
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_ratio"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+        totals["open_backlogs"] = len(self._managers)
+        return totals
+
+    def disk_usage(self) -> Dict[str, int]:
+        """Bytes en disco de los ficheros de cada backlog (snapshot, journal, base de datos, WAL)"""
+        usage = {}
+        for backlog_id in self._read_index():
+            directory, name = storage_location(Path(self.settings.DATA_DIR), backlog_id)
+            usage[backlog_id] = sum(
+                _file_size(path) for path in directory.glob(f"{name}.*") if not path.name.startswith(".")
+            )
+        return usage
+
+    def _migrate_index(self) -> None:
+        # Índices de antes del cambio de nombre (`index.json` chocaba con un backlog `index`)
+        legacy_path = self.directory / "index.json"
+        with self.index_lock.exclusive():
+            if legacy_path.exists() and not self.index_path.exists():
+                os.replace(legacy_path, self.index_path)
+
+    def _register(self, backlog_id: str) -> None:
+        # Alta en el índice antes de abrir el gestor: sus escrituras ya lo encuentran
+        with self._lock, self.index_lock.exclusive():
+            index = self._load_index()
+            if backlog_id not in index:
+                index[backlog_id] = BacklogInfo(id=backlog_id, name=backlog_id)
+                self._write_index(index)
+
+    def _on_change(self, manager: BacklogManager, backlog: Backlog, points_delta: Optional[int] = None) -> None:
+        # Mantiene al día la entrada del índice tras cada escritura de un gestor
+        # (se llama con el cerrojo del backlog tomado). Las escrituras de grano fino
+        # (con `points_delta`) actualizan los contadores sin recorrer el backlog y
+        # solo reescriben el índice si cambian
+        if points_delta is not None:
+            previous = self._read_index().get(manager.backlog_id)
+            if previous is not None and not points_delta and (previous.story_count, previous.sprint_count) == (
+                len(backlog.user_stories), len(backlog.sprints)
+            ):
+                return
+
+        with self._lock, self.index_lock.exclusive():
+            index = self._load_index()
+            previous = index.get(manager.backlog_id)
+            if previous is None:
+                # Otro proceso lo eliminó antes de esta escritura: no se resucita
+                self._managers.pop(manager.backlog_id, None)
+                manager.storage.delete()
+                raise BacklogNotFoundError(manager.backlog_id)
+
+            if points_delta is not None:
+                total_points = previous.total_points + points_delta
+            else:
+                total_points = sum(story.story_points for story in backlog.user_stories)
+            index[manager.backlog_id] = BacklogInfo(
+                id=manager.backlog_id,
+                name=previous.name,
+                story_count=len(backlog.user_stories),
+                total_points=total_points,
+                sprint_count=len(backlog.sprints),
+                version=backlog.version,
+                created_at=backlog.created_at,
+                updated_at=backlog.updated_at
+            )
+            self._write_index(index)
+
+    def _read_index(self) -> Dict[str, BacklogInfo]:
+        with self._lock:
+            return self._load_index()
+
+    def _load_index(self) -> Dict[str, BacklogInfo]:
+        # Se relee solo si el fichero cambió (p. ej. lo escribió otro proceso)
+        token = _file_token(self.index_path)
+        if token != self._index_token:
+            if token is None:
+                self._index = {}
+            else:
+                data = json.loads(self.index_path.read_text(encoding="utf-8"))
+                self._index = {backlog_id: BacklogInfo(**info) for backlog_id, info in data.items()}
+            self._index_token = token
+        return dict(self._index)
+
+    def _write_index(self, index: Dict[str, BacklogInfo]) -> None:
+        data = {backlog_id: info.model_dump(mode="json") for backlog_id, info in index.items()}
+        tmp_path = self.index_path.with_name(f".index.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
+        self._index = dict(index)
+        self._index_token = _file_token(self.index_path)
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _file_token(path: Path):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,117 @@
+import io
+import zipfile
+from typing import Dict
+from app.models import Backlog
+
+
+# Tablas del paquete parquet, en el orden en que se escriben en el zip
+TABLES = ("stories", "subtasks", "test_cases", "sprints", "velocity_history")
+
+
+def _pyarrow():
+    # Dependencia opcional: solo la necesita esta exportación
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("La exportación parquet requiere pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def backlog_tables(backlog: Backlog) -> Dict:
+    """
+    Backlog normalizado en tablas Arrow: una fila por HU, subtarea, caso de
+    prueba, sprint y punto del historial de velocidad.
+
+    Prioridad, estado, tipo de prueba y tags se codifican como diccionario
+    (categorías en pandas). Todas las tablas llevan la versión y la fecha del
+    backlog para poder concatenar exportaciones de distintos momentos.
+    """
+    pa = _pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    stories = backlog.user_stories
+
+    def snapshot_columns(rows: int) -> Dict:
+        return {
+            "backlog_version": pa.array([backlog.version] * rows, pa.int64()),
+            "backlog_updated_at": pa.array([backlog.updated_at] * rows, pa.timestamp("us"))
+        }
+
+    story_table = pa.table({
+        **snapshot_columns(len(stories)),
+        "position": pa.array(range(len(stories)), pa.int32()),
+        "id": pa.array([s.id for s in stories], pa.string()),
+        "title": pa.array([s.title for s in stories], pa.string()),
+        "gherkin": pa.array([s.gherkin for s in stories], pa.string()),
+        "acceptance_criteria": pa.array([s.acceptance_criteria for s in stories], pa.list_(pa.string())),
+        "story_points": pa.array([s.story_points for s in stories], pa.int8()),
+        "priority": pa.array([str(s.priority) for s in stories], category),
+        "dependencies": pa.array([s.dependencies for s in stories], pa.list_(pa.string())),
+        "sprint_assigned": pa.array([s.sprint_assigned for s in stories], pa.int32()),
+        "status": pa.array([s.status for s in stories], category),
+        "tags": pa.array([s.tags for s in stories], pa.list_(category))
+    })
+
+    subtasks = [(i, story.id, j, subtask) for i, story in enumerate(stories) for j, subtask in enumerate(story.subtasks)]
+    subtask_table = pa.table({
+        **snapshot_columns(len(subtasks)),
+        "story_position": pa.array([row[0] for row in subtasks], pa.int32()),
+        "story_id": pa.array([row[1] for row in subtasks], pa.string()),
+        "position": pa.array([row[2] for row in subtasks], pa.int32()),
+        "id": pa.array([row[3].id for row in subtasks], pa.string()),
+        "title": pa.array([row[3].title for row in subtasks], pa.string()),
+        "description": pa.array([row[3].description for row in subtasks], pa.string()),
+        "estimated_hours": pa.array([row[3].estimated_hours for row in subtasks], pa.float64()),
+        "status": pa.array([row[3].status for row in subtasks], category)
+    })
+
+    test_cases = [(i, story.id, j, tc) for i, story in enumerate(stories) for j, tc in enumerate(story.test_cases)]
+    test_case_table = pa.table({
+        **snapshot_columns(len(test_cases)),
+        "story_position": pa.array([row[0] for row in test_cases], pa.int32()),
+        "story_id": pa.array([row[1] for row in test_cases], pa.string()),
+        "position": pa.array([row[2] for row in test_cases], pa.int32()),
+        "id": pa.array([row[3].id for row in test_cases], pa.string()),
+        "title": pa.array([row[3].title for row in test_cases], pa.string()),
+        "description": pa.array([row[3].description for row in test_cases], pa.string()),
+        "preconditions": pa.array([row[3].preconditions for row in test_cases], pa.string()),
+        "steps": pa.array([row[3].steps for row in test_cases], pa.list_(pa.string())),
+        "expected_result": pa.array([row[3].expected_result for row in test_cases], pa.string()),
+        "test_type": pa.array([row[3].test_type for row in test_cases], category)
+    })
+
+    sprints = backlog.sprints
+    sprint_table = pa.table({
+        **snapshot_columns(len(sprints)),
+        "number": pa.array([s.number for s in sprints], pa.int32()),
+        "name": pa.array([s.name for s in sprints], pa.string()),
+        "capacity": pa.array([s.capacity for s in sprints], pa.int32()),
+        "user_stories": pa.array([s.user_stories for s in sprints], pa.list_(pa.string())),
+        "total_points": pa.array([s.total_points for s in sprints], pa.int32()),
+        "completed_points": pa.array([s.completed_points for s in sprints], pa.int32()),
+        "status": pa.array([s.status for s in sprints], category),
+        "start_date": pa.array([s.start_date for s in sprints], pa.timestamp("us")),
+        "end_date": pa.array([s.end_date for s in sprints], pa.timestamp("us"))
+    })
+
+    velocity = backlog.velocity_history
+    velocity_table = pa.table({
+        **snapshot_columns(len(velocity)),
+        "sprint": pa.array(range(1, len(velocity) + 1), pa.int32()),
+        "completed_points": pa.array(velocity, pa.int32())
+    })
+
+    return dict(zip(TABLES, (story_table, subtask_table, test_case_table, sprint_table, velocity_table)))
+
+
+def parquet_archive(backlog: Backlog) -> bytes:
+    """Zip con un fichero `<tabla>.parquet` (zstd) por cada tabla de `backlog_tables`"""
+    pa = _pyarrow()
+    buffer = io.BytesIO()
+    # Parquet ya va comprimido: el zip solo agrupa los ficheros
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, table in backlog_tables(backlog).items():
+            sink = io.BytesIO()
+            pa.parquet.write_table(table, sink, compression="zstd")
+            archive.writestr(f"{name}.parquet", sink.getvalue())
+    return buffer.getvalue()
@@ -0,0 +1,180 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+from app.models import Priority, UserStory
+
+
+PRIORITY_RANK = {Priority.ALTA: 0, Priority.MEDIA: 1, Priority.BAJA: 2}
+
+
+class DependencyCycleError(ValueError):
+    """Las dependencias entre HU forman un ciclo"""
+
+    def __init__(self, cycle: List[str]):
+        self.cycle = cycle
+        super().__init__(f"Dependencias circulares entre historias de usuario: {' -> '.join(cycle)}")
+
+
+class DependencyGraph:
+    """
+    Grafo de dependencias entre Historias de Usuario.
+
+    Los índices (prerrequisitos y dependientes de cada HU) se construyen una sola
+    vez; todos los recorridos son lineales en HU + dependencias, salvo el orden
+    por prioridad, que usa un heap. Las dependencias hacia IDs que no están en el
+    backlog se ignoran.
+    """
+
+    def __init__(self, stories: List[UserStory]):
+        self.stories = list(stories)
+        self.index: Dict[str, int] = {}
+        for i, story in enumerate(self.stories):
+            self.index.setdefault(story.id, i)
+
+        self.prerequisites: List[List[int]] = [[] for _ in self.stories]
+        self.dependents: List[List[int]] = [[] for _ in self.stories]
+        for i, story in enumerate(self.stories):
+            seen = set()
+            for dep_id in story.dependencies:
+                j = self.index.get(dep_id)
+                if j is None or j in seen:
+                    continue
+                seen.add(j)
+                self.prerequisites[i].append(j)
+                self.dependents[j].append(i)
+
+        self._topological: Optional[List[int]] = None
+        self._critical_path: Optional[List[int]] = None
+        self._effective_rank: Optional[List[int]] = None
+        self._levels: Optional[List[int]] = None
+
+    def topological_order(self) -> List[int]:
+        """Índices en un orden donde cada HU va después de sus prerrequisitos"""
+        if self._topological is None:
+            pending = [len(prereqs) for prereqs in self.prerequisites]
+            order = [i for i, count in enumerate(pending) if count == 0]
+            for i in order:
+                for j in self.dependents[i]:
+                    pending[j] -= 1
+                    if pending[j] == 0:
+                        order.append(j)
+
+            if len(order) < len(self.stories):
+                raise DependencyCycleError(self._find_cycle(pending))
+            self._topological = order
+        return self._topological
+
+    def remove_cycles(self) -> List[Tuple[str, str]]:
+        """
+        Quita las dependencias que cierran ciclos (las aristas de retroceso de un
+        recorrido en profundidad), del grafo y de las propias HU. Devuelve los
+        pares (HU, dependencia) eliminados; sin ciclos no cambia nada.
+        """
+        # 0 = sin visitar, 1 = en la pila del recorrido, 2 = terminado
+        state = [0] * len(self.stories)
+        back_edges: List[Tuple[int, int]] = []
+        for root in range(len(self.stories)):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.prerequisites[root]))]
+            while stack:
+                i, prereqs = stack[-1]
+                for j in prereqs:
+                    if state[j] == 1:
+                        back_edges.append((i, j))
+                    elif state[j] == 0:
+                        state[j] = 1
+                        stack.append((j, iter(self.prerequisites[j])))
+                        break
+                else:
+                    state[i] = 2
+                    stack.pop()
+
+        for i, j in back_edges:
+            self.prerequisites[i].remove(j)
+            self.dependents[j].remove(i)
+            dep_id = self.stories[j].id
+            self.stories[i].dependencies = [d for d in self.stories[i].dependencies if d != dep_id]
+        if back_edges:
+            self._topological = self._critical_path = self._effective_rank = self._levels = None
+
+        return [(self.stories[i].id, self.stories[j].id) for i, j in back_edges]
+
+    def critical_path_lengths(self) -> Dict[str, int]:
+        """Story points de la cadena de dependientes más larga que arranca en cada HU (incluida)"""
+        return {self.stories[i].id: length for i, length in enumerate(self._critical_paths())}
+
+    def effective_ranks(self) -> List[int]:
+        """Rango de prioridad (0 = Alta) de cada HU, heredando el de sus dependientes"""
+        if self._effective_rank is None:
+            ranks = [PRIORITY_RANK[story.priority] for story in self.stories]
+            for i in reversed(self.topological_order()):
+                for j in self.dependents[i]:
+                    if ranks[j] < ranks[i]:
+                        ranks[i] = ranks[j]
+            self._effective_rank = ranks
+        return self._effective_rank
+
+    def levels(self) -> List[int]:
+        """Longitud de la cadena de prerrequisitos de cada HU (0 = sin prerrequisitos)"""
+        if self._levels is None:
+            levels = [0] * len(self.stories)
+            for i in self.topological_order():
+                for j in self.dependents[i]:
+                    if levels[j] <= levels[i]:
+                        levels[j] = levels[i] + 1
+            self._levels = levels
+        return self._levels
+
+    def priority_order(self) -> List[UserStory]:
+        """
+        Orden topológico guiado por prioridad.
+
+        Entre las HU disponibles (prerrequisitos ya ordenados) se elige por prioridad
+        efectiva (la más alta entre la HU y todo lo que depende de ella, para que un
+        habilitador de baja prioridad no retrase HU críticas), luego por ruta crítica
+        más larga, número de dependientes directos e ID.
+        """
+        critical = self._critical_paths()
+        rank = self.effective_ranks()
+        pending = [len(prereqs) for prereqs in self.prerequisites]
+
+        def key(i: int) -> tuple:
+            return (rank[i], -critical[i], -len(self.dependents[i]), self.stories[i].id, i)
+
+        heap = [key(i) for i, count in enumerate(pending) if count == 0]
+        heapq.heapify(heap)
+        ordered = []
+        while heap:
+            i = heapq.heappop(heap)[-1]
+            ordered.append(self.stories[i])
+            for j in self.dependents[i]:
+                pending[j] -= 1
+                if pending[j] == 0:
+                    heapq.heappush(heap, key(j))
+
+        return ordered
+
+    def _critical_paths(self) -> List[int]:
+        if self._critical_path is None:
+            lengths = [0] * len(self.stories)
+            for i in reversed(self.topological_order()):
+                longest = max((lengths[j] for j in self.dependents[i]), default=0)
+                lengths[i] = self.stories[i].story_points + longest
+            self._critical_path = lengths
+        return self._critical_path
+
+    def _find_cycle(self, pending: List[int]) -> List[str]:
+        # Toda HU que quedó fuera del orden tiene algún prerrequisito también
+        # fuera; siguiendo esos prerrequisitos se acaba repitiendo un nodo
+        node = next(i for i, count in enumerate(pending) if count > 0)
+        position: Dict[int, int] = {}
+        path: List[int] = []
+        while node not in position:
+            position[node] = len(path)
+            path.append(node)
+            node = next(j for j in self.prerequisites[node] if pending[j] > 0)
+
+        cycle = path[position[node]:] + [node]
+        # El camino sigue prerrequisitos; se invierte para leerlo como "HU -> dependiente"
+        return [self.stories[i].id for i in reversed(cycle)]
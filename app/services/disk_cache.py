@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+
+class DiskCache:
+    """
+    Caché clave/valor en disco con expiración (TTL) y desalojo LRU por tamaño.
+
+    Cada entrada es un fichero `<clave><sufijo>` dentro de `directory`. El mtime del
+    fichero marca su creación (para el TTL) y el atime su último uso (para el LRU);
+    el índice en memoria evita recorrer el directorio en cada acceso.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int,
+        ttl_seconds: Optional[float] = None,
+        suffix: str = ""
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # clave -> (tamaño, creado); ordenado de menos a más recientemente usado
+        self._index: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def path(self, key: str) -> Path:
+        """Ruta del fichero de una entrada (exista o no)"""
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Devuelve el contenido de una entrada vigente o None"""
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            # Desalojada por otro proceso entre la consulta y la lectura
+            with self._lock:
+                self._forget(key)
+            return None
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Como `get`, pero devuelve la ruta del fichero en lugar de leerlo"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                # Puede haberla escrito otro proceso que comparte el directorio
+                entry = self._adopt(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._index.move_to_end(key)
+            self.hits += 1
+
+        path = self.path(key)
+        now = time.time()
+        try:
+            os.utime(path, (now, entry[1]))
+        except FileNotFoundError:
+            pass
+        return path
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """
+        Abre una entrada vigente para leerla, o None. El fichero abierto sigue
+        siendo legible aunque la entrada se desaloje después (otro proceso, el
+        presupuesto de tamaño), así que es la forma segura de servirla.
+        """
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            # Desalojada entre la consulta y la apertura
+            with self._lock:
+                self._forget(key)
+            return None
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Guarda una entrada de forma atómica y aplica el presupuesto de tamaño"""
+        path = self.path(key)
+        tmp_path = self._tmp_path(path)
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self.register(key)
+        return path
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Guarda una entrada a medida que se consumen los bloques, que se devuelven
+        tal cual. Solo se publica si el iterador se consume entero.
+        """
+        path = self.path(key)
+        tmp_path = self._tmp_path(path)
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp_path, path)
+            self.register(key)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def register(self, key: str) -> None:
+        """Incorpora al índice una entrada cuyo fichero ya se escribió en `path(key)`"""
+        path = self.path(key)
+        with self._lock:
+            stat = path.stat()
+            self._forget(key)
+            self._index[key] = (stat.st_size, stat.st_mtime)
+            self._total_bytes += stat.st_size
+            self._evict()
+
+    def stats(self) -> Dict:
+        """Contadores de uso de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes
+            }
+
+    def _tmp_path(self, path: Path) -> Path:
+        return path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+
+    def _load_index(self) -> None:
+        entries = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            if path.name.startswith("."):
+                continue
+            stat = path.stat()
+            key = path.name[:len(path.name) - len(self.suffix)] if self.suffix else path.name
+            entries.append((stat.st_atime, key, stat.st_size, stat.st_mtime))
+
+        for _, key, size, created in sorted(entries):
+            self._index[key] = (size, created)
+            self._total_bytes += size
+        self._evict()
+
+    def _adopt(self, key: str) -> Optional[Tuple[int, float]]:
+        try:
+            stat = self.path(key).stat()
+        except FileNotFoundError:
+            return None
+        entry = (stat.st_size, stat.st_mtime)
+        self._index[key] = entry
+        self._total_bytes += stat.st_size
+        return entry
+
+    def _expired(self, entry: Tuple[int, float]) -> bool:
+        return self.ttl_seconds is not None and time.time() - entry[1] > self.ttl_seconds
+
+    def _evict(self) -> None:
+        # Primero las caducadas, después las menos usadas hasta entrar en presupuesto
+        if self.ttl_seconds is not None:
+            for key in [k for k, entry in self._index.items() if self._expired(entry)]:
+                self._remove(key)
+        while self._total_bytes > self.max_bytes and self._index:
+            self._remove(next(iter(self._index)))
+
+    def _remove(self, key: str) -> None:
+        self._forget(key)
+        self.path(key).unlink(missing_ok=True)
+        self.evictions += 1
+
+    def _forget(self, key: str) -> None:
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
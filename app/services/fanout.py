@@ -0,0 +1,156 @@
+import re
+import unicodedata
+from typing import Dict, List
+from app.models import UserStory
+
+
+# Un párrafo que empieza como encabezado (Markdown o numerado) abre una sección nueva
+_HEADING_RE = re.compile(r"^\s*(#{1,6}\s|\d+(\.\d+)*[.)]\s|[A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ0-9 ]{3,}:?\s*$)")
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+
+
+def split_requirements(requirements: str, max_chars: int) -> List[str]:
+    """
+    Divide un documento de requisitos en secciones de como máximo `max_chars`.
+
+    Se corta por párrafos, prefiriendo los encabezados como inicio de sección;
+    un párrafo más largo que el límite se corta por líneas.
+    """
+    paragraphs = []
+    for paragraph in _PARAGRAPH_SPLIT_RE.split(requirements.strip()):
+        if not paragraph.strip():
+            continue
+        if len(paragraph) <= max_chars:
+            paragraphs.append(paragraph)
+        else:
+            paragraphs.extend(_split_long_paragraph(paragraph, max_chars))
+
+    sections = []
+    current: List[str] = []
+    current_len = 0
+    for paragraph in paragraphs:
+        starts_section = bool(_HEADING_RE.match(paragraph))
+        overflow = current_len + len(paragraph) + 2 > max_chars
+        # Un encabezado cierra la sección actual si ésta ya tiene un tamaño razonable
+        if current and (overflow or (starts_section and current_len >= max_chars // 2)):
+            sections.append("\n\n".join(current))
+            current, current_len = [], 0
+        current.append(paragraph)
+        current_len += len(paragraph) + 2
+
+    if current:
+        sections.append("\n\n".join(current))
+
+    return sections
+
+
+def _split_long_paragraph(paragraph: str, max_chars: int) -> List[str]:
+    """Corta un párrafo por líneas (o a la fuerza) para respetar el límite"""
+    pieces = []
+    current = ""
+    for line in paragraph.splitlines():
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def merge_story_batches(batches: List[List[UserStory]]) -> List[UserStory]:
+    """
+    Une las HU generadas por sección en un único backlog.
+
+    - Renumera los IDs como HU1..HUn en orden de sección
+    - Elimina duplicados (mismo título o mismo Gherkin normalizado) conservando la primera
+    - Reescribe dependencias, subtareas y casos de prueba con los nuevos IDs
+    """
+    merger = StoryMerger()
+    for batch in batches:
+        merger.add(batch)
+    return merger.stories
+
+
+class StoryMerger:
+    """
+    Fusión incremental de lotes de HU (ver merge_story_batches).
+
+    Los lotes se añaden en orden de sección; `add` devuelve las HU nuevas del lote
+    ya renumeradas y con sus dependencias resueltas. Un duplicado de una HU ya
+    devuelta le añade sus tags y dependencias sobre el mismo objeto.
+    """
+
+    def __init__(self):
+        self.stories: List[UserStory] = []
+        self._by_fingerprint: Dict[str, UserStory] = {}
+        self._by_id: Dict[str, UserStory] = {}
+
+    def add(self, batch: List[UserStory]) -> List[UserStory]:
+        id_map: Dict[str, str] = {}
+        added: List[UserStory] = []
+        # Dependencias por HU fusionada con los IDs locales del lote; se traducen
+        # cuando todo el lote tiene ID nuevo
+        pending_deps: Dict[str, List[str]] = {}
+
+        for story in batch:
+            fingerprints = [fp for fp in (_fingerprint(story.title), _fingerprint(story.gherkin)) if fp]
+            existing = next((self._by_fingerprint[fp] for fp in fingerprints if fp in self._by_fingerprint), None)
+
+            if existing is not None:
+                # Duplicado: sus referencias apuntan a la HU conservada
+                id_map[story.id] = existing.id
+                existing.tags.extend(tag for tag in story.tags if tag not in existing.tags)
+                pending_deps.setdefault(existing.id, []).extend(story.dependencies)
+                continue
+
+            new_id = f"HU{len(self.stories) + 1}"
+            id_map[story.id] = new_id
+            merged_story = story.model_copy(update={
+                "id": new_id,
+                "dependencies": [],
+                "subtasks": [
+                    st.model_copy(update={"id": _rename_child(st.id, story.id, new_id)})
+                    for st in story.subtasks
+                ],
+                "test_cases": [
+                    tc.model_copy(update={"id": _rename_child(tc.id, story.id, new_id)})
+                    for tc in story.test_cases
+                ],
+                "tags": list(story.tags)
+            })
+            self.stories.append(merged_story)
+            self._by_id[new_id] = merged_story
+            added.append(merged_story)
+            pending_deps[new_id] = list(story.dependencies)
+            for fp in fingerprints:
+                self._by_fingerprint.setdefault(fp, merged_story)
+
+        for story_id, local_deps in pending_deps.items():
+            story = self._by_id[story_id]
+            for local_id in local_deps:
+                new_dep = id_map.get(local_id)
+                if new_dep and new_dep != story.id and new_dep not in story.dependencies:
+                    story.dependencies.append(new_dep)
+
+        return added
+
+
+def _rename_child(child_id: str, old_story_id: str, new_story_id: str) -> str:
+    """Adapta el ID de una subtarea o caso de prueba (HU3-ST1) al nuevo ID de su HU"""
+    prefix = f"{old_story_id}-"
+    if child_id.startswith(prefix):
+        return f"{new_story_id}-{child_id[len(prefix):]}"
+    return f"{new_story_id}-{child_id}"
+
+
+def _fingerprint(text: str) -> str:
+    """Normaliza un texto para detectar HU repetidas entre secciones"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
@@ -0,0 +1,63 @@
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo exclusión dentro del proceso
+    fcntl = None
+
+
+class FileLock:
+    """
+    Cerrojo entre procesos sobre un fichero `.lock` (flock), compartido para
+    leer y exclusivo para escribir.
+
+    flock se asocia al descriptor, no al hilo, así que un RLock ordena los hilos
+    del proceso y solo la adquisición más externa toca el fichero; las anidadas
+    (p. ej. una lectura dentro de una escritura) solo cuentan profundidad.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._exclusive = False
+        self._fd = None
+
+    @contextmanager
+    def shared(self):
+        with self._hold(exclusive=False):
+            yield
+
+    @contextmanager
+    def exclusive(self):
+        with self._hold(exclusive=True):
+            yield
+
+    @contextmanager
+    def _hold(self, exclusive: bool):
+        with self._thread_lock:
+            if self._depth == 0:
+                self._acquire(exclusive)
+            elif exclusive and not self._exclusive:
+                raise RuntimeError(f"No se puede pasar a exclusivo un cerrojo compartido: {self.path}")
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._release()
+
+    def _acquire(self, exclusive: bool) -> None:
+        self._exclusive = exclusive
+        if fcntl is None:
+            return
+        if self._fd is None:
+            self._fd = open(self.path, "a+b")
+        fcntl.flock(self._fd.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _release(self) -> None:
+        if fcntl is not None and self._fd is not None:
+            fcntl.flock(self._fd.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,459 @@
+import asyncio
+import functools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.models import Job, JobStatus
+from app.services import tracing
+from app.services.storage import _Transaction
+
+
+# Manejador de un tipo de trabajo: recibe el trabajo, su payload y una función
+# para emitir eventos de progreso; devuelve el resultado (JSON serializable)
+JobHandler = Callable[[Job, Dict, Callable[[str, Dict], None]], Awaitable[Dict]]
+
+TERMINAL_STATUSES = (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value)
+
+
+class JobError(Exception):
+    """Fallo de un trabajo con el código HTTP que lo describe (p. ej. 409)"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class IdempotencyConflictError(ValueError):
+    """La clave de idempotencia ya se usó con otra petición"""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"La clave de idempotencia '{key}' ya se usó con una petición distinta")
+
+
+class JobStore:
+    """
+    Cola persistente de trabajos en SQLite (`DATA_DIR/jobs.db`).
+
+    Guarda los trabajos y sus eventos de progreso. Reclamar un trabajo es una
+    transacción IMMEDIATE, así que varios procesos pueden compartir la cola sin
+    ejecutar dos veces el mismo trabajo. Quien ejecuta un trabajo renueva su
+    `heartbeat_at`; uno en ejecución sin renovar durante el lease es de un
+    proceso caído y vuelve a la cola.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            idempotency_key TEXT,
+            fingerprint TEXT,
+            worker TEXT,
+            heartbeat_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            error_status INTEGER,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency ON jobs (kind, idempotency_key);
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+        CREATE TABLE IF NOT EXISTS job_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+        # Colas creadas antes de los leases
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    def create(
+        self,
+        kind: str,
+        payload: Dict,
+        idempotency_key: Optional[str] = None,
+        fingerprint: Optional[str] = None
+    ) -> Tuple[Job, bool]:
+        """
+        Encola un trabajo. Con `idempotency_key` devuelve el trabajo que ya se
+        creó con esa clave (y False); si su huella no coincide lanza
+        IdempotencyConflictError.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, status, payload, idempotency_key, fingerprint, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id, kind, JobStatus.QUEUED.value, json.dumps(payload, ensure_ascii=False),
+                        idempotency_key, fingerprint, datetime.now().isoformat()
+                    )
+                )
+                created = True
+            except sqlite3.IntegrityError:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE kind = ? AND idempotency_key = ?", (kind, idempotency_key)
+                ).fetchone()
+                if row["fingerprint"] != fingerprint:
+                    raise IdempotencyConflictError(idempotency_key)
+                job_id, created = row["id"], False
+        return self.get(job_id), created
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Job]:
+        """Trabajos más recientes primero, opcionalmente filtrados por estado"""
+        query, params = "SELECT * FROM jobs", []
+        if status:
+            query, params = query + " WHERE status = ?", [status]
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Número de trabajos por estado"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+        counts = {status.value: 0 for status in JobStatus}
+        counts.update({row["status"]: row["total"] for row in rows})
+        return counts
+
+    def payload(self, job_id: str) -> Dict:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["payload"])
+
+    def claim_next(self, worker: str, max_attempts: int) -> Optional[Job]:
+        """
+        Marca como en ejecución el trabajo en cola más antiguo y lo devuelve.
+        Los que ya agotaron los intentos (cayó el proceso cada vez) se dan por fallidos.
+        """
+        with self._lock:
+            while True:
+                with _Transaction(self._conn, "IMMEDIATE"):
+                    row = self._conn.execute(
+                        "SELECT id, attempts FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                        (JobStatus.QUEUED.value,)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    now = datetime.now().isoformat()
+                    if row["attempts"] >= max_attempts:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                            (JobStatus.FAILED.value, f"Abandonado tras {row['attempts']} intentos", now, row["id"])
+                        )
+                        continue
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, heartbeat_at = ?, attempts = attempts + 1, "
+                        "started_at = ? WHERE id = ?",
+                        (JobStatus.RUNNING.value, worker, time.time(), now, row["id"])
+                    )
+                    job_id = row["id"]
+                break
+        return self.get(job_id)
+
+    def add_event(self, job_id: str, event: str, data: Dict) -> int:
+        """Añade un evento de progreso; el evento `progress` además actualiza el trabajo"""
+        encoded = json.dumps(data, ensure_ascii=False)
+        with self._lock, _Transaction(self._conn, "IMMEDIATE"):
+            cursor = self._conn.execute(
+                "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)", (job_id, event, encoded)
+            )
+            if event == "progress":
+                self._conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (encoded, job_id))
+            return cursor.lastrowid
+
+    def events(self, job_id: str, after: int = 0) -> List[Tuple[int, str, str]]:
+        """Eventos del trabajo posteriores a `after` como (seq, evento, datos JSON)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+        return [(row["seq"], row["event"], row["data"]) for row in rows]
+
+    def finish(
+        self,
+        job_id: str,
+        status: JobStatus,
+        result: Optional[Dict] = None,
+        error: Optional[str] = None,
+        error_status: Optional[int] = None,
+        worker: Optional[str] = None
+    ) -> bool:
+        """
+        Cierra un trabajo y añade el evento final `done` en la misma transacción,
+        así que quien ve el estado terminal ya tiene ese evento. Con `worker`,
+        solo si sigue siendo suyo (no se lo quitaron por lease vencido); devuelve
+        si se cerró.
+        """
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, error_status = ?, finished_at = ? WHERE id = ?"
+        params = [
+            status.value, json.dumps(result, ensure_ascii=False) if result is not None else None,
+            error, error_status, datetime.now().isoformat(), job_id
+        ]
+        if worker is not None:
+            query, params = query + " AND worker = ? AND status = ?", params + [worker, JobStatus.RUNNING.value]
+        with self._lock, _Transaction(self._conn, "IMMEDIATE"):
+            if self._conn.execute(query, params).rowcount == 0:
+                return False
+            job = _row_to_job(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+                (job_id, "done", job.model_dump_json())
+            )
+            return True
+
+    def heartbeat(self, worker: str) -> int:
+        """Renueva el lease de los trabajos en ejecución de `worker`"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker = ?",
+                (time.time(), JobStatus.RUNNING.value, worker)
+            ).rowcount
+
+    def requeue(self, job_id: str, worker: Optional[str] = None) -> None:
+        """
+        Devuelve un trabajo a la cola descartando los eventos del intento
+        interrumpido (con `worker`, solo si sigue siendo suyo)
+        """
+        with self._lock, _Transaction(self._conn, "IMMEDIATE"):
+            if worker is not None:
+                row = self._conn.execute("SELECT worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None or row["worker"] != worker:
+                    return
+            self._requeue(job_id)
+
+    def requeue_expired(self, lease_seconds: float) -> int:
+        """
+        Devuelve a la cola los trabajos en ejecución cuyo lease venció: su
+        proceso cayó o se reinició (con otro nombre de host o el mismo PID da igual)
+        """
+        with self._lock, _Transaction(self._conn, "IMMEDIATE"):
+            expired = [
+                row["id"] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                    (JobStatus.RUNNING.value, time.time() - lease_seconds)
+                )
+            ]
+            for job_id in expired:
+                self._requeue(job_id)
+        return len(expired)
+
+    def prune(self, older_than: datetime) -> int:
+        """Elimina los trabajos terminados antes de `older_than` y sus eventos"""
+        with self._lock, _Transaction(self._conn, "IMMEDIATE"):
+            ids = [
+                row["id"] for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    TERMINAL_STATUSES + (older_than.isoformat(),)
+                )
+            ]
+            for job_id in ids:
+                self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return len(ids)
+
+    def _requeue(self, job_id: str) -> None:
+        self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, heartbeat_at = NULL, progress = NULL, started_at = NULL "
+            "WHERE id = ?",
+            (JobStatus.QUEUED.value, job_id)
+        )
+
+
+class JobQueue:
+    """
+    Ejecuta los trabajos de un JobStore con un número acotado de workers asyncio.
+
+    Los workers se despiertan al encolar y, además, consultan la cola cada
+    `poll_interval` segundos para recoger trabajos encolados por otros procesos.
+    Cada `lease_seconds / 3` se renueva el lease de los trabajos propios y se
+    recuperan los de procesos que dejaron de renovarlo.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = 2,
+        poll_interval: float = 1.0,
+        max_attempts: int = 3,
+        lease_seconds: float = 30.0,
+        log_traces: bool = False
+    ):
+        self.store = store
+        self.log_traces = log_traces
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        # Único por arranque: un PID reutilizado no hereda los trabajos de otro proceso
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self, retention_seconds: Optional[float] = None) -> None:
+        """Recupera los trabajos interrumpidos por un reinicio y arranca los workers"""
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        self.store.requeue_expired(self.lease_seconds)
+        if retention_seconds:
+            self.store.prune(datetime.now() - timedelta(seconds=retention_seconds))
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._keep_alive(), name="job-heartbeat"))
+
+    async def stop(self) -> None:
+        """Detiene los workers; los trabajos en curso vuelven a la cola"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(
+        self,
+        kind: str,
+        payload: Dict,
+        idempotency_key: Optional[str] = None,
+        fingerprint: Optional[str] = None
+    ) -> Tuple[Job, bool]:
+        """Encola un trabajo (ver JobStore.create) y despierta a los workers"""
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        job, created = self.store.create(kind, payload, idempotency_key, fingerprint)
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        return job, created
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def events(self, job_id: str, after: int = 0) -> AsyncIterator[Tuple[int, str, str]]:
+        """
+        Eventos del trabajo desde `after` hasta el evento final `done`, esperando
+        los que aún no se han producido.
+        """
+        while True:
+            changed = self._changed
+            for seq, event, data in self.store.events(job_id, after):
+                after = seq
+                yield seq, event, data
+                if event == "done":
+                    return
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            if job.status in TERMINAL_STATUSES:
+                # Se vacía lo pendiente: `done` se escribe junto con el estado terminal
+                for seq, event, data in self.store.events(job_id, after):
+                    yield seq, event, data
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _emit(self, job_id: str, event: str, data: Dict) -> None:
+        self.store.add_event(job_id, event, data)
+        self._notify()
+
+    def _notify(self) -> None:
+        # Despierta a quienes siguen los eventos; cada espera usa un Event nuevo
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            self.store.heartbeat(self.worker_id)
+            if self.store.requeue_expired(self.lease_seconds):
+                self._wakeup.set()
+
+    async def _work(self) -> None:
+        while True:
+            job = self.store.claim_next(self.worker_id, self.max_attempts)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Cada ejecución es su propia traza, con el ID del trabajo
+            with tracing.trace(job.id, f"job {job.kind}", log=self.log_traces) as current:
+                current.attributes["attempt"] = job.attempts
+                await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        emit = functools.partial(self._emit, job.id)
+        emit("status", {"status": JobStatus.RUNNING.value, "attempt": job.attempts})
+        try:
+            result = await self._handlers[job.kind](job, self.store.payload(job.id), emit)
+            outcome = {"status": JobStatus.SUCCEEDED, "result": result}
+        except asyncio.CancelledError:
+            # Apagado: se reintenta en el próximo arranque (o en otro proceso)
+            self.store.requeue(job.id, worker=self.worker_id)
+            raise
+        except JobError as e:
+            outcome = {"status": JobStatus.FAILED, "error": str(e), "error_status": e.status}
+        except Exception as e:
+            outcome = {"status": JobStatus.FAILED, "error": str(e) or type(e).__name__, "error_status": 500}
+        # Si el lease venció y otro worker lo retomó, el resultado que cuenta es el suyo
+        if self.store.finish(job.id, worker=self.worker_id, **outcome):
+            self._notify()
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        status=row["status"],
+        attempts=row["attempts"],
+        progress=json.loads(row["progress"]) if row["progress"] else {},
+        result=json.loads(row["result"]) if row["result"] else None,
+        error=row["error"],
+        error_status=row["error_status"],
+        created_at=row["created_at"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"]
+    )
+
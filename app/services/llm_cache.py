@@ -0,0 +1,31 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional
+from app.services.disk_cache import DiskCache
+
+
+class LLMCache(DiskCache):
+    """Caché de respuestas del modelo direccionada por la huella del prompt"""
+
+    def __init__(self, directory: Path, max_bytes: int, ttl_seconds: Optional[float] = None):
+        super().__init__(directory, max_bytes, ttl_seconds, suffix=".json")
+
+    @staticmethod
+    def fingerprint(system_prompt: str, user_prompt: str, deployment: str, temperature: float) -> str:
+        """Clave de caché: SHA-256 de todo lo que determina la respuesta"""
+        payload = json.dumps(
+            [system_prompt, user_prompt, deployment, temperature],
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_content(self, key: str) -> Optional[str]:
+        """Contenido de la respuesta cacheada, si existe y no ha caducado"""
+        data = self.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_content(self, key: str, content: str) -> None:
+        """Guarda el contenido de una respuesta completa"""
+        self.put(key, content.encode("utf-8"))
@@ -0,0 +1,291 @@
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.services import tracing
+
+
+# Buckets de latencia (segundos): de 1 ms a las llamadas largas al modelo
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Muestra de un collector: (etiquetas, valor)
+Sample = Tuple[Dict[str, str], float]
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lookup: Dict[tuple, object] = {}
+
+    def labels(self, *values: str):
+        """Serie de la métrica para esos valores de etiqueta (se crea al primer uso)"""
+        child = self._lookup.get(values)
+        if child is None:
+            key = tuple(str(value) for value in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+                # Atajo por los valores tal cual llegan (p. ej. el status como int)
+                self._lookup[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(dict(zip(self.labelnames, key)), child))
+        return lines
+
+    def _render_child(self, labels: Dict[str, str], child) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Contador monótono"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def _render_child(self, labels, child):
+        return [f"{self.name}{_labels(labels)} {_number(child.value)}"]
+
+
+class Gauge(Counter):
+    """Valor que sube y baja"""
+    kind = "gauge"
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos (acumulados al exponerlo, como espera Prometheus)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, labels, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso en formato de texto de Prometheus.
+
+    Además de las métricas propias admite collectors: funciones que se llaman en
+    cada lectura de /metrics y devuelven muestras calculadas en ese momento
+    (tamaños, ratios de caché), así que no cuestan nada entre lecturas.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, name: str, kind: str, documentation: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """Registra una familia cuyas muestras (etiquetas, valor) se calculan al exponerla"""
+        self._collectors.append((name, kind, documentation, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, kind, documentation, collect in self._collectors:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in collect():
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "scrum_http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta (hasta enviar la respuesta completa)",
+    ("method", "route", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "scrum_stage_duration_seconds",
+    "Duración de cada etapa del pipeline (AIAgent, BacklogManager)",
+    ("component", "stage")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "scrum_llm_tokens_total",
+    "Tokens consumidos en Azure OpenAI según el usage de las respuestas",
+    ("type",)
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "scrum_llm_requests_total",
+    "Intentos de llamada a Azure OpenAI por resultado: ok, rate_limited (429), retry (otro error transitorio), failed (sin más reintentos), rejected (circuito abierto)",
+    ("outcome",)
+)
+
+
+class stage:
+    """
+    Mide una etapa en STAGE_SECONDS y, si hay una traza activa, la añade como
+    tramo `componente.etapa`. Sirve como context manager o como decorador de
+    funciones síncronas y asíncronas:
+
+        with stage("ai_agent", "json_parse"):
+            ...
+
+        @stage("backlog_manager", "save")
+        def save_backlog(...):
+    """
+
+    __slots__ = ("component", "name", "_started", "_span")
+
+    def __init__(self, component: str, name: str):
+        self.component = component
+        self.name = name
+        self._started: Optional[float] = None
+        self._span = None
+
+    def __enter__(self) -> "stage":
+        self._span = tracing.start_span(f"{self.component}.{self.name}")
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        STAGE_SECONDS.labels(self.component, self.name).observe(time.perf_counter() - self._started)
+        tracing.end_span(self._span)
+        return False
+
+    def __call__(self, function: Callable) -> Callable:
+        component, name = self.component, self.name
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with stage(component, name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(component, name):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP en HTTP_REQUEST_SECONDS.
+
+    La ruta es la plantilla de FastAPI (`/api/backlogs/{backlog_id}`), no la URL,
+    para que el número de series no crezca con los IDs; las peticiones que no
+    casan con ninguna ruta se agrupan en `unmatched`. En respuestas en streaming
+    se mide hasta el último fragmento.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path_format", None) or "unmatched", status
+            ).observe(time.perf_counter() - started)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,251 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import openai
+from app.services.metrics import LLM_REQUESTS, LLM_TOKENS
+
+
+T = TypeVar("T")
+
+# Errores transitorios de Azure OpenAI que se reintentan
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class LLMUnavailableError(Exception):
+    """El modelo no acepta más peticiones por ahora (cuota agotada o circuito abierto)"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Cubo de fichas que se rellena de forma continua a `per_minute` fichas por minuto"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` fichas (0 si ya las hay)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Devuelve (positivo) o descuenta (negativo) fichas tras conocer el consumo real"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    Regula las llamadas a Azure OpenAI de todo el proceso.
+
+    - Ritmo: un cubo de peticiones por minuto y otro de tokens por minuto
+      (estimados antes de la llamada y corregidos con el `usage` real).
+    - Reintentos: los 429 respetan `Retry-After` (y frenan a todas las llamadas);
+      el resto de errores transitorios esperan un backoff exponencial con jitter.
+    - Circuit breaker: tras `breaker_threshold` fallos seguidos se rechazan las
+      llamadas durante `breaker_cooldown` segundos sin llegar a Azure. Pasado ese
+      tiempo pasa una sola llamada de prueba; si sale bien el circuito se cierra.
+
+    Con `rpm` o `tpm` a 0 no se limita esa dimensión.
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30.0,
+        expected_completion_tokens: int = 2000
+    ):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        # Estimación de tokens, calibrada con el `usage` de las respuestas
+        self.chars_per_token = 4.0
+        self.expected_completion_tokens = float(expected_completion_tokens)
+        self._pacing = asyncio.Lock()
+        self._blocked_until = 0.0
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        # Hay una llamada de prueba en curso (circuito semiabierto)
+        self._probing = False
+        self._circuit_lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+            "rejected": 0, "waited_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0
+        }
+
+    def estimate_tokens(self, prompt_chars: int) -> int:
+        """Tokens que se prevé que consuma una llamada con un prompt de `prompt_chars` caracteres"""
+        return math.ceil(prompt_chars / self.chars_per_token + self.expected_completion_tokens)
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        """Ejecuta `call` respetando el ritmo, con reintentos y circuit breaker"""
+        attempt = 0
+        while True:
+            probe = self._check_circuit()
+            try:
+                await self._acquire(estimated_tokens)
+                self._stats["calls"] += 1
+                result = await call()
+            except (openai.APIStatusError, openai.APIConnectionError) as e:
+                status = getattr(e, "status_code", None)
+                if isinstance(e, openai.APIStatusError) and status not in RETRYABLE_STATUS:
+                    LLM_REQUESTS.labels("failed").inc()
+                    raise
+                delay = self._on_failure(e, attempt, estimated_tokens)
+                LLM_REQUESTS.labels("rate_limited" if isinstance(e, openai.RateLimitError) else "retry").inc()
+                if attempt >= self.max_retries or self._circuit_open():
+                    LLM_REQUESTS.labels("failed").inc()
+                    raise LLMUnavailableError(
+                        f"Azure OpenAI no disponible tras {attempt + 1} intentos: {e}",
+                        retry_after=max(delay, self.breaker_cooldown if self._circuit_open() else 0.0)
+                    ) from e
+                attempt += 1
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            else:
+                with self._circuit_lock:
+                    self._consecutive_failures = 0
+                    self._opened_at = None
+                LLM_REQUESTS.labels("ok").inc()
+                return result
+            finally:
+                # Acabe como acabe (éxito, fallo o cancelación), deja paso a otra prueba
+                if probe:
+                    with self._circuit_lock:
+                        self._probing = False
+
+    def record_usage(self, estimated_tokens: int, prompt_chars: int, usage) -> None:
+        """Corrige el cubo de tokens con el consumo real y recalibra las estimaciones"""
+        if usage is None:
+            return
+        self._stats["prompt_tokens"] += usage.prompt_tokens
+        self._stats["completion_tokens"] += usage.completion_tokens
+        LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens)
+        LLM_TOKENS.labels("completion").inc(usage.completion_tokens)
+        if self.tokens is not None:
+            self.tokens.adjust(estimated_tokens - usage.total_tokens)
+        # Media móvil exponencial: se adapta al modelo y al idioma sin saltos bruscos
+        if usage.prompt_tokens:
+            self.chars_per_token += 0.2 * (prompt_chars / usage.prompt_tokens - self.chars_per_token)
+        self.expected_completion_tokens += 0.2 * (usage.completion_tokens - self.expected_completion_tokens)
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "waited_seconds": round(self._stats["waited_seconds"], 3),
+            "circuit_open": self._circuit_open(),
+            "chars_per_token": round(self.chars_per_token, 3),
+            "expected_completion_tokens": round(self.expected_completion_tokens),
+            "tokens_available": round(self.tokens.tokens) if self.tokens else None
+        }
+
+    async def _acquire(self, estimated_tokens: int) -> None:
+        # Un solo turno a la vez: las llamadas esperan en orden de llegada
+        async with self._pacing:
+            while True:
+                wait = max(
+                    self._blocked_until - time.monotonic(),
+                    self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(estimated_tokens) if self.tokens else 0.0
+                )
+                if wait <= 0:
+                    break
+                self._stats["waited_seconds"] += wait
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(estimated_tokens)
+
+    def _on_failure(self, error: Exception, attempt: int, estimated_tokens: int) -> float:
+        """Registra el fallo y devuelve cuánto esperar antes de reintentar"""
+        self._stats["failures"] += 1
+        retry_after = _retry_after(error)
+        # Un 429 con Retry-After es ritmo, no una caída: no cuenta para el circuito
+        if not (isinstance(error, openai.RateLimitError) and retry_after is not None):
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.breaker_threshold:
+                self._opened_at = time.monotonic()
+
+        if isinstance(error, openai.RateLimitError):
+            self._stats["rate_limited"] += 1
+            # La petición rechazada no consumió cuota
+            if self.tokens is not None:
+                self.tokens.adjust(estimated_tokens)
+        if retry_after is not None:
+            delay = retry_after * random.uniform(1.0, 1.1)
+            # Azure avisa de cuánto falta para recuperar cuota: frena a todas las llamadas
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+        # Backoff exponencial con jitter completo
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _check_circuit(self) -> bool:
+        """
+        Lanza LLMUnavailableError si el circuito no deja pasar la llamada;
+        devuelve True si esta es la llamada de prueba del estado semiabierto
+        """
+        with self._circuit_lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.breaker_cooldown - (time.monotonic() - self._opened_at)
+            # Pasado el enfriamiento pasa una sola llamada: si falla, el contador sigue
+            # por encima del umbral y el circuito vuelve a abrirse
+            if remaining <= 0 and not self._probing:
+                self._probing = True
+                return True
+        self._stats["rejected"] += 1
+        LLM_REQUESTS.labels("rejected").inc()
+        if remaining > 0:
+            message = f"circuito abierto tras {self._consecutive_failures} fallos seguidos"
+        else:
+            message = "circuito semiabierto, comprobando si se ha recuperado"
+        raise LLMUnavailableError(
+            f"Azure OpenAI no disponible: {message}", retry_after=max(remaining, self.backoff_base)
+        )
+
+    def _circuit_open(self) -> bool:
+        return self._opened_at is not None and time.monotonic() - self._opened_at < self.breaker_cooldown
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Espera indicada por Azure en `retry-after-ms` o `retry-after` (segundos)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value is not None:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                continue
+    return None
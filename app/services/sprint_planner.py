@@ -0,0 +1,205 @@
+from typing import Dict, List, Optional
+from app.models import UserStory
+from app.services.dependency_graph import DependencyGraph
+
+
+class SprintPlanner:
+    """
+    Estrategia de distribución de HU en sprints.
+
+    `plan` asigna `sprint_assigned` en cada HU (None si queda fuera) y devuelve
+    los sprints junto con su utilización y las HU sin planificar.
+    """
+
+    name = "base"
+
+    def plan(
+        self,
+        user_stories: List[UserStory],
+        team_capacity: int,
+        num_sprints: Optional[int] = None
+    ) -> Dict:
+        raise NotImplementedError
+
+    def _build_result(
+        self,
+        user_stories: List[UserStory],
+        assignments: List[List[UserStory]],
+        team_capacity: int
+    ) -> Dict:
+        sprints = []
+        for number, stories in enumerate(assignments, 1):
+            total_points = sum(story.story_points for story in stories)
+            sprints.append({
+                "number": number,
+                "name": f"Sprint {number}",
+                "capacity": team_capacity,
+                "user_stories": [story.id for story in stories],
+                "total_points": total_points,
+                "utilization": round(total_points / team_capacity, 4) if team_capacity else 0.0
+            })
+
+        planned = {story.id for stories in assignments for story in stories}
+        for story in user_stories:
+            if story.id not in planned:
+                story.sprint_assigned = None
+
+        total_points = sum(s["total_points"] for s in sprints)
+        total_capacity = team_capacity * len(sprints)
+        return {
+            "strategy": self.name,
+            "sprints": sprints,
+            "total_sprints": len(sprints),
+            "total_points": total_points,
+            "utilization": round(total_points / total_capacity, 4) if total_capacity else 0.0,
+            "unplaced_stories": [story.id for story in user_stories if story.id not in planned]
+        }
+
+
+class GreedySprintPlanner(SprintPlanner):
+    """Una sola pasada en el orden recibido: una HU que no cabe cierra el sprint"""
+
+    name = "greedy"
+
+    def plan(
+        self,
+        user_stories: List[UserStory],
+        team_capacity: int,
+        num_sprints: Optional[int] = None
+    ) -> Dict:
+        assignments: List[List[UserStory]] = []
+        current: List[UserStory] = []
+        current_points = 0
+
+        for story in user_stories:
+            if current and current_points + story.story_points > team_capacity:
+                assignments.append(current)
+                current, current_points = [], 0
+                # Si hay límite de sprints, el resto queda sin planificar
+                if num_sprints and len(assignments) >= num_sprints:
+                    break
+            current.append(story)
+            current_points += story.story_points
+            story.sprint_assigned = len(assignments) + 1
+        else:
+            if current:
+                assignments.append(current)
+
+        return self._build_result(user_stories, assignments, team_capacity)
+
+
+class FirstFitSprintPlanner(SprintPlanner):
+    """
+    First-fit decreasing por bandas de prioridad, respetando dependencias.
+
+    Las HU se recorren por prioridad efectiva, nivel de dependencia y story points
+    de mayor a menor; cada una va al primer sprint con hueco que no sea anterior
+    al de sus prerrequisitos. Así las HU pequeñas rellenan los huecos que dejan
+    las grandes en lugar de abrir sprints nuevos. Una HU mayor que la capacidad
+    ocupa un sprint vacío para ella sola. La búsqueda del primer sprint con hueco
+    usa un árbol de segmentos: O(n log n) en total.
+    """
+
+    name = "first_fit"
+
+    def plan(
+        self,
+        user_stories: List[UserStory],
+        team_capacity: int,
+        num_sprints: Optional[int] = None
+    ) -> Dict:
+        capacity = max(team_capacity, 1)
+        graph = DependencyGraph(user_stories)
+        ranks = graph.effective_ranks()
+        levels = graph.levels()
+        stories = graph.stories
+
+        order = sorted(
+            range(len(stories)),
+            key=lambda i: (ranks[i], levels[i], -stories[i].story_points, stories[i].id)
+        )
+
+        max_sprints = min(num_sprints, len(stories)) if num_sprints else len(stories)
+        tree = _CapacityTree(max_sprints, capacity)
+        sprint_of: List[Optional[int]] = [None] * len(stories)
+        assignments: List[List[UserStory]] = []
+
+        for i in order:
+            earliest = 0
+            for j in graph.prerequisites[i]:
+                if sprint_of[j] is None:
+                    # Un prerrequisito sin planificar arrastra a sus dependientes
+                    earliest = None
+                    break
+                earliest = max(earliest, sprint_of[j])
+            if earliest is None:
+                continue
+
+            need = min(stories[i].story_points, capacity)
+            sprint = tree.first_fit(earliest, need)
+            if sprint is None:
+                continue
+
+            # Una HU más grande que la capacidad llena el sprint por completo
+            tree.consume(sprint, capacity if stories[i].story_points >= capacity else need)
+            sprint_of[i] = sprint
+            stories[i].sprint_assigned = sprint + 1
+            while len(assignments) <= sprint:
+                assignments.append([])
+            assignments[sprint].append(stories[i])
+
+        return self._build_result(user_stories, assignments, team_capacity)
+
+
+class _CapacityTree:
+    """Árbol de segmentos con la capacidad libre máxima de cada rango de sprints"""
+
+    def __init__(self, size: int, capacity: int):
+        self.size = size
+        self.leaves = 1
+        while self.leaves < max(size, 1):
+            self.leaves *= 2
+        self.free = [0] * (2 * self.leaves)
+        for i in range(size):
+            self.free[self.leaves + i] = capacity
+        for node in range(self.leaves - 1, 0, -1):
+            self.free[node] = max(self.free[2 * node], self.free[2 * node + 1])
+
+    def first_fit(self, start: int, need: int) -> Optional[int]:
+        """Primer sprint >= start con al menos `need` puntos libres"""
+        if start >= self.size:
+            return None
+        return self._search(1, 0, self.leaves, start, need)
+
+    def _search(self, node: int, lo: int, hi: int, start: int, need: int) -> Optional[int]:
+        if hi <= start or self.free[node] < need:
+            return None
+        if hi - lo == 1:
+            return lo
+        mid = (lo + hi) // 2
+        found = self._search(2 * node, lo, mid, start, need)
+        if found is None:
+            found = self._search(2 * node + 1, mid, hi, start, need)
+        return found
+
+    def consume(self, sprint: int, points: int) -> None:
+        node = self.leaves + sprint
+        self.free[node] -= points
+        node //= 2
+        while node:
+            self.free[node] = max(self.free[2 * node], self.free[2 * node + 1])
+            node //= 2
+
+
+PLANNERS = {
+    GreedySprintPlanner.name: GreedySprintPlanner,
+    FirstFitSprintPlanner.name: FirstFitSprintPlanner
+}
+
+
+def get_planner(name: str) -> SprintPlanner:
+    """Instancia la estrategia de planificación registrada con ese nombre"""
+    try:
+        return PLANNERS[name]()
+    except KeyError:
+        raise ValueError(f"Estrategia de planificación no soportada: {name}") from None
@@ -0,0 +1,725 @@
+import gc
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Tuple
+from app.models import Backlog, Sprint, SubTask, TestCase, UserStory
+from app.services.file_lock import FileLock
+
+try:
+    # Dependencia opcional: parsea el snapshot más deprisa que json
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+
+# Campos escalares del backlog que se persisten con save_meta (y save_changes)
+META_FIELDS = {
+    "team_capacity", "velocity_history", "current_velocity",
+    "version", "content_hash", "created_at", "updated_at"
+}
+
+
+class BacklogStorage:
+    """
+    Motor de persistencia de un backlog.
+
+    Además de leer y escribir el backlog completo, expone escrituras de grano
+    fino (una HU, un sprint, los metadatos) para que cada motor pueda tocar
+    solo lo que cambia.
+
+    `file_lock` es el cerrojo entre procesos del backlog: quien lee y escribe
+    varias veces seguidas (comprobar la versión y guardar) lo toma alrededor de
+    toda la secuencia.
+    """
+
+    file_lock: FileLock
+
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    def change_token(self) -> Hashable:
+        """
+        Valor barato de obtener que cambia cuando cambian los datos almacenados,
+        también si los modifica otro proceso.
+        """
+        raise NotImplementedError
+
+    def load(self) -> Backlog:
+        raise NotImplementedError
+
+    def read_version(self) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Versión y huella del backlog almacenado sin cargarlo. None si el motor
+        no puede obtenerlas sin leer el backlog completo.
+        """
+        return None
+
+    def save(self, backlog: Backlog) -> None:
+        raise NotImplementedError
+
+    def get_story(self, story_id: str) -> Optional[UserStory]:
+        raise NotImplementedError
+
+    def save_story(self, story: UserStory) -> None:
+        """Inserta o reemplaza una HU (las nuevas van al final del backlog)"""
+        raise NotImplementedError
+
+    def save_sprint(self, sprint: Sprint) -> None:
+        """Inserta o reemplaza un sprint por número"""
+        raise NotImplementedError
+
+    def save_meta(self, backlog: Backlog) -> None:
+        """Persiste los campos escalares del backlog y el historial de velocidad"""
+        raise NotImplementedError
+
+    def save_changes(self, backlog: Backlog, stories: List[UserStory] = (), sprints: List[Sprint] = ()) -> None:
+        """
+        Persiste de una vez unas HU y sprints con los metadatos de `backlog`
+        (versión y huella incluidas). Los motores lo sobrescriben para que sea
+        atómico: tras un corte se ven todos los cambios o ninguno.
+        """
+        for story in stories:
+            self.save_story(story)
+        for sprint in sprints:
+            self.save_sprint(sprint)
+        self.save_meta(backlog)
+
+    def delete(self) -> None:
+        raise NotImplementedError
+
+    def destroy(self) -> None:
+        """
+        Elimina el backlog y sus ficheros; la instancia no debe usarse después.
+        El fichero de cerrojo se conserva: otros procesos pueden tener un flock
+        sobre él, y uno nuevo en su lugar rompería la exclusión mutua.
+        """
+        self.delete()
+
+
+class JSONBacklogStorage(BacklogStorage):
+    """
+    Backlog en un snapshot JSON más un journal de cambios.
+
+    Las escrituras de grano fino se añaden a `<nombre>.journal` como registros
+    compactos de una línea (con fsync), así que su coste es proporcional al
+    cambio; `save_changes` escribe un único registro con todo lo que cambió.
+    Al cargar se aplica el journal sobre el snapshot; cuando crece más allá de
+    `compact_bytes` un hilo en segundo plano lo pliega en un snapshot nuevo,
+    escrito en un temporal y renombrado de forma atómica.
+
+    La cabecera del journal identifica el snapshot sobre el que se escribió
+    (inode, tamaño y mtime): un journal que sobrevive a una compactación
+    interrumpida no se vuelve a aplicar sobre el snapshot nuevo. Una última
+    línea truncada por un corte se ignora.
+
+    `<nombre>.version` guarda la versión y la huella junto con el testigo de
+    los ficheros a los que corresponde, para `read_version` sin cargar el
+    backlog. No lleva fsync: si tras un corte no coincide con los ficheros, se
+    ignora y se carga el backlog.
+
+    El snapshot se escribe compacto con `model_dump_json`; con `pretty`,
+    indentado (más legible, pero más grande y lento).
+    """
+
+    def __init__(self, path: Path, compact_bytes: int = 1024 * 1024, pretty: bool = False):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(".journal")
+        self.version_path = self.path.with_suffix(".version")
+        self.file_lock = FileLock(self.path.with_suffix(".lock"))
+        self.compact_bytes = compact_bytes
+        self.pretty = pretty
+        self._lock = threading.RLock()
+        self._compacting = False
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def change_token(self) -> Hashable:
+        return (_stat_token(self.path), _stat_token(self.journal_path))
+
+    def load(self) -> Backlog:
+        with self.file_lock.shared(), self._lock:
+            if not self.path.exists():
+                return Backlog()
+
+            with _paused_gc():
+                backlog = Backlog.model_validate(_json_loads(self.path.read_bytes()))
+                self._replay(backlog)
+            return backlog
+
+    def read_version(self) -> Optional[Tuple[int, Optional[str]]]:
+        with self.file_lock.shared(), self._lock:
+            if not self.path.exists():
+                return 0, None
+            try:
+                stored = json.loads(self.version_path.read_bytes())
+            except (FileNotFoundError, ValueError):
+                return None
+            # Solo vale si describe exactamente los ficheros actuales
+            if stored["files"] != json.loads(json.dumps(self.change_token())):
+                return None
+            return stored["version"], stored["content_hash"]
+
+    def save(self, backlog: Backlog) -> None:
+        with self.file_lock.exclusive(), self._lock:
+            tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(backlog.model_dump_json(indent=2 if self.pretty else None))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path.parent)
+            self.journal_path.unlink(missing_ok=True)
+            self._write_version(backlog)
+
+    def get_story(self, story_id: str) -> Optional[UserStory]:
+        return next((s for s in self.load().user_stories if s.id == story_id), None)
+
+    def save_story(self, story: UserStory) -> None:
+        self._append("story", story.model_dump_json())
+
+    def save_sprint(self, sprint: Sprint) -> None:
+        self._append("sprint", sprint.model_dump_json())
+
+    def save_meta(self, backlog: Backlog) -> None:
+        self._append("meta", backlog.model_dump_json(include=META_FIELDS), backlog)
+
+    def save_changes(self, backlog: Backlog, stories: List[UserStory] = (), sprints: List[Sprint] = ()) -> None:
+        # Una sola línea (y un solo fsync): al reproducir se aplica entera o se descarta
+        payload = '{{"stories":[{}],"sprints":[{}],"meta":{}}}'.format(
+            ",".join(story.model_dump_json() for story in stories),
+            ",".join(sprint.model_dump_json() for sprint in sprints),
+            backlog.model_dump_json(include=META_FIELDS)
+        )
+        self._append("changes", payload, backlog)
+
+    def delete(self) -> None:
+        with self.file_lock.exclusive(), self._lock:
+            self.path.unlink(missing_ok=True)
+            self.journal_path.unlink(missing_ok=True)
+            self.version_path.unlink(missing_ok=True)
+
+    def compact(self) -> None:
+        """Pliega el journal en un snapshot nuevo"""
+        with self.file_lock.exclusive(), self._lock:
+            if self.journal_path.exists():
+                self.save(self.load())
+
+    def _snapshot_id(self) -> List:
+        stat = self.path.stat()
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    def _append(self, op: str, payload: str, backlog: Optional[Backlog] = None) -> None:
+        # `payload` ya es JSON (model_dump_json): se incrusta sin volver a serializarlo.
+        # Con `backlog` (registros con metadatos) se actualiza también `.version`
+        record = f'{{"op":{json.dumps(op)},"data":{payload}}}'
+
+        with self.file_lock.exclusive(), self._lock:
+            if not self.path.exists():
+                # El journal siempre se apoya en un snapshot
+                self.save(Backlog())
+            if not self.journal_path.exists():
+                header = json.dumps({"snapshot": self._snapshot_id()})
+                record = f"{header}\n{record}"
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(record + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            journal_size = self.journal_path.stat().st_size
+            if backlog is not None:
+                self._write_version(backlog)
+
+        if journal_size >= self.compact_bytes:
+            self._schedule_compaction()
+
+    def _write_version(self, backlog: Backlog) -> None:
+        tmp_path = self.version_path.with_name(f".{self.version_path.name}.tmp")
+        tmp_path.write_text(json.dumps({
+            "version": backlog.version,
+            "content_hash": backlog.content_hash,
+            "files": self.change_token()
+        }), encoding="utf-8")
+        os.replace(tmp_path, self.version_path)
+
+    def _replay(self, backlog: Backlog) -> None:
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            if not header.endswith("\n") or json.loads(header).get("snapshot") != self._snapshot_id():
+                return  # journal de otro snapshot (compactación interrumpida)
+
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # registro incompleto: la escritura se cortó
+                record = json.loads(line)
+                payload = record["data"]
+                if record["op"] == "story":
+                    _apply_story(backlog, payload)
+                elif record["op"] == "sprint":
+                    _apply_sprint(backlog, payload)
+                elif record["op"] == "meta":
+                    _apply_meta(backlog, payload)
+                elif record["op"] == "changes":
+                    for story in payload["stories"]:
+                        _apply_story(backlog, story)
+                    for sprint in payload["sprints"]:
+                        _apply_sprint(backlog, sprint)
+                    _apply_meta(backlog, payload["meta"])
+
+    def _schedule_compaction(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="backlog-journal-compaction", daemon=True).start()
+
+
+class SQLiteBacklogStorage(BacklogStorage):
+    """
+    Backlog normalizado en SQLite (modo WAL).
+
+    Cada HU, subtarea, caso de prueba, sprint y punto del historial de velocidad
+    es una fila, de modo que leer o escribir una HU solo toca sus filas. Las HU
+    se identifican por su posición en el backlog (el ID del modelo no se
+    garantiza único en respuestas del LLM).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS backlog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            team_capacity INTEGER NOT NULL,
+            current_velocity REAL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT
+        );
+        CREATE TABLE IF NOT EXISTS stories (
+            position INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            gherkin TEXT NOT NULL,
+            acceptance_criteria TEXT NOT NULL,
+            story_points INTEGER NOT NULL,
+            priority TEXT NOT NULL,
+            dependencies TEXT NOT NULL,
+            sprint_assigned INTEGER,
+            status TEXT NOT NULL,
+            tags TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_stories_id ON stories (id);
+        CREATE INDEX IF NOT EXISTS idx_stories_status ON stories (status);
+        CREATE INDEX IF NOT EXISTS idx_stories_priority ON stories (priority);
+        CREATE INDEX IF NOT EXISTS idx_stories_sprint ON stories (sprint_assigned);
+        CREATE TABLE IF NOT EXISTS subtasks (
+            story_position INTEGER NOT NULL REFERENCES stories (position) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            estimated_hours REAL,
+            status TEXT NOT NULL,
+            PRIMARY KEY (story_position, position)
+        );
+        CREATE TABLE IF NOT EXISTS test_cases (
+            story_position INTEGER NOT NULL REFERENCES stories (position) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            preconditions TEXT,
+            steps TEXT NOT NULL,
+            expected_result TEXT NOT NULL,
+            test_type TEXT NOT NULL,
+            PRIMARY KEY (story_position, position)
+        );
+        CREATE TABLE IF NOT EXISTS sprints (
+            number INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            capacity INTEGER NOT NULL,
+            user_stories TEXT NOT NULL,
+            total_points INTEGER NOT NULL,
+            completed_points INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            start_date TEXT,
+            end_date TEXT
+        );
+        CREATE TABLE IF NOT EXISTS velocity_history (
+            position INTEGER PRIMARY KEY,
+            points INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file_lock = FileLock(self.path.with_suffix(".lock"))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._local_writes = 0
+
+    def exists(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM backlog_meta").fetchone() is not None
+
+    def change_token(self) -> Hashable:
+        # data_version solo cambia con commits de otras conexiones; los propios se cuentan aparte
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            return (data_version, self._local_writes)
+
+    def load(self) -> Backlog:
+        # Lectura dentro de una transacción para ver una instantánea coherente
+        with self._lock, self._transaction("DEFERRED"), _paused_gc():
+            meta = self._conn.execute("SELECT * FROM backlog_meta").fetchone()
+            if meta is None:
+                return Backlog()
+
+            subtasks = self._children("SELECT * FROM subtasks ORDER BY story_position, position", _row_to_subtask)
+            test_cases = self._children("SELECT * FROM test_cases ORDER BY story_position, position", _row_to_test_case)
+            stories = [
+                _row_to_story(row, subtasks.get(row["position"], []), test_cases.get(row["position"], []))
+                for row in self._conn.execute("SELECT * FROM stories ORDER BY position")
+            ]
+            sprints = [_row_to_sprint(row) for row in self._conn.execute("SELECT * FROM sprints ORDER BY number")]
+            velocity = [row["points"] for row in self._conn.execute("SELECT points FROM velocity_history ORDER BY position")]
+
+        return Backlog(
+            user_stories=stories,
+            sprints=sprints,
+            team_capacity=meta["team_capacity"],
+            velocity_history=velocity,
+            current_velocity=meta["current_velocity"],
+            version=meta["version"],
+            content_hash=meta["content_hash"],
+            created_at=meta["created_at"],
+            updated_at=meta["updated_at"]
+        )
+
+    def read_version(self) -> Optional[Tuple[int, Optional[str]]]:
+        with self._lock:
+            meta = self._conn.execute("SELECT version, content_hash FROM backlog_meta").fetchone()
+        return (meta["version"], meta["content_hash"]) if meta is not None else (0, None)
+
+    def save(self, backlog: Backlog) -> None:
+        with self._lock, self._transaction():
+            for table in ("test_cases", "subtasks", "stories", "sprints", "velocity_history", "backlog_meta"):
+                self._conn.execute(f"DELETE FROM {table}")
+            for position, story in enumerate(backlog.user_stories):
+                self._insert_story(story, position)
+            for sprint in backlog.sprints:
+                self._upsert_sprint(sprint)
+            self._write_meta(backlog)
+
+    def get_story(self, story_id: str) -> Optional[UserStory]:
+        with self._lock, self._transaction("DEFERRED"):
+            row = self._conn.execute(
+                "SELECT * FROM stories WHERE id = ? ORDER BY position LIMIT 1", (story_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            subtasks = [_row_to_subtask(r) for r in self._conn.execute(
+                "SELECT * FROM subtasks WHERE story_position = ? ORDER BY position", (row["position"],)
+            )]
+            test_cases = [_row_to_test_case(r) for r in self._conn.execute(
+                "SELECT * FROM test_cases WHERE story_position = ? ORDER BY position", (row["position"],)
+            )]
+        return _row_to_story(row, subtasks, test_cases)
+
+    def save_story(self, story: UserStory) -> None:
+        with self._lock, self._transaction():
+            self._upsert_story(story)
+
+    def save_sprint(self, sprint: Sprint) -> None:
+        with self._lock, self._transaction():
+            self._upsert_sprint(sprint)
+
+    def save_meta(self, backlog: Backlog) -> None:
+        with self._lock, self._transaction():
+            self._write_meta(backlog)
+
+    def save_changes(self, backlog: Backlog, stories: List[UserStory] = (), sprints: List[Sprint] = ()) -> None:
+        # Una transacción: ni un corte ni otra conexión ven las filas sin la versión nueva
+        with self._lock, self._transaction():
+            for story in stories:
+                self._upsert_story(story)
+            for sprint in sprints:
+                self._upsert_sprint(sprint)
+            self._write_meta(backlog)
+
+    def delete(self) -> None:
+        with self._lock, self._transaction():
+            for table in ("test_cases", "subtasks", "stories", "sprints", "velocity_history", "backlog_meta"):
+                self._conn.execute(f"DELETE FROM {table}")
+
+    def destroy(self) -> None:
+        with self._lock:
+            self._conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    def _migrate(self) -> None:
+        # Bases creadas antes de versionar el backlog
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(backlog_meta)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE backlog_meta ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "content_hash" not in columns:
+            self._conn.execute("ALTER TABLE backlog_meta ADD COLUMN content_hash TEXT")
+
+    def _transaction(self, mode: str = "IMMEDIATE") -> "_Transaction":
+        if mode == "IMMEDIATE":
+            self._local_writes += 1
+        return _Transaction(self._conn, mode)
+
+    def _children(self, query: str, convert) -> Dict[int, List]:
+        grouped: Dict[int, List] = {}
+        for row in self._conn.execute(query):
+            grouped.setdefault(row["story_position"], []).append(convert(row))
+        return grouped
+
+    def _insert_story(self, story: UserStory, position: int) -> None:
+        self._conn.execute(
+            "INSERT INTO stories VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                position, story.id, story.title, story.gherkin,
+                json.dumps(story.acceptance_criteria, ensure_ascii=False),
+                story.story_points, story.priority,
+                json.dumps(story.dependencies, ensure_ascii=False),
+                story.sprint_assigned, story.status,
+                json.dumps(story.tags, ensure_ascii=False)
+            )
+        )
+        self._conn.executemany(
+            "INSERT INTO subtasks VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (position, i, st.id, st.title, st.description, st.estimated_hours, st.status)
+                for i, st in enumerate(story.subtasks)
+            ]
+        )
+        self._conn.executemany(
+            "INSERT INTO test_cases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    position, i, tc.id, tc.title, tc.description, tc.preconditions,
+                    json.dumps(tc.steps, ensure_ascii=False), tc.expected_result, tc.test_type
+                )
+                for i, tc in enumerate(story.test_cases)
+            ]
+        )
+
+    def _upsert_story(self, story: UserStory) -> None:
+        row = self._conn.execute(
+            "SELECT position FROM stories WHERE id = ? ORDER BY position LIMIT 1", (story.id,)
+        ).fetchone()
+        if row is not None:
+            position = row["position"]
+            self._conn.execute("DELETE FROM stories WHERE position = ?", (position,))
+        else:
+            position = self._conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM stories").fetchone()[0]
+        self._insert_story(story, position)
+
+    def _upsert_sprint(self, sprint: Sprint) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sprints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                sprint.number, sprint.name, sprint.capacity,
+                json.dumps(sprint.user_stories, ensure_ascii=False),
+                sprint.total_points, sprint.completed_points, sprint.status,
+                sprint.start_date.isoformat() if sprint.start_date else None,
+                sprint.end_date.isoformat() if sprint.end_date else None
+            )
+        )
+
+    def _write_meta(self, backlog: Backlog) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO backlog_meta "
+            "(id, team_capacity, current_velocity, created_at, updated_at, version, content_hash) "
+            "VALUES (1, ?, ?, ?, ?, ?, ?)",
+            (
+                backlog.team_capacity, backlog.current_velocity,
+                backlog.created_at.isoformat(), backlog.updated_at.isoformat(),
+                backlog.version, backlog.content_hash
+            )
+        )
+        self._conn.execute("DELETE FROM velocity_history")
+        self._conn.executemany(
+            "INSERT INTO velocity_history VALUES (?, ?)",
+            list(enumerate(backlog.velocity_history))
+        )
+
+
+class _Transaction:
+    """BEGIN/COMMIT explícitos (la conexión trabaja en modo autocommit)"""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self):
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_storage(
+    engine: str,
+    data_dir: Path,
+    name: str = "backlog",
+    journal_compact_bytes: int = 1024 * 1024,
+    json_pretty: bool = False
+) -> BacklogStorage:
+    """Instancia el motor de persistencia configurado en BACKLOG_STORAGE (ficheros `<name>.*`)"""
+    if engine == "json":
+        return JSONBacklogStorage(data_dir / f"{name}.json", compact_bytes=journal_compact_bytes, pretty=json_pretty)
+    elif engine == "sqlite":
+        return SQLiteBacklogStorage(data_dir / f"{name}.db")
+    else:
+        raise ValueError(f"Motor de almacenamiento no soportado: {engine}")
+
+
+# Umbral de la generación 0 mientras se construye un backlog
+LOAD_GC_THRESHOLD = 100_000
+
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_saved_threshold: Tuple[int, ...] = ()
+
+
+@contextmanager
+def _paused_gc():
+    """
+    Espacia las pasadas del recolector cíclico mientras se construye un
+    backlog: son miles de objetos de larga vida y recorrerlos una y otra vez
+    sin liberar nada era más de la mitad del tiempo de carga. El recolector no
+    se desactiva (el resto de hilos sigue contando con él): solo se sube el
+    umbral de la generación 0. Admite cargas simultáneas; el umbral anterior
+    se restaura al terminar la última.
+    """
+    global _gc_pauses, _gc_saved_threshold
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_saved_threshold = gc.get_threshold()
+            gc.set_threshold(max(LOAD_GC_THRESHOLD, _gc_saved_threshold[0]), *_gc_saved_threshold[1:])
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0:
+                gc.set_threshold(*_gc_saved_threshold)
+
+
+def _stat_token(path: Path) -> Hashable:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Persiste en disco la entrada de directorio tras un rename"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _apply_story(backlog: Backlog, payload: Dict) -> None:
+    story = UserStory.model_validate(payload)
+    _replace_or_append(backlog.user_stories, story, lambda s: s.id == story.id)
+
+
+def _apply_sprint(backlog: Backlog, payload: Dict) -> None:
+    sprint = Sprint.model_validate(payload)
+    _replace_or_append(backlog.sprints, sprint, lambda s: s.number == sprint.number)
+
+
+def _apply_meta(backlog: Backlog, payload: Dict) -> None:
+    # Todos los campos del backlog tienen valor por defecto: se validan solo los del registro
+    meta = Backlog.model_validate(payload)
+    for field in payload:
+        setattr(backlog, field, getattr(meta, field))
+
+
+def _replace_or_append(items: List, item, matches) -> None:
+    for i, existing in enumerate(items):
+        if matches(existing):
+            items[i] = item
+            return
+    items.append(item)
+
+
+def _row_to_story(row: sqlite3.Row, subtasks: List[SubTask], test_cases: List[TestCase]) -> UserStory:
+    return UserStory(
+        id=row["id"],
+        title=row["title"],
+        gherkin=row["gherkin"],
+        acceptance_criteria=json.loads(row["acceptance_criteria"]),
+        test_cases=test_cases,
+        story_points=row["story_points"],
+        priority=row["priority"],
+        dependencies=json.loads(row["dependencies"]),
+        subtasks=subtasks,
+        sprint_assigned=row["sprint_assigned"],
+        status=row["status"],
+        tags=json.loads(row["tags"])
+    )
+
+
+def _row_to_subtask(row: sqlite3.Row) -> SubTask:
+    return SubTask(
+        id=row["id"],
+        title=row["title"],
+        description=row["description"],
+        estimated_hours=row["estimated_hours"],
+        status=row["status"]
+    )
+
+
+def _row_to_test_case(row: sqlite3.Row) -> TestCase:
+    return TestCase(
+        id=row["id"],
+        title=row["title"],
+        description=row["description"],
+        preconditions=row["preconditions"],
+        steps=json.loads(row["steps"]),
+        expected_result=row["expected_result"],
+        test_type=row["test_type"]
+    )
+
+
+def _row_to_sprint(row: sqlite3.Row) -> Sprint:
+    return Sprint(
+        number=row["number"],
+        name=row["name"],
+        capacity=row["capacity"],
+        user_stories=json.loads(row["user_stories"]),
+        total_points=row["total_points"],
+        completed_points=row["completed_points"],
+        status=row["status"],
+        start_date=row["start_date"],
+        end_date=row["end_date"]
+    )
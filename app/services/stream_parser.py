@@ -0,0 +1,88 @@
+import json
+from typing import Dict, List, Optional
+
+
+class UserStoriesStreamParser:
+    """
+    Parser incremental del JSON de respuesta del modelo.
+
+    Recibe fragmentos de texto tal como llegan en un completion en streaming y
+    devuelve cada elemento del array `user_stories` en cuanto su objeto se cierra,
+    sin esperar al documento completo.
+    """
+
+    def __init__(self, array_key: str = "user_stories"):
+        self.array_key = array_key
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Añade un fragmento y devuelve los elementos completados con él"""
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    # Solo interesan las claves del objeto raíz
+                    if self._depth == 1 and self._string_start is not None:
+                        self._last_key = json.loads(buffer[self._string_start:i + 1])
+                    self._string_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if (
+                    char == "[" and self._depth == 1
+                    and self._array_depth is None and self._last_key == self.array_key
+                ):
+                    self._array_depth = self._depth + 1
+                elif char == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if char == "}" and self._item_start is not None and self._depth == self._array_depth:
+                    items.append(json.loads(buffer[self._item_start:i + 1]))
+                    self._item_start = None
+                elif char == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self._array_depth = None
+                    self._last_key = None
+
+        self._pos = len(buffer)
+        self._compact()
+        return items
+
+    def _compact(self) -> None:
+        """Descarta el texto ya consumido que no forma parte de un elemento abierto"""
+        if self._item_start is not None:
+            keep_from = self._item_start
+        elif self._string_start is not None:
+            keep_from = self._string_start
+        else:
+            keep_from = self._pos
+
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._item_start is not None:
+                self._item_start -= keep_from
+            if self._string_start is not None:
+                self._string_start -= keep_from
@@ -0,0 +1,235 @@
+import contextvars
+import cProfile
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+REQUEST_ID_HEADER = "x-request-id"
+PROFILE_HEADER = "x-debug-profile"
+# IDs de petición aceptados del cliente; cualquier otro se sustituye por uno nuevo
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+# Entradas de Server-Timing (las etapas más lentas); el resto se omite
+SERVER_TIMING_MAX_ENTRIES = 20
+
+logger = logging.getLogger("app.trace")
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """Tramo de una traza: nombre, inicio/fin (perf_counter) y tramos hijos"""
+
+    __slots__ = ("name", "start", "end", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin: float) -> Dict:
+        """Tramo y sus hijos con tiempos en ms relativos a `origin`"""
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3)
+        }
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class Trace:
+    """Árbol de tramos de una petición (o de un trabajo) identificado por `request_id`"""
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.root = Span(name)
+        # Datos adicionales para el log (p. ej. el status de la respuesta)
+        self.attributes: Dict = {}
+
+    def spans(self) -> List[Span]:
+        """Todos los tramos salvo la raíz, en profundidad"""
+        pending, result = list(reversed(self.root.children)), []
+        while pending:
+            span = pending.pop()
+            result.append(span)
+            pending.extend(reversed(span.children))
+        return result
+
+    def server_timing(self) -> str:
+        """
+        Cabecera Server-Timing: duración total y la suma por etapa (una etapa
+        puede repetirse, p. ej. una llamada al modelo por sección)
+        """
+        totals: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for span in self.spans():
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+            counts[span.name] = counts.get(span.name, 0) + 1
+        slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:SERVER_TIMING_MAX_ENTRIES]
+        entries = [
+            f'{name};dur={duration * 1000:.1f}' + (f';desc="x{counts[name]}"' if counts[name] > 1 else "")
+            for name, duration in slowest
+        ]
+        entries.append(f"total;dur={self.root.duration * 1000:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict:
+        return {"request_id": self.request_id, **self.attributes, **self.root.to_dict(self.root.start)}
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def start_span(name: str) -> Optional[Tuple]:
+    """
+    Abre un tramo hijo del actual si hay una traza activa (si no, no hace nada).
+    Devuelve lo que necesita `end_span`.
+    """
+    if _current_trace.get() is None:
+        return None
+    parent = _current_span.get()
+    span = Span(name)
+    parent.children.append(span)
+    return span, parent, _current_span.set(span)
+
+
+def end_span(handle: Optional[Tuple]) -> None:
+    if handle is None:
+        return
+    span, parent, token = handle
+    span.end = time.perf_counter()
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Cerrado desde otro contexto (p. ej. un generador asíncrono cerrado por otra tarea)
+        _current_span.set(parent)
+
+
+def enable_json_log() -> None:
+    """Envía las trazas (una línea JSON por petición) a stderr si nadie ha configurado el logger"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+
+@contextmanager
+def trace(request_id: Optional[str], name: str, log: bool = False):
+    """Activa una traza nueva durante el bloque; con `log` la escribe como JSON al terminar"""
+    current = Trace(request_id or uuid.uuid4().hex, name)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(current.root)
+    try:
+        yield current
+    finally:
+        current.root.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if log:
+            logger.info(json.dumps(current.to_dict(), ensure_ascii=False))
+
+
+class Profiler:
+    """
+    cProfile bajo demanda; el perfil se vuelca en `directory` como `.prof`
+    (se abre con `python -m pstats` o snakeviz).
+
+    cProfile mide el hilo del bucle de eventos, así que incluye lo que otras
+    peticiones concurrentes ejecuten mientras tanto; por eso solo se perfila
+    una petición a la vez.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._busy = threading.Lock()
+
+    @contextmanager
+    def profile(self, request_id: str):
+        """Devuelve el nombre del fichero del perfil, o None si ya hay otro en curso"""
+        if not self._busy.acquire(blocking=False):
+            yield None
+            return
+        profiler = cProfile.Profile()
+        filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{request_id}.prof"
+        try:
+            profiler.enable()
+            yield filename
+        finally:
+            profiler.disable()
+            self._busy.release()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(self.directory / filename))
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que abre una traza por petición.
+
+    - `X-Request-ID`: se respeta el del cliente (si es válido) o se genera uno, y
+      se devuelve en la respuesta.
+    - `Server-Timing`: total y duración por etapa de lo ejecutado antes de
+      enviar las cabeceras (en streaming, lo previo al primer fragmento).
+    - Con `log_json`, al terminar la respuesta se escribe el árbol de tramos como
+      una línea JSON en el logger `app.trace`.
+    - Con `profiling` = "header" se perfila con cProfile la petición que traiga
+      `X-Debug-Profile: 1`; con "all", todas. El fichero se indica en `X-Profile`.
+    """
+
+    def __init__(self, app, log_json: bool = False, profiling: str = "off", profiles_dir: Optional[Path] = None):
+        self.app = app
+        self.log_json = log_json
+        self.profiling = profiling
+        self.profiler = Profiler(profiles_dir) if profiling != "off" and profiles_dir else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        request_id = headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        profile = self.profiler is not None and (
+            self.profiling == "all" or headers.get(PROFILE_HEADER, "").lower() in ("1", "true")
+        )
+
+        with trace(request_id, f"{scope['method']} {scope['path']}", log=self.log_json) as current:
+            profile_name = None
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    current.attributes["status"] = message["status"]
+                    extra = [
+                        (b"x-request-id", request_id.encode("latin-1")),
+                        (b"server-timing", current.server_timing().encode("latin-1"))
+                    ]
+                    if profile:
+                        extra.append((b"x-profile", (profile_name or "busy").encode("latin-1")))
+                    message = {**message, "headers": list(message.get("headers", [])) + extra}
+                await send(message)
+
+            if not profile:
+                await self.app(scope, receive, send_wrapper)
+                return
+            with self.profiler.profile(request_id) as profile_name:
+                await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,95 @@
+"""
+Sustituto en proceso de Azure OpenAI para los benchmarks.
+
+Reproduce respuestas preparadas (en rotación, siempre en el mismo orden) con una
+latencia configurable, con y sin streaming y con `usage`, así que AIAgent recorre
+su camino real (limitador, parseo, construcción de HU, priorización) sin red.
+
+    agent = AIAgent()
+    fake = install(agent, [llm_response(8)], latency=0.05)
+    stories = await agent.generate_user_stories("...")
+"""
+
+import asyncio
+import itertools
+import math
+import time
+import uuid
+from typing import AsyncIterator, List, Sequence
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+
+class FakeChatCompletions:
+    """Implementa `chat.completions.create` devolviendo los tipos del SDK de openai"""
+
+    def __init__(self, responses: Sequence[str], latency: float = 0.0, chunk_chars: int = 40):
+        if not responses:
+            raise ValueError("Se necesita al menos una respuesta")
+        self.responses = list(responses)
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self._next = itertools.cycle(self.responses)
+
+    async def create(self, *, model: str, messages: List[dict], stream: bool = False, **kwargs):
+        self.calls += 1
+        content = next(self._next)
+        prompt_chars = sum(len(message.get("content") or "") for message in messages)
+        usage = {
+            "prompt_tokens": math.ceil(prompt_chars / 4),
+            "completion_tokens": math.ceil(len(content) / 4)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if stream:
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage", False)
+            return self._stream(completion_id, model, content, usage if include_usage else None)
+
+        await asyncio.sleep(self.latency)
+        return ChatCompletion.model_validate({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    async def _stream(self, completion_id: str, model: str, content: str, usage) -> AsyncIterator[ChatCompletionChunk]:
+        pieces = [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)] or [""]
+        created = int(time.time())
+        # La latencia va antes del primer fragmento: repartirla en miles de sleeps
+        # mediría la granularidad del bucle de eventos, no el parseo incremental
+        await asyncio.sleep(self.latency)
+        for position, piece in enumerate(pieces):
+            await asyncio.sleep(0)
+            yield _chunk(completion_id, created, model, [{
+                "index": 0,
+                "delta": {"content": piece},
+                "finish_reason": "stop" if position == len(pieces) - 1 else None
+            }])
+        if usage is not None:
+            yield _chunk(completion_id, created, model, [], usage)
+
+
+def install(agent, responses: Sequence[str], latency: float = 0.0) -> FakeChatCompletions:
+    """Redirige las llamadas al modelo de `agent` (un AIAgent) al sustituto"""
+    fake = FakeChatCompletions(responses, latency)
+    agent.client.chat.completions = fake
+    return fake
+
+
+def _chunk(completion_id: str, created: int, model: str, choices, usage=None) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": choices,
+        "usage": usage
+    })
@@ -0,0 +1,145 @@
+"""
+Servidor local que imita el endpoint de chat completions de Azure OpenAI.
+
+Aplica su propia cuota de peticiones y tokens por minuto y responde 429 con
+`Retry-After` al superarla (y, opcionalmente, 500/503 al azar), así que sirve
+para probar el limitador y los reintentos de AIAgent sin gastar cuota real.
+Devuelve HU sintéticas en JSON, con y sin streaming, con `usage`.
+
+Uso:
+    python -m benchmarks.fake_openai_server --port 8001 --rpm 30 --tpm 40000 --error-rate 0.05
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8001 uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.services.rate_limiter import TokenBucket
+from benchmarks.synthetic import llm_response
+
+
+def create_app(
+    rpm: int = 60,
+    tpm: int = 100000,
+    error_rate: float = 0.0,
+    latency: float = 0.5,
+    stories: int = 8
+) -> FastAPI:
+    app = FastAPI(title="Fake Azure OpenAI")
+    requests_bucket = TokenBucket(rpm) if rpm > 0 else None
+    tokens_bucket = TokenBucket(tpm) if tpm > 0 else None
+    counters = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+        prompt_chars = sum(len(message.get("content") or "") for message in body.get("messages", []))
+        content = llm_response(stories, seed=counters["requests"])
+        usage = {
+            "prompt_tokens": math.ceil(prompt_chars / 4),
+            "completion_tokens": math.ceil(len(content) / 4)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        # Cuota: como Azure, se rechaza con 429 indicando cuándo habrá hueco
+        wait = max(
+            requests_bucket.wait_time(1) if requests_bucket else 0.0,
+            tokens_bucket.wait_time(usage["total_tokens"]) if tokens_bucket else 0.0
+        )
+        if wait > 0:
+            counters["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(math.ceil(wait)), "retry-after-ms": str(int(wait * 1000))},
+                content={"error": {"code": "429", "message": f"Rate limit exceeded. Retry after {math.ceil(wait)} seconds."}}
+            )
+        if requests_bucket:
+            requests_bucket.take(1)
+        if tokens_bucket:
+            tokens_bucket.take(usage["total_tokens"])
+
+        if random.random() < error_rate:
+            counters["errors"] += 1
+            status = random.choice([500, 503])
+            return JSONResponse(status_code=status, content={"error": {"code": str(status), "message": "Fallo simulado"}})
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": deployment,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events():
+            pieces = [content[i:i + 40] for i in range(0, len(content), 40)]
+            for position, piece in enumerate(pieces):
+                await asyncio.sleep(latency / len(pieces))
+                last = position == len(pieces) - 1
+                yield _chunk(completion_id, created, deployment, [{
+                    "index": 0,
+                    "delta": {"content": piece},
+                    "finish_reason": "stop" if last else None
+                }])
+            if include_usage:
+                yield _chunk(completion_id, created, deployment, [], usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+def _chunk(completion_id: str, created: int, model: str, choices, usage=None) -> str:
+    data = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": choices,
+        "usage": usage
+    }
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--rpm", type=int, default=60, help="Peticiones por minuto antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--tpm", type=int, default=100000, help="Tokens por minuto antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500/503")
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos por respuesta")
+    parser.add_argument("--stories", type=int, default=8, help="HU por respuesta")
+    args = parser.parse_args()
+
+    app = create_app(args.rpm, args.tpm, args.error_rate, args.latency, args.stories)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
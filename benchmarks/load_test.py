@@ -0,0 +1,415 @@
+"""
+Prueba de carga HTTP de la API con un modelo simulado.
+
+Lanza el servidor falso de Azure OpenAI (`benchmarks.fake_openai_server`) y la
+aplicación con uvicorn en puertos libres, siembra un backlog sintético y simula
+usuarios concurrentes que recorren una mezcla de endpoints con pausas entre
+peticiones, mientras unos generadores lanzan generaciones sin parar. La carga
+sube por etapas (`--users 1,10,50`); por etapa y endpoint se informa del
+rendimiento, la tasa de errores y los percentiles de latencia, y al final de
+cuántos usuarios aguanta una instancia sin que el p99 del endpoint vigilado
+supere el objetivo.
+
+Uso:
+    python -m benchmarks.load_test --users 1,10,25,50 --duration 30 --generators 2
+    python -m benchmarks.load_test --mix read --seed-stories 5000 --slo-ms 200 --output carga.json
+    python -m benchmarks.load_test --llm-latency 5 --llm-error-rate 0.05 --workers 4
+    python -m benchmarks.load_test --target http://127.0.0.1:8000 --users 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+
+
+REQUIREMENTS = (
+    "Sistema de reservas para una cadena de gimnasios: los socios reservan clases, "
+    "cancelan con antelación, pagan cuotas y reciben avisos; los monitores gestionan "
+    "su agenda y los administradores publican el calendario."
+)
+
+# Mezclas de endpoints: nombre de la acción -> peso
+MIXES: Dict[str, Dict[str, int]] = {
+    # Un frontend consultando: lecturas completas, paginadas y sondeos con ETag
+    "read": {
+        "GET /api/backlog": 30,
+        "GET /api/backlog?view=compact&limit=50": 25,
+        "GET /api/backlog (If-None-Match)": 20,
+        "GET /api/backlog/stories/{id}": 15,
+        "GET /api/export/markdown": 5,
+        "GET /health": 5
+    },
+    # Lo anterior con escrituras y generaciones ocasionales
+    "mixed": {
+        "GET /api/backlog": 25,
+        "GET /api/backlog?view=compact&limit=50": 20,
+        "GET /api/backlog (If-None-Match)": 15,
+        "GET /api/backlog/stories/{id}": 15,
+        "GET /api/export/markdown": 5,
+        "POST /api/plan-sprints": 2,
+        "POST /api/generate-backlog": 4,
+        "POST /api/generate-backlog/stream": 3,
+        "POST /api/jobs/generate-backlog": 1
+    },
+    # Sobre todo generaciones
+    "generate": {
+        "GET /api/backlog": 10,
+        "POST /api/generate-backlog": 10,
+        "POST /api/generate-backlog/stream": 10,
+        "POST /api/jobs/generate-backlog": 5
+    }
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class User:
+    """Estado de un usuario virtual: su backlog de generación y el último ETag visto"""
+
+    def __init__(self, number: int, story_ids: List[str], rng: random.Random):
+        self.number = number
+        self.backlog_id = f"load-{number}"
+        self.story_ids = story_ids
+        self.rng = rng
+        self.etag: Optional[str] = None
+
+
+async def _get_backlog(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.get("/api/backlog")).status_code
+
+
+async def _get_compact(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.get("/api/backlog", params={"view": "compact", "limit": 50})).status_code
+
+
+async def _get_conditional(client: httpx.AsyncClient, user: User) -> int:
+    headers = {"If-None-Match": user.etag} if user.etag else {}
+    response = await client.get("/api/backlog", params={"view": "compact"}, headers=headers)
+    user.etag = response.headers.get("etag", user.etag)
+    return response.status_code
+
+
+async def _get_story(client: httpx.AsyncClient, user: User) -> int:
+    story_id = user.rng.choice(user.story_ids) if user.story_ids else "HU1"
+    return (await client.get(f"/api/backlog/stories/{story_id}")).status_code
+
+
+async def _export(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.get("/api/export/markdown")).status_code
+
+
+async def _health(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.get("/health")).status_code
+
+
+async def _plan(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.post("/api/plan-sprints", json={"team_capacity": 30})).status_code
+
+
+def _generation(user: User) -> Dict:
+    # Cada usuario genera en su propio backlog: el sembrado no se sustituye
+    return {"requirements": REQUIREMENTS, "team_capacity": 20, "backlog_id": user.backlog_id}
+
+
+async def _generate(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.post("/api/generate-backlog", json=_generation(user))).status_code
+
+
+async def _generate_stream(client: httpx.AsyncClient, user: User) -> int:
+    async with client.stream("POST", "/api/generate-backlog/stream", json=_generation(user)) as response:
+        body = b""
+        async for chunk in response.aiter_bytes():
+            body += chunk
+    # El status llega antes de generar: los fallos viajan como evento `error`
+    return 599 if b"event: error" in body else response.status_code
+
+
+async def _submit_job(client: httpx.AsyncClient, user: User) -> int:
+    return (await client.post("/api/jobs/generate-backlog", json=_generation(user))).status_code
+
+
+ACTIONS: Dict[str, Callable[[httpx.AsyncClient, User], Awaitable[int]]] = {
+    "GET /api/backlog": _get_backlog,
+    "GET /api/backlog?view=compact&limit=50": _get_compact,
+    "GET /api/backlog (If-None-Match)": _get_conditional,
+    "GET /api/backlog/stories/{id}": _get_story,
+    "GET /api/export/markdown": _export,
+    "GET /health": _health,
+    "POST /api/plan-sprints": _plan,
+    "POST /api/generate-backlog": _generate,
+    "POST /api/generate-backlog/stream": _generate_stream,
+    "POST /api/jobs/generate-backlog": _submit_job
+}
+
+
+class Recorder:
+    """Latencias y resultados por acción de una etapa"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    async def call(self, name: str, client: httpx.AsyncClient, user: User) -> None:
+        started = time.perf_counter()
+        try:
+            status = await ACTIONS[name](client, user)
+            outcome = None if status < 400 else str(status)
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        if outcome is not None:
+            errors = self.errors.setdefault(name, {})
+            errors[outcome] = errors.get(outcome, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Dict]:
+        result = {}
+        for name, latencies in sorted(self.latencies.items()):
+            errors = self.errors.get(name, {})
+            ordered = sorted(latencies)
+            result[name] = {
+                "requests": len(ordered),
+                "rps": round(len(ordered) / duration, 2),
+                "error_rate": round(sum(errors.values()) / len(ordered), 4),
+                "errors": errors,
+                **{f"p{p}_ms": round(percentile(ordered, p) * 1000, 2) for p in PERCENTILES},
+                "max_ms": round(ordered[-1] * 1000, 2)
+            }
+        return result
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    index = max(0, min(len(ordered) - 1, int(-(-p * len(ordered) // 100)) - 1))
+    return ordered[index]
+
+
+async def run_stage(
+    base_url: str,
+    users: int,
+    generators: int,
+    mix: Dict[str, int],
+    duration: float,
+    think: float,
+    story_ids: List[str],
+    timeout: float,
+    seed: int
+) -> Dict:
+    """Una etapa: `users` usuarios con la mezcla y `generators` generando sin pausa"""
+    recorder = Recorder()
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=users + generators + 10, max_keepalive_connections=users + generators + 10)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def user_loop(number: int) -> None:
+            rng = random.Random(seed * 100003 + number)
+            user = User(number, story_ids, rng)
+            # Arranque escalonado: los usuarios no llegan todos en el mismo instante
+            await asyncio.sleep(rng.uniform(0, think))
+            while time.monotonic() < deadline:
+                await recorder.call(rng.choices(names, weights)[0], client, user)
+                if think > 0:
+                    await asyncio.sleep(rng.expovariate(1 / think))
+
+        async def generator_loop(number: int) -> None:
+            user = User(10000 + number, story_ids, random.Random(seed + number))
+            while time.monotonic() < deadline:
+                await recorder.call("POST /api/generate-backlog", client, user)
+
+        started = time.monotonic()
+        await asyncio.gather(
+            *(user_loop(i) for i in range(users)),
+            *(generator_loop(i) for i in range(generators))
+        )
+        elapsed = time.monotonic() - started
+
+    return {"users": users, "generators": generators, "duration_s": round(elapsed, 2), "endpoints": recorder.summary(elapsed)}
+
+
+def print_stage(stage: Dict) -> None:
+    print(f"\n{stage['users']} usuarios + {stage['generators']} generadores, {stage['duration_s']} s")
+    print(f"  {'endpoint':<42} {'req':>6} {'req/s':>7} {'error':>6} " + " ".join(f"{f'p{p}':>8}" for p in PERCENTILES) + f" {'máx':>8}")
+    for name, data in stage["endpoints"].items():
+        print(
+            f"  {name:<42} {data['requests']:>6} {data['rps']:>7.1f} {data['error_rate'] * 100:>5.1f}% "
+            + " ".join(f"{data[f'p{p}_ms']:>8.1f}" for p in PERCENTILES)
+            + f" {data['max_ms']:>8.1f}"
+        )
+        if data["errors"]:
+            print(f"  {'':<42} errores: {data['errors']}")
+
+
+def capacity(stages: List[Dict], watch: str, slo_ms: float, max_error_rate: float) -> Optional[int]:
+    """Mayor número de usuarios con el p99 de `watch` y su tasa de errores dentro del objetivo"""
+    print(f"\nCapacidad ({watch}: p99 <= {slo_ms:.0f} ms y errores <= {max_error_rate * 100:.1f} %)")
+    best = None
+    for stage in stages:
+        data = stage["endpoints"].get(watch)
+        if data is None:
+            print(f"  {stage['users']:>5} usuarios: sin peticiones a {watch}")
+            continue
+        ok = data["p99_ms"] <= slo_ms and data["error_rate"] <= max_error_rate
+        print(f"  {stage['users']:>5} usuarios: p99 {data['p99_ms']:8.1f} ms  errores {data['error_rate'] * 100:5.1f} %  {'OK' if ok else 'SUPERADO'}")
+        if ok and (best is None or stage["users"] > best):
+            best = stage["users"]
+    print(f"  -> {best if best is not None else 'ninguna etapa'} usuarios")
+    return best
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, seconds: float = 30.0) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El proceso terminó al arrancar ({url}); código {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {seconds:.0f} s")
+
+
+def _seed(stories: int) -> List[str]:
+    """Guarda un backlog sintético como backlog por defecto (antes de arrancar la app)"""
+    from app.services.backlog_manager import BacklogManager
+    from benchmarks.synthetic import build_backlog
+
+    backlog = build_backlog(stories)
+    BacklogManager().save_backlog(backlog)
+    return [story.id for story in backlog.user_stories]
+
+
+def launch(args) -> Tuple[str, str, List[subprocess.Popen], List[str]]:
+    """Arranca el modelo simulado y la app; devuelve sus URLs, los procesos y los IDs sembrados"""
+    work_dir = tempfile.mkdtemp(prefix="backlog-load-")
+    llm_port, app_port = _free_port(), _free_port()
+    llm_url, app_url = f"http://127.0.0.1:{llm_port}", f"http://127.0.0.1:{app_port}"
+    # La app hereda este entorno; el sembrado de este proceso escribe en el mismo DATA_DIR
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": llm_url,
+        "AZURE_OPENAI_API_KEY": "load-test",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "load-test",
+        "DATA_DIR": os.path.join(work_dir, "data"),
+        "EXPORTS_DIR": os.path.join(work_dir, "exports"),
+        "BACKLOG_STORAGE": args.engine,
+        # Cada generación llega al modelo simulado
+        "LLM_CACHE_ENABLED": "false",
+        "DEBUG": "false"
+    })
+    story_ids = _seed(args.seed_stories)
+
+    processes = []
+    try:
+        llm = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.fake_openai_server", "--port", str(llm_port),
+            "--rpm", str(args.llm_rpm), "--tpm", str(args.llm_tpm), "--latency", str(args.llm_latency),
+            "--error-rate", str(args.llm_error_rate), "--stories", str(args.llm_stories)
+        ])
+        processes.append(llm)
+        _wait_ready(f"{llm_url}/stats", llm)
+        app = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"
+        ])
+        processes.append(app)
+        _wait_ready(f"{app_url}/health", app)
+    except Exception:
+        stop(processes)
+        raise
+    return app_url, llm_url, processes, story_ids
+
+
+def stop(processes: List[subprocess.Popen]) -> None:
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,10,25,50", help="Usuarios concurrentes por etapa, separados por comas")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos por etapa")
+    parser.add_argument("--think", type=float, default=1.0, help="Pausa media entre peticiones de un usuario (s)")
+    parser.add_argument("--generators", type=int, default=2, help="Generaciones en bucle durante toda la prueba")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--watch", default="GET /api/backlog", help="Endpoint con el que se calcula la capacidad")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="p99 máximo aceptable del endpoint vigilado")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout por petición (s)")
+    parser.add_argument("--target", help="URL de una app ya arrancada (no se lanza nada ni se siembra)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn de la app lanzada")
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--seed-stories", type=int, default=1000, help="HU del backlog sembrado")
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="Segundos por respuesta del modelo simulado")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fracción de respuestas 500/503 del modelo")
+    parser.add_argument("--llm-rpm", type=int, default=0, help="Cuota de peticiones por minuto del modelo (0 = sin límite)")
+    parser.add_argument("--llm-tpm", type=int, default=0, help="Cuota de tokens por minuto del modelo (0 = sin límite)")
+    parser.add_argument("--llm-stories", type=int, default=8, help="HU por respuesta del modelo simulado")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Fichero JSON con los resultados")
+    args = parser.parse_args()
+
+    if args.watch not in ACTIONS:
+        parser.error(f"--watch debe ser uno de: {', '.join(ACTIONS)}")
+    user_counts = [int(value) for value in args.users.split(",")]
+
+    processes: List[subprocess.Popen] = []
+    llm_url = None
+    if args.target:
+        app_url = args.target.rstrip("/")
+        response = httpx.get(f"{app_url}/api/backlog", params={"view": "compact"}, timeout=args.timeout)
+        story_ids = [story["id"] for story in response.json().get("user_stories", [])] if response.status_code == 200 else []
+    else:
+        print(f"Arrancando el modelo simulado y la app ({args.seed_stories} HU sembradas)...")
+        app_url, llm_url, processes, story_ids = launch(args)
+
+    stages = []
+    try:
+        for users in user_counts:
+            stage = asyncio.run(run_stage(
+                app_url, users, args.generators, MIXES[args.mix], args.duration,
+                args.think, story_ids, args.timeout, args.seed
+            ))
+            print_stage(stage)
+            stages.append(stage)
+        llm_stats = httpx.get(f"{llm_url}/stats").json() if llm_url else None
+    finally:
+        stop(processes)
+
+    best = capacity(stages, args.watch, args.slo_ms, args.max_error_rate)
+    if llm_stats:
+        print(f"Modelo simulado: {llm_stats}")
+
+    if args.output:
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "stages": stages,
+            "capacity_users": best,
+            "llm": llm_stats
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
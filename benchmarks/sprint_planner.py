@@ -0,0 +1,62 @@
+"""
+Benchmark de las estrategias de planificación de sprints.
+
+Uso:
+    python -m benchmarks.sprint_planner --stories 10000 --capacity 20
+"""
+
+import argparse
+import random
+import time
+from typing import List
+from app.models import Priority, UserStory
+from app.services.sprint_planner import PLANNERS
+
+
+def build_stories(count: int, seed: int = 42, dependency_ratio: float = 0.3) -> List[UserStory]:
+    """HU sintéticas con puntos Fibonacci y dependencias hacia HU anteriores"""
+    rng = random.Random(seed)
+    priorities = [Priority.ALTA, Priority.MEDIA, Priority.BAJA]
+    stories = []
+    for i in range(1, count + 1):
+        dependencies = []
+        if i > 1 and rng.random() < dependency_ratio:
+            dependencies = [f"HU{rng.randint(max(1, i - 50), i - 1)}"]
+        stories.append(UserStory(
+            id=f"HU{i}",
+            title=f"Historia {i}",
+            gherkin=f"Como usuario quiero la funcionalidad {i} para obtener valor",
+            acceptance_criteria=["Criterio"],
+            story_points=rng.choice([1, 2, 3, 5, 8, 13]),
+            priority=rng.choice(priorities),
+            dependencies=dependencies
+        ))
+    return stories
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stories", type=int, default=10000)
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.stories} HU, capacidad {args.capacity} SP/sprint")
+    for name, planner_cls in PLANNERS.items():
+        best = None
+        for _ in range(args.repeat):
+            stories = build_stories(args.stories)
+            started = time.perf_counter()
+            result = planner_cls().plan(stories, args.capacity)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(
+            f"  {name:<10} {best * 1000:8.1f} ms  "
+            f"sprints={result['total_sprints']:<6} "
+            f"utilización={result['utilization'] * 100:5.1f}%  "
+            f"sin planificar={len(result['unplaced_stories'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
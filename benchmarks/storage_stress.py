@@ -0,0 +1,125 @@
+"""
+Prueba de estrés del almacenamiento con varios procesos escribiendo a la vez.
+
+Cada worker es un proceso con su propio BacklogManager (como un worker de
+uvicorn) que alterna actualizaciones de velocidad y de su propia HU sobre el
+mismo backlog, leyendo el backlog completo entre escrituras. Al terminar se
+comprueba que no se perdió ninguna escritura y que el backlog se lee entero.
+
+Uso:
+    python -m benchmarks.storage_stress --workers 8 --ops 200 --engine json
+    python -m benchmarks.storage_stress --engine sqlite --optimistic
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Dict
+
+
+def _configure(data_dir: str, engine: str) -> None:
+    # Antes de importar app: la configuración se lee del entorno
+    os.environ["DATA_DIR"] = os.path.join(data_dir, "data")
+    os.environ["EXPORTS_DIR"] = os.path.join(data_dir, "exports")
+    os.environ["BACKLOG_STORAGE"] = engine
+    os.environ["BACKLOG_JOURNAL_COMPACT_BYTES"] = str(64 * 1024)
+    # La prueba no llama al modelo, pero Settings exige estas variables
+    for name in ("AZURE_OPENAI_API_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_DEPLOYMENT_NAME"):
+        os.environ.setdefault(name, "stress")
+
+
+def _worker(worker: int, ops: int, data_dir: str, engine: str, optimistic: bool, start, results) -> None:
+    _configure(data_dir, engine)
+    from app.models import UpdateVelocityRequest
+    from app.services.backlog_manager import BacklogManager, VersionConflictError
+
+    manager = BacklogManager()
+    conflicts = 0
+    start.wait()
+
+    for op in range(ops):
+        while True:
+            expected = manager.version_info()[0] if optimistic else None
+            try:
+                if op % 2 == 0:
+                    request = UpdateVelocityRequest(
+                        sprint_number=1, completed_points=worker * 100000 + op, total_points=0
+                    )
+                    manager.update_velocity(request, expected_version=expected)
+                else:
+                    story = manager.get_story(f"HU{worker + 1}")
+                    story = story.model_copy(update={"title": f"worker {worker} op {op}"})
+                    manager.save_story(story, expected_version=expected)
+                break
+            except VersionConflictError:
+                conflicts += 1
+        # Cada lectura valida el backlog completo: un fichero a medio escribir fallaría aquí
+        manager.load_backlog()
+
+    results.put((worker, conflicts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=100, help="Escrituras por worker")
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--optimistic", action="store_true", help="Escribir con expected_version y reintentar en conflicto")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="backlog-stress-")
+    _configure(data_dir, args.engine)
+    from app.models import Backlog
+    from app.services.backlog_manager import BacklogManager
+    from benchmarks.sprint_planner import build_stories
+
+    manager = BacklogManager()
+    manager.save_backlog(Backlog(user_stories=build_stories(max(args.workers, 200))))
+
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(w, args.ops, data_dir, args.engine, args.optimistic, start, results))
+        for w in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(1.0)  # que todos terminen de importar antes de arrancar
+
+    started = time.perf_counter()
+    start.set()
+    conflicts: Dict[int, int] = dict(results.get() for _ in processes)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    backlog = BacklogManager().load_backlog()
+    velocity_ops = (args.ops + 1) // 2
+    expected_points = {w * 100000 + op for w in range(args.workers) for op in range(0, args.ops, 2)}
+    errors = []
+    if len(backlog.velocity_history) != args.workers * velocity_ops or set(backlog.velocity_history) != expected_points:
+        errors.append(f"historial de velocidad: {len(backlog.velocity_history)} de {args.workers * velocity_ops} escrituras")
+    if backlog.version != 1 + args.workers * args.ops:
+        errors.append(f"versión {backlog.version}, se esperaba {1 + args.workers * args.ops}")
+    if args.ops > 1:
+        last_story_op = args.ops - 1 if (args.ops - 1) % 2 else args.ops - 2
+        for w in range(args.workers):
+            story = next(s for s in backlog.user_stories if s.id == f"HU{w + 1}")
+            if story.title != f"worker {w} op {last_story_op}":
+                errors.append(f"HU{w + 1}: '{story.title}'")
+
+    total = args.workers * args.ops
+    print(f"{args.engine}: {args.workers} workers x {args.ops} escrituras en {elapsed:.2f}s "
+          f"({total / elapsed:.0f} escrituras/s), conflictos reintentados: {sum(conflicts.values())}")
+    if errors:
+        print("ERROR: " + "; ".join(errors))
+        sys.exit(1)
+    print(f"OK: versión {backlog.version}, sin escrituras perdidas ni ficheros corruptos ({data_dir})")
+
+
+if __name__ == "__main__":
+    main()
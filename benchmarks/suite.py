@@ -0,0 +1,297 @@
+"""
+Suite de benchmarks: carga, guardado, validación, priorización, planificación y
+exportaciones sobre backlogs sintéticos, y la generación de punta a punta con
+un modelo simulado (sin red).
+
+Para cada caso se mide la mediana y la mejor de varias repeticiones, el
+rendimiento en HU/s y el pico de memoria Python (tracemalloc, en una pasada
+aparte para no distorsionar los tiempos). El resultado se guarda en JSON para
+compararlo entre commits.
+
+Uso:
+    python -m benchmarks.suite --sizes 100,1000,10000 --output bench.json
+    python -m benchmarks.suite --sizes 100000 --cases load,save --repeat 3
+    python -m benchmarks.suite --baseline main.json --output rama.json
+    python -m benchmarks.suite --compare main.json rama.json --threshold 0.15
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+
+SIZE_CASES = (
+    "validate", "save", "load", "load_cached", "prioritize", "plan_first_fit", "plan_greedy",
+    "export_markdown", "export_csv", "export_json", "export_parquet"
+)
+E2E_CASES = ("generate", "generate_fanout", "generate_stream")
+
+
+def _configure(data_dir: str, engine: str) -> None:
+    # Antes de importar app: la configuración se lee del entorno
+    os.environ["DATA_DIR"] = os.path.join(data_dir, "data")
+    os.environ["EXPORTS_DIR"] = os.path.join(data_dir, "exports")
+    os.environ["BACKLOG_STORAGE"] = engine
+    # Se mide el camino completo de cada llamada, no la caché de respuestas
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    for name, value in (
+        ("AZURE_OPENAI_API_KEY", "bench"),
+        ("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9"),
+        ("AZURE_OPENAI_DEPLOYMENT_NAME", "bench")
+    ):
+        os.environ.setdefault(name, value)
+
+
+def measure(
+    run: Callable[[object], object],
+    setup: Callable[[], object] = lambda: None,
+    repeat: int = 5,
+    max_seconds: float = 10.0,
+    memory: bool = True
+) -> Dict:
+    """
+    Ejecuta `run(setup())` hasta `repeat` veces (menos si se supera `max_seconds`);
+    `setup` no se cronometra. Con `memory`, una pasada más bajo tracemalloc.
+    """
+    timings = []
+    while len(timings) < repeat and sum(timings) < max_seconds:
+        argument = setup()
+        started = time.perf_counter()
+        run(argument)
+        timings.append(time.perf_counter() - started)
+
+    result = {
+        "runs": len(timings),
+        "median_s": statistics.median(timings),
+        "best_s": min(timings),
+        "peak_mb": None
+    }
+    if memory:
+        argument = setup()
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            run(argument)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result["peak_mb"] = round((peak - baseline) / 1024 / 1024, 3)
+    return result
+
+
+def size_cases(stories: int, cases: List[str], repeat: int, max_seconds: float, memory: bool) -> List[Dict]:
+    from app.models import Backlog, ExportFormat
+    from app.services.ai_agent import AIAgent
+    from app.services.backlog_manager import BacklogManager
+    from benchmarks.synthetic import backlog_data
+
+    data = backlog_data(stories)
+    backlog = Backlog.model_validate(data)
+    backlog_id = f"bench-{stories}"
+    manager = BacklogManager(backlog_id)
+    manager.save_backlog(backlog)
+    agent = AIAgent()
+
+    def export(format: ExportFormat) -> Callable:
+        def run(_):
+            chunks = manager.iter_parquet(backlog) if format == ExportFormat.PARQUET else manager.iter_export(backlog, format)
+            for _ in chunks:
+                pass
+        return run
+
+    def plan(strategy: str) -> Callable:
+        return lambda _: agent.suggest_sprint_planning(backlog.user_stories, backlog.team_capacity, strategy=strategy)
+
+    available: Dict[str, Tuple[Callable, Callable]] = {
+        "validate": (lambda _: Backlog.model_validate(data), lambda: None),
+        "save": (lambda _: manager.save_backlog(backlog), lambda: None),
+        # Lectura en frío: un gestor nuevo, sin el backlog en memoria
+        "load": (lambda fresh: fresh.load_backlog(), lambda: BacklogManager(backlog_id, export_cache=manager.export_cache)),
+        "load_cached": (lambda _: manager.load_backlog(), lambda: None),
+        "prioritize": (lambda _: agent.prioritize_stories(backlog.user_stories), lambda: None),
+        "plan_first_fit": (plan("first_fit"), lambda: None),
+        "plan_greedy": (plan("greedy"), lambda: None),
+        "export_markdown": (export(ExportFormat.MARKDOWN), lambda: None),
+        "export_csv": (export(ExportFormat.CSV), lambda: None),
+        "export_json": (export(ExportFormat.JSON), lambda: None),
+        "export_parquet": (export(ExportFormat.PARQUET), lambda: None)
+    }
+
+    results = []
+    for case in cases:
+        run, setup = available[case]
+        try:
+            result = measure(run, setup, repeat, max_seconds, memory)
+        except RuntimeError as e:
+            # p. ej. parquet sin pyarrow instalado
+            print(f"  {case:<16} omitido: {e}", file=sys.stderr)
+            continue
+        results.append(_report(case, stories, result))
+
+    asyncio.run(agent.aclose())
+    return results
+
+
+def e2e_cases(
+    cases: List[str],
+    stories_per_response: int,
+    sections: int,
+    latency: float,
+    repeat: int,
+    max_seconds: float,
+    memory: bool
+) -> List[Dict]:
+    from app.services.ai_agent import AIAgent
+    from benchmarks.fake_llm import install
+    from benchmarks.synthetic import llm_response
+
+    results = []
+    for case in cases:
+        agent = AIAgent()
+        # Una respuesta distinta por sección para que la fusión tenga trabajo real
+        install(agent, [llm_response(stories_per_response, seed=i) for i in range(max(1, sections))], latency)
+        requirements = "Requisitos del sistema de gestión.\n\n" + "Párrafo de requisitos. " * 20
+        if case == "generate_fanout":
+            # Párrafos del tamaño de una sección: `sections` llamadas en paralelo
+            paragraph = "Requisito de la sección. " * (agent.settings.FANOUT_CHUNK_CHARS // 26)
+            requirements = "\n\n".join(f"Sección {i}\n{paragraph}" for i in range(sections))
+
+        async def once():
+            if case == "generate_stream":
+                return [story async for story in agent.stream_user_stories(requirements)]
+            return await agent.generate_user_stories(requirements, fan_out=case == "generate_fanout")
+
+        # Un bucle de eventos por caso: el cliente HTTP del agente queda ligado a él
+        loop = asyncio.new_event_loop()
+        try:
+            result = measure(lambda _: loop.run_until_complete(once()), repeat=repeat, max_seconds=max_seconds, memory=memory)
+        finally:
+            loop.run_until_complete(agent.aclose())
+            loop.close()
+        stories = stories_per_response * (sections if case == "generate_fanout" else 1)
+        results.append(_report(case, stories, result))
+    return results
+
+
+def _report(case: str, stories: int, result: Dict) -> Dict:
+    report = {
+        "case": case,
+        "stories": stories,
+        **result,
+        "stories_per_s": round(stories / result["median_s"], 1) if result["median_s"] > 0 else None
+    }
+    peak = f"{report['peak_mb']:9.2f} MB" if report["peak_mb"] is not None else ""
+    print(
+        f"  {case:<16} {stories:>7} HU  mediana {report['median_s'] * 1000:10.2f} ms  "
+        f"mejor {report['best_s'] * 1000:10.2f} ms  {report['stories_per_s'] or 0:>12,.0f} HU/s  {peak}"
+    )
+    return report
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> int:
+    """Compara las medianas de dos resultados; devuelve el número de regresiones"""
+    previous = {(r["case"], r["stories"]): r for r in baseline["results"]}
+    print(f"{'caso':<16} {'HU':>7} {'antes ms':>11} {'ahora ms':>11} {'cambio':>8}")
+    regressions = 0
+    for result in current["results"]:
+        before = previous.get((result["case"], result["stories"]))
+        if before is None:
+            continue
+        change = result["median_s"] / before["median_s"] - 1 if before["median_s"] > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESIÓN"
+        elif change < -threshold:
+            flag = "  mejora"
+        print(
+            f"{result['case']:<16} {result['stories']:>7} {before['median_s'] * 1000:11.2f} "
+            f"{result['median_s'] * 1000:11.2f} {change * 100:+7.1f}%{flag}"
+        )
+    print(f"{regressions} regresiones por encima del {threshold * 100:.0f} %")
+    return regressions
+
+
+def _metadata(args) -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engine": args.engine,
+        "llm_latency": args.llm_latency
+    }
+
+
+def _load(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="Tamaños de backlog en HU, separados por comas")
+    parser.add_argument("--cases", default=",".join(SIZE_CASES + E2E_CASES), help="Casos a ejecutar, separados por comas")
+    parser.add_argument("--engine", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por caso")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Tiempo máximo por caso antes de dejar de repetir")
+    parser.add_argument("--no-memory", action="store_true", help="No medir el pico de memoria")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Segundos por respuesta del modelo simulado")
+    parser.add_argument("--llm-stories", type=int, default=8, help="HU por respuesta del modelo simulado")
+    parser.add_argument("--sections", type=int, default=4, help="Secciones del caso generate_fanout")
+    parser.add_argument("--output", help="Fichero JSON con los resultados")
+    parser.add_argument("--baseline", help="Resultados anteriores con los que comparar al terminar")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "AHORA"), help="Solo comparar dos ficheros de resultados")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Empeoramiento relativo que cuenta como regresión")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(_load(args.compare[0]), _load(args.compare[1]), args.threshold) else 0)
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = set(cases) - set(SIZE_CASES + E2E_CASES)
+    if unknown:
+        parser.error(f"casos desconocidos: {', '.join(sorted(unknown))}")
+
+    _configure(tempfile.mkdtemp(prefix="backlog-bench-"), args.engine)
+    memory = not args.no_memory
+    results = []
+    for stories in (int(size) for size in args.sizes.split(",")):
+        selected = [case for case in SIZE_CASES if case in cases]
+        if selected:
+            print(f"{stories} HU ({args.engine})")
+            results.extend(size_cases(stories, selected, args.repeat, args.max_seconds, memory))
+    selected = [case for case in E2E_CASES if case in cases]
+    if selected:
+        print(f"Generación con modelo simulado ({args.llm_latency * 1000:.0f} ms por respuesta)")
+        results.extend(e2e_cases(
+            selected, args.llm_stories, args.sections, args.llm_latency, args.repeat, args.max_seconds, memory
+        ))
+
+    report = {"meta": _metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.output}")
+    if args.baseline:
+        sys.exit(1 if compare(_load(args.baseline), report, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
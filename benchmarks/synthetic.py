@@ -0,0 +1,111 @@
+"""
+Backlogs sintéticos para los benchmarks.
+
+Las densidades imitan lo que genera el modelo: 2-4 criterios, 2-5 subtareas y
+1-3 casos de prueba por HU, un 40 % de HU con dependencias hacia HU recientes
+(nunca hacia delante, así que no hay ciclos), una quinta parte de las HU ya
+asignadas a sprints y un historial de velocidad. Con la misma semilla se
+obtiene siempre el mismo backlog.
+"""
+
+import json
+import random
+from typing import Dict, List
+from app.models import Backlog
+
+
+PRIORITIES = ("Alta", "Media", "Baja")
+POINTS = (1, 2, 3, 5, 8, 13)
+TAGS = ("backend", "frontend", "api", "ui", "datos", "seguridad", "infra")
+SUBTASKS = ("Backend", "Frontend", "Base de datos", "Pruebas automáticas", "Documentación")
+TEST_TYPES = ("functional", "integration", "ui", "api")
+
+
+def story_data(index: int, rng: random.Random, dependency_ratio: float = 0.4) -> Dict:
+    """HU `HU{index}` como la devuelve el modelo (dict JSON)"""
+    story_id = f"HU{index}"
+    dependencies = []
+    if index > 1 and rng.random() < dependency_ratio:
+        window = range(max(1, index - 50), index)
+        dependencies = [f"HU{i}" for i in rng.sample(window, min(len(window), rng.randint(1, 2)))]
+    return {
+        "id": story_id,
+        "title": f"Historia {index}: gestión de la funcionalidad {index % 97}",
+        "gherkin": (
+            f"Como usuario del módulo {index % 13} quiero gestionar la funcionalidad {index} "
+            f"para obtener el beneficio de negocio {index % 7}"
+        ),
+        "acceptance_criteria": [
+            f"Dado el escenario {c} cuando el usuario confirma entonces el sistema registra la operación"
+            for c in range(1, rng.randint(2, 4) + 1)
+        ],
+        "test_cases": [
+            {
+                "id": f"{story_id}-TC{t}",
+                "title": f"Caso {t} de {story_id}",
+                "description": "Verifica el flujo principal y los mensajes de error",
+                "preconditions": "Usuario autenticado",
+                "steps": ["Abrir la pantalla", "Completar el formulario", "Confirmar"],
+                "expected_result": "La operación queda registrada",
+                "test_type": rng.choice(TEST_TYPES)
+            }
+            for t in range(1, rng.randint(1, 3) + 1)
+        ],
+        "story_points": rng.choice(POINTS),
+        "priority": rng.choice(PRIORITIES),
+        "dependencies": dependencies,
+        "subtasks": [
+            {
+                "id": f"{story_id}-ST{s}",
+                "title": SUBTASKS[(s - 1) % len(SUBTASKS)],
+                "description": f"Implementar la parte {s} de {story_id}",
+                "estimated_hours": rng.choice([2, 4, 6, 8])
+            }
+            for s in range(1, rng.randint(2, 5) + 1)
+        ],
+        "tags": rng.sample(TAGS, rng.randint(1, 3))
+    }
+
+
+def backlog_data(count: int, seed: int = 42, team_capacity: int = 30) -> Dict:
+    """Backlog de `count` HU como dict JSON (lo que se valida al cargarlo)"""
+    rng = random.Random(seed)
+    stories = [story_data(i, rng) for i in range(1, count + 1)]
+
+    # La primera quinta parte ya está repartida en sprints por orden
+    sprints: List[Dict] = []
+    points = 0
+    for story in stories[:count // 5]:
+        if not sprints or points + story["story_points"] > team_capacity:
+            sprints.append({
+                "number": len(sprints) + 1,
+                "name": f"Sprint {len(sprints) + 1}",
+                "capacity": team_capacity,
+                "user_stories": [],
+                "total_points": 0
+            })
+            points = 0
+        points += story["story_points"]
+        story["sprint_assigned"] = sprints[-1]["number"]
+        sprints[-1]["user_stories"].append(story["id"])
+        sprints[-1]["total_points"] = points
+
+    history = [rng.randint(team_capacity - 8, team_capacity) for _ in range(min(len(sprints), 10))]
+    return {
+        "user_stories": stories,
+        "sprints": sprints,
+        "team_capacity": team_capacity,
+        "velocity_history": history,
+        "current_velocity": sum(history[-3:]) / len(history[-3:]) if history else None
+    }
+
+
+def build_backlog(count: int, seed: int = 42) -> Backlog:
+    return Backlog.model_validate(backlog_data(count, seed))
+
+
+def llm_response(count: int, seed: int = 42) -> str:
+    """Contenido de una respuesta del modelo con `count` HU (formato del system prompt)"""
+    rng = random.Random(seed)
+    stories = [story_data(i, rng) for i in range(1, count + 1)]
+    return json.dumps({"user_stories": stories}, ensure_ascii=False)
@@ -10,6 +10,7 @@ function App() {
   const [additionalContext, setAdditionalContext] = useState('');
   const [backlog, setBacklog] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [streamedStories, setStreamedStories] = useState(0);
   const [error, setError] = useState(null);
   const [success, setSuccess] = useState(null);
   const [activeTab, setActiveTab] = useState('form');
@@ -40,14 +41,17 @@ function App() {
     }
 
     setLoading(true);
+    setStreamedStories(0);
     setError(null);
     setSuccess(null);
 
     try {
-      const data = await api.generateBacklog(
+      const data = await api.generateBacklogStream(
         requirements,
         teamCapacity,
-        additionalContext
+        additionalContext,
+        '',
+        () => setStreamedStories((count) => count + 1)
       );
       
       setBacklog(data);
@@ -224,6 +228,9 @@ function App() {
         <div className="loading">
           <div className="spinner"></div>
           <p>Procesando con IA...</p>
+          {streamedStories > 0 && (
+            <p>{streamedStories} historias de usuario generadas</p>
+          )}
         </div>
       )}
 
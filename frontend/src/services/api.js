@@ -14,6 +14,48 @@ export const api = {
     return response.data;
   },
 
+  // Generar backlog en streaming (SSE): onStory recibe cada HU en cuanto se completa
+  generateBacklogStream: async (requirements, teamCapacity = 9, additionalContext = '', priorityGuidance = '', onStory = () => {}) => {
+    const response = await fetch(`${API_BASE_URL}/generate-backlog/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        requirements,
+        team_capacity: teamCapacity,
+        additional_context: additionalContext || null,
+        priority_guidance: priorityGuidance || null
+      })
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Los eventos SSE se separan por una línea en blanco
+      let separator;
+      while ((separator = buffer.indexOf('\n\n')) !== -1) {
+        const raw = buffer.slice(0, separator);
+        buffer = buffer.slice(separator + 2);
+
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || 'null');
+
+        if (event === 'story') onStory(data);
+        if (event === 'backlog') return data;
+        if (event === 'error') throw new Error(data.detail);
+      }
+    }
+    throw new Error('La generación terminó sin devolver el backlog');
+  },
+
   // Obtener backlog actual
   getBacklog: async () => {
     const response = await axios.get(`${API_BASE_URL}/backlog`);
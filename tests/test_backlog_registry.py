@@ -0,0 +1,46 @@
+import pytest
+from pydantic import ValidationError
+from app.config import get_settings
+from app.models import Backlog, CreateBacklogRequest
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Registro sobre un DATA_DIR temporal"""
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("EXPORTS_DIR", str(tmp_path / "exports"))
+    for name in ("AZURE_OPENAI_API_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_DEPLOYMENT_NAME"):
+        monkeypatch.setenv(name, "test")
+    get_settings.cache_clear()
+    from app.services.backlog_registry import BacklogRegistry
+    yield BacklogRegistry()
+    get_settings.cache_clear()
+
+
+def test_index_id_is_rejected(registry):
+    with pytest.raises(ValidationError):
+        CreateBacklogRequest(id="index")
+    with pytest.raises(ValueError):
+        registry.create("index")
+    assert [info.id for info in registry.list()] == ["default"]
+
+
+def test_backlog_files_do_not_clash_with_the_index(registry):
+    registry.create("team-a", name="Equipo A")
+    registry.get("team-a").save_backlog(Backlog(team_capacity=12))
+
+    assert registry.index_path.name == ".index.json"
+    assert [info.id for info in registry.list()] == ["default", "team-a"]
+    assert registry.info("team-a").name == "Equipo A"
+
+
+def test_legacy_index_is_migrated(registry):
+    from app.services.backlog_registry import BacklogRegistry
+
+    registry.create("team-a")
+    legacy_path = registry.directory / "index.json"
+    registry.index_path.rename(legacy_path)
+
+    migrated = BacklogRegistry()
+    assert not legacy_path.exists()
+    assert [info.id for info in migrated.list()] == ["default", "team-a"]